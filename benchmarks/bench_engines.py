@@ -0,0 +1,63 @@
+"""Python 版と NumPy 版の候補スコアリングの比較ベンチマーク
+
+    python benchmarks/bench_engines.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import matchmaking  # noqa: E402
+from matchmaking.numpy_engine import generate_matches_core_numpy  # noqa: E402
+
+SINGLES = "シングルス"
+DOUBLES = "ダブルス"
+TEAM_SIZES = [10, 100, 1000]
+MAX_RANK_DIFF = 5
+
+def make_event(players_per_team, rng):
+    """ランダムな試合数・連戦・対戦履歴を持つ大会状態を作成"""
+    a_players = [f"A{i}" for i in range(1, players_per_team + 1)]
+    b_players = [f"B{i}" for i in range(1, players_per_team + 1)]
+    a_doubles = {f"Aペア{i + 1}": a_players[2 * i:2 * i + 2] for i in range(players_per_team // 2)}
+    b_doubles = {f"Bペア{i + 1}": b_players[2 * i:2 * i + 2] for i in range(players_per_team // 2)}
+    counts = {
+        player: {SINGLES: rng.randint(0, 5), DOUBLES: rng.randint(0, 5)}
+        for player in a_players + b_players
+    }
+    last_played = set(rng.sample(a_players + b_players, players_per_team // 4))
+    history = [
+        {"Round": i + 1, "Match Type": SINGLES, "Team A": rng.choice(a_players), "Team B": rng.choice(b_players)}
+        for i in range(players_per_team * 2)
+    ]
+    return a_players, b_players, a_doubles, b_doubles, counts, last_played, history
+
+def best_of(func, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    rng = random.Random(0)
+    print(f"{'type':<8} {'players/team':>12} {'python [ms]':>12} {'numpy [ms]':>12} {'speedup':>8}  identical")
+    for players_per_team in TEAM_SIZES:
+        a_players, b_players, a_doubles, b_doubles, counts, last_played, history = make_event(players_per_team, rng)
+        index = matchmaking.build_matchup_index(history)
+        for match_type in (SINGLES, DOUBLES):
+            args = (match_type, a_players, b_players, history, last_played, a_doubles, b_doubles, counts, MAX_RANK_DIFF)
+            repeat = 1 if players_per_team >= 1000 else 3
+            python_time, python_result = best_of(lambda: matchmaking.generate_matches_core(*args, history_index=index), repeat)
+            numpy_time, numpy_result = best_of(lambda: generate_matches_core_numpy(*args, history_index=index), repeat)
+            print(
+                f"{match_type:<8} {players_per_team:>12} {python_time * 1000:>12.2f} {numpy_time * 1000:>12.2f} "
+                f"{python_time / numpy_time:>7.1f}x  {python_result == numpy_result}"
+            )
+
+if __name__ == "__main__":
+    main()
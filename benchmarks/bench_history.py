@@ -0,0 +1,47 @@
+"""対戦履歴の長さに対するラウンド生成時間のベンチマーク
+
+    python benchmarks/bench_history.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import matchmaking  # noqa: E402
+
+SINGLES = "シングルス"
+PLAYERS_PER_TEAM = 200
+HISTORY_LENGTHS = [0, 1000, 5000, 20000]
+REPEAT = 3
+
+def make_history(a_players, b_players, length, rng):
+    """ランダムなシングルスの対戦履歴を作成"""
+    return [
+        {"Round": i + 1, "Match Type": SINGLES, "Team A": rng.choice(a_players), "Team B": rng.choice(b_players)}
+        for i in range(length)
+    ]
+
+def time_round(history, a_players, b_players, history_index):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        matchmaking.generate_matches(SINGLES, a_players, b_players, history, set(), {}, {}, {}, 5, history_index=history_index)
+    return (time.perf_counter() - start) / REPEAT
+
+def main():
+    rng = random.Random(0)
+    a_players = [f"A{i}" for i in range(1, PLAYERS_PER_TEAM + 1)]
+    b_players = [f"B{i}" for i in range(1, PLAYERS_PER_TEAM + 1)]
+
+    print(f"players/team={PLAYERS_PER_TEAM}")
+    print(f"{'history':>8} {'indexed [ms]':>14} {'rebuild [ms]':>14}")
+    for length in HISTORY_LENGTHS:
+        history = make_history(a_players, b_players, length, rng)
+        index = matchmaking.build_matchup_index(history)
+        indexed = time_round(history, a_players, b_players, index)
+        rebuild = time_round(history, a_players, b_players, None)
+        print(f"{length:>8} {indexed * 1000:>14.2f} {rebuild * 1000:>14.2f}")
+
+if __name__ == "__main__":
+    main()
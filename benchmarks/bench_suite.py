@@ -0,0 +1,246 @@
+"""組み合わせ生成のスケーリングベンチマーク（遅延パーセンタイル・ピークメモリ・回帰検出）
+
+    python benchmarks/bench_suite.py                              # 全スイープを実行
+    python benchmarks/bench_suite.py --save-baseline baseline.json
+    python benchmarks/bench_suite.py --baseline baseline.json     # 回帰があれば終了コード 1
+
+基準シナリオ（チーム人数・ペア数・履歴長・制約緩和レベル）から1軸ずつ値を変えて、
+試合形式ごとの generate_matches・generate_matches_core と、全コートをまとめて決める
+optimize_round・Session.generate_round の1回あたりの遅延と tracemalloc のピークを測る。
+Session は候補キャッシュを使い、評価項目の重み・休養の優先を指定した場合も測る（1回ごとにラウンドを確定して進める）。
+選手・履歴は固定シードで生成するので、同じ環境なら同じ入力で比較できる。
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import matchmaking  # noqa: E402
+
+SINGLES = "シングルス"
+DOUBLES = "ダブルス"
+MAX_RANK_DIFF = 3
+SEED = 0
+# ラウンド単位の測定で使うコート（ペアがあればダブルスのコートも加える）
+SINGLES_COURTS = 4
+DOUBLES_COURTS = 2
+# Session の測定の種類（名前 → Session の追加の設定）
+SESSION_VARIANTS = {
+    "Session.generate_round": {},
+    "Session+cost_weights": {"cost_weights": {"balance": 10, "total_matches": 1, "rank_gap": 1, "rest": 1, "opponent_repeat": 1, "format_mix": 1}},
+    "Session+rest_priority": {"min_rest": 2, "rest_priority": True},
+}
+
+BASE_SCENARIO = {"team_size": 100, "pairs": 25, "history": 500, "level": "strict"}
+SWEEPS = {
+    "team_size": [10, 50, 100, 200, 500, 1000],
+    "pairs": [0, 10, 25, 50],
+    "history": [0, 500, 5000, 20000],
+    "level": list(matchmaking.CONSTRAINT_LEVELS),
+}
+
+def make_scenario(team_size, pairs, history, level, rng):
+    """固定シードの乱数から選手・ペア・試合数・連戦・対戦履歴を作成
+
+    level が allow_consecutive 以上なら全員を前ラウンド出場扱いにし、
+    allow_all ならランキング差の範囲内の全対戦を履歴に入れて、その緩和レベルまで落ちるようにする。
+    """
+    a_players = [f"A{i}" for i in range(1, team_size + 1)]
+    b_players = [f"B{i}" for i in range(1, team_size + 1)]
+    a_doubles = {f"Aペア{i + 1}": a_players[2 * i:2 * i + 2] for i in range(pairs)}
+    b_doubles = {f"Bペア{i + 1}": b_players[2 * i:2 * i + 2] for i in range(pairs)}
+    counts = {
+        player: {SINGLES: rng.randint(0, 5), DOUBLES: rng.randint(0, 5)}
+        for player in a_players + b_players
+    }
+    last_played = set() if level == "strict" else set(a_players + b_players)
+
+    matchups = []
+    for _ in range(history):
+        if a_doubles and rng.random() < 0.5:
+            matchups.append((DOUBLES, rng.choice(list(a_doubles)), rng.choice(list(b_doubles))))
+        else:
+            matchups.append((SINGLES, rng.choice(a_players), rng.choice(b_players)))
+    if level == "allow_all":
+        for i in range(1, team_size + 1):
+            for j in range(max(1, i - MAX_RANK_DIFF), min(team_size, i + MAX_RANK_DIFF) + 1):
+                matchups.append((SINGLES, f"A{i}", f"B{j}"))
+        matchups.extend((DOUBLES, a_pair, b_pair) for a_pair in a_doubles for b_pair in b_doubles)
+    match_history = [
+        {"Round": i + 1, "Match Type": match_type, "Team A": team_a, "Team B": team_b}
+        for i, (match_type, team_a, team_b) in enumerate(matchups)
+    ]
+    return a_players, b_players, a_doubles, b_doubles, counts, last_played, match_history
+
+def percentile(sorted_samples, q):
+    """最近傍順位法によるパーセンタイル"""
+    index = max(0, min(len(sorted_samples) - 1, round(q / 100 * len(sorted_samples) + 0.5) - 1))
+    return sorted_samples[index]
+
+def measure(func, samples):
+    """samples 回の遅延（ms）のパーセンタイルと、別途1回実行したときの tracemalloc ピーク（KiB）"""
+    func()  # ウォームアップ
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p90_ms": percentile(latencies, 90),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1],
+        "peak_kib": peak / 1024,
+    }, result
+
+def run_scenario(scenario, samples):
+    """1シナリオについて、試合形式ごとの generate_matches・generate_matches_core と、ラウンド単位の optimize_round・Session を測定"""
+    rng = random.Random(SEED)
+    a_players, b_players, a_doubles, b_doubles, counts, last_played, history = make_scenario(rng=rng, **scenario)
+    index = matchmaking.build_matchup_index(history)
+    level = matchmaking.CONSTRAINT_LEVELS.index(scenario["level"])
+
+    results = []
+    for match_type in (SINGLES, DOUBLES):
+        if match_type == DOUBLES and not a_doubles:
+            continue
+        args = (match_type, a_players, b_players, history, last_played, a_doubles, b_doubles, counts, MAX_RANK_DIFF)
+        stats, (matches, achieved) = measure(
+            lambda: matchmaking.generate_matches(*args, allow_consecutive_global=True, allow_repeat_global=True, history_index=index),
+            samples,
+        )
+        results.append(("generate_matches", match_type, achieved, len(matches), stats))
+        stats, matches = measure(
+            lambda: matchmaking.generate_matches_core(*args, allow_consecutive=level >= 1, allow_repeat_history=level >= 2, history_index=index),
+            samples,
+        )
+        results.append(("generate_matches_core", match_type, scenario["level"], len(matches), stats))
+
+    # 全コートをまとめて決める経路（Session は候補キャッシュを使い、測定ごとにラウンドが進む）
+    courts = make_courts(len(a_doubles))
+    stats, round_plan = measure(
+        lambda: matchmaking.optimize_round(
+            courts, a_players, b_players, index, last_played, a_doubles, b_doubles, counts, MAX_RANK_DIFF,
+            allow_consecutive_global=True, allow_repeat_global=True),
+        samples,
+    )
+    results.append(("optimize_round", "全コート", *round_summary(round_plan), stats))
+    for func, settings in SESSION_VARIANTS.items():
+        session = make_session(a_players, b_players, a_doubles, b_doubles, history, courts, **settings)
+        stats, round_plan = measure(lambda: play_round(session), samples)
+        results.append((func, "全コート", *round_summary(round_plan), stats))
+    return results
+
+def make_courts(pairs):
+    """ラウンド単位の測定で使うコート（ペアがなければシングルスのみ）"""
+    courts = [(f"コート{i + 1}", SINGLES) for i in range(SINGLES_COURTS)]
+    if pairs:
+        courts += [(f"コート{SINGLES_COURTS + i + 1}", DOUBLES) for i in range(DOUBLES_COURTS)]
+    return courts
+
+def make_session(a_players, b_players, a_doubles, b_doubles, history, courts, **settings):
+    """対戦履歴を1試合ずつのラウンドとして再生した Session"""
+    session = matchmaking.Session(a_players, b_players, a_doubles, b_doubles, courts=courts, max_rank_diff=MAX_RANK_DIFF, allow_repeat=True, **settings)
+    doubles_input = session.doubles_input
+    for m in history:
+        session.event.apply_round([((m["Team A"], m["Team B"]), courts[0][0], m["Match Type"])], doubles_input)
+    return session
+
+def round_summary(round_plan):
+    """ラウンド全体の (最も緩和したレベル, 割り当てたコート数)"""
+    levels = [level for *_, level in round_plan]
+    if "failed" in levels:
+        return "failed", len(levels) - levels.count("failed")
+    return max(levels, key=matchmaking.CONSTRAINT_LEVELS.index), len(levels)
+
+def play_round(session):
+    """1ラウンドを生成し、割り当てたコートを確定する"""
+    round_plan = session.generate_round()
+    session.confirm_round([(match, court, match_type) for match, court, match_type, level in round_plan if level != "failed"])
+    return round_plan
+
+def scenario_key(scenario, func, match_type):
+    return (
+        f"team={scenario['team_size']} pairs={scenario['pairs']} history={scenario['history']} "
+        f"level={scenario['level']} {func} {match_type}"
+    )
+
+def iter_scenarios(sweeps):
+    """基準シナリオから1軸ずつ値を変えたシナリオを重複なく返す"""
+    seen = set()
+    for axis in sweeps:
+        for value in SWEEPS[axis]:
+            scenario = {**BASE_SCENARIO, axis: value}
+            # ペア数はチーム人数の半分まで
+            scenario["pairs"] = min(scenario["pairs"], scenario["team_size"] // 2)
+            key = tuple(sorted(scenario.items()))
+            if key not in seen:
+                seen.add(key)
+                yield axis, scenario
+
+def compare(results, baseline, max_regression):
+    """基準値より p50 遅延またはピークメモリが max_regression 倍を超えたシナリオを返す"""
+    regressions = []
+    for key, stats in results.items():
+        if key not in baseline:
+            continue
+        for metric in ("p50_ms", "peak_kib"):
+            # ごく小さい値は計測誤差が支配的なので、下限を設けて比較する
+            floor = 0.05 if metric == "p50_ms" else 16
+            reference = max(baseline[key][metric], floor)
+            if stats[metric] > reference * max_regression:
+                regressions.append((key, metric, baseline[key][metric], stats[metric]))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sweep", choices=list(SWEEPS), action="append", help="実行する軸（複数指定可。既定: すべて）")
+    parser.add_argument("--samples", type=int, default=20, help="シナリオごとの測定回数")
+    parser.add_argument("--save-baseline", metavar="PATH", help="結果を基準値として JSON に保存")
+    parser.add_argument("--baseline", metavar="PATH", help="基準値 JSON と比較し、回帰があれば終了コード 1")
+    parser.add_argument("--max-regression", type=float, default=1.5, help="回帰とみなす基準値に対する倍率")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(
+        f"{'sweep':<10} {'team':>5} {'pairs':>5} {'history':>7} {'level':<17} {'function':<22} {'type':<6} "
+        f"{'achieved':<17} {'found':>7} {'p50 [ms]':>9} {'p90 [ms]':>9} {'p99 [ms]':>9} {'peak [KiB]':>10}"
+    )
+    for axis, scenario in iter_scenarios(args.sweep or list(SWEEPS)):
+        for func, match_type, achieved, found, stats in run_scenario(scenario, args.samples):
+            results[scenario_key(scenario, func, match_type)] = stats
+            print(
+                f"{axis:<10} {scenario['team_size']:>5} {scenario['pairs']:>5} {scenario['history']:>7} {scenario['level']:<17} "
+                f"{func:<22} {match_type:<6} {achieved:<17} {found:>7} {stats['p50_ms']:>9.3f} {stats['p90_ms']:>9.3f} "
+                f"{stats['p99_ms']:>9.3f} {stats['peak_kib']:>10.1f}"
+            )
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"基準値を保存しました: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        for key, metric, before, after in regressions:
+            print(f"回帰: {key} {metric} {before:.3f} -> {after:.3f}")
+        if regressions:
+            return 1
+        print(f"回帰なし（許容倍率 {args.max_regression}）")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
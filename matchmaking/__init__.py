@@ -0,0 +1,57 @@
+"""テニス練習試合の組み合わせ生成ライブラリ（Streamlit・pandas に依存しない）
+
+NumPy 版の候補スコアリングは matchmaking.numpy_engine、
+統計表（pandas）は matchmaking.reporting から利用する。
+"""
+from .balance import MatchBalanceIndex, get_match_balance_score
+from .candidates import CandidateCache
+from .engine import (
+    CONSTRAINT_LEVELS,
+    build_candidate_pools,
+    build_matchup_index,
+    generate_matches,
+    generate_matches_core,
+    generate_matches_single_pass,
+    iter_candidates,
+    matchup_key,
+)
+from .manual import build_manual_matches, get_players_from_selection
+from .metrics import REJECT_FILTERS, GenerationMetrics
+from .optimizer import optimize_round
+from .pairing import form_pairs, form_round_pairs
+from .planner import plan_session
+from .registry import EventRegistry
+from .roster import RankWindowIndex, Roster
+from .session import Session
+from .state import MATCH_TYPES, ROSTER_ACTIONS, EventState
+from .store import EventStore
+
+__all__ = [
+    "CONSTRAINT_LEVELS",
+    "CandidateCache",
+    "MATCH_TYPES",
+    "EventRegistry",
+    "EventState",
+    "EventStore",
+    "GenerationMetrics",
+    "MatchBalanceIndex",
+    "REJECT_FILTERS",
+    "ROSTER_ACTIONS",
+    "RankWindowIndex",
+    "Roster",
+    "Session",
+    "build_candidate_pools",
+    "build_manual_matches",
+    "build_matchup_index",
+    "form_pairs",
+    "form_round_pairs",
+    "generate_matches",
+    "generate_matches_core",
+    "generate_matches_single_pass",
+    "get_match_balance_score",
+    "get_players_from_selection",
+    "iter_candidates",
+    "matchup_key",
+    "optimize_round",
+    "plan_session",
+]
@@ -0,0 +1,67 @@
+"""試合数バランスの評価"""
+from collections import Counter
+
+# --- 試合数バランス確認関数 ---
+def get_match_balance_score(players, player_counts):
+    """選手の試合数のバランススコアを計算（低いほど均衡している）"""
+    if not players:
+        return 0
+    
+    match_counts = []
+    for player in players:
+        total = player_counts.get(player, {}).get('シングルス', 0) + player_counts.get(player, {}).get('ダブルス', 0)
+        match_counts.append(total)
+    
+    if not match_counts:
+        return 0
+    
+    # 最大値と最小値の差をスコアとする
+    return max(match_counts) - min(match_counts)
+
+class MatchBalanceIndex:
+    """試合数の度数分布を保持し、候補試合後のバランススコアを O(k) で計算する
+
+    get_match_balance_score(players, 候補試合を加算した player_counts) と同じ値を、
+    player_counts を複製せずに返す。
+    """
+    __slots__ = ("totals", "histogram", "values")
+
+    def __init__(self, players, player_counts):
+        self.totals = {}
+        for player in players:
+            counts = player_counts.get(player, {})
+            self.totals[player] = counts.get('シングルス', 0) + counts.get('ダブルス', 0)
+        # 試合数ごとの人数と、その試合数の昇順リスト
+        self.histogram = Counter(self.totals.values())
+        self.values = sorted(self.histogram)
+
+    def score_after(self, match_players):
+        """match_players が1試合ずつ加算された後の最大値と最小値の差"""
+        if not self.totals:
+            return 0
+
+        increments = {}
+        for player in match_players:
+            if player in self.totals:
+                increments[player] = increments.get(player, 0) + 1
+
+        removed = Counter(self.totals[player] for player in increments)
+        new_totals = [self.totals[player] + inc for player, inc in increments.items()]
+
+        # 加算対象外の選手の最小値・最大値（除外されるのは高々 k 件なので走査も O(k)）
+        low = high = None
+        for value in self.values:
+            if self.histogram[value] > removed[value]:
+                low = value
+                break
+        for value in reversed(self.values):
+            if self.histogram[value] > removed[value]:
+                high = value
+                break
+
+        if low is None:
+            return max(new_totals) - min(new_totals)
+        if new_totals:
+            low = min(low, min(new_totals))
+            high = max(high, max(new_totals))
+        return high - low
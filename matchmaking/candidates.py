@@ -0,0 +1,268 @@
+"""ラウンドをまたいで保持する組み合わせ候補のキャッシュ"""
+from collections import Counter
+
+from .balance import MatchBalanceIndex
+from .engine import build_candidate_pools, played_before
+from .roster import RankWindowIndex, Roster
+
+def _balance_signature(players, totals):
+    """候補試合後のバランススコアを決める (試合数, 加算数) の組（同じ組なら同じスコアになる）"""
+    increments = Counter(player for player in players if player in totals)
+    return tuple(sorted((totals[player], inc) for player, inc in increments.items()))
+
+class _CandidateTable:
+    """1つの試合形式について、ランキング差の条件を満たす A×B の組と、その履歴・試合数を保持する
+
+    選手やペアが末尾に加わった場合・抜けた場合は、その選手・ペアを含む候補だけを追加・削除する。
+    """
+    __slots__ = ("key", "match_type", "version", "last_played", "max_rank_diff", "ranks", "balance_index", "items", "consecutive", "player_items", "pairs", "item_pairs", "rows")
+
+    def __init__(self, key, state, match_type, a_pool, b_pool, a_doubles_map, b_doubles_map, max_rank_diff, ranks, last_played):
+        self.key = key
+        self.match_type = match_type
+        self.version = state.version
+        self.last_played = set(last_played)
+        self.max_rank_diff = max_rank_diff
+        a_pool_dict, b_pool_dict, all_players = build_candidate_pools(match_type, a_pool, b_pool, a_doubles_map, b_doubles_map)
+        self.balance_index = MatchBalanceIndex(all_players, state.balance_counts)
+
+        # 側（"A" / "B"）ごとの 選手またはペア → 選手 と、その連戦の有無
+        self.items = {"A": {}, "B": {}}
+        self.consecutive = {"A": {}, "B": {}}
+        # 選手 → その選手を含む (側, 選手またはペア)
+        self.player_items = {}
+        # シングルスの選手 → ランキング（末尾に加わった選手の候補を求める際に使う）
+        self.ranks = {}
+        for side, pool_dict in (("A", a_pool_dict), ("B", b_pool_dict)):
+            for item_key, players in pool_dict.items():
+                self._register(side, item_key, players, ranks)
+
+        b_items = list(b_pool_dict.items())
+        rank_window = None
+        if match_type == "シングルス":
+            rank_window = RankWindowIndex([ranks[b_item_key] for b_item_key, _ in b_items])
+
+        # 候補は [match, players, 対戦済みか, 総試合数, バランスの組] の列に追記し（削除した候補は None）、
+        # A の選手またはペアごとに iter_candidates と同じ列挙順で候補の添字を保持する
+        # （候補同士を参照で結ばないのは、ガベージコレクションの走査を増やさないため）
+        self.pairs = []
+        self.rows = {}
+        # (側, 選手またはペア) → その候補の添字
+        self.item_pairs = {}
+        for a_item_key in a_pool_dict:
+            self.rows[a_item_key] = []
+            if rank_window is not None:
+                b_window = [b_items[position][0] for position in rank_window.positions_within(ranks[a_item_key], max_rank_diff)]
+            else:
+                b_window = b_pool_dict
+            for b_item_key in b_window:
+                if a_item_key != b_item_key:
+                    self._add_pair(state, a_item_key, b_item_key)
+
+    def _register(self, side, item_key, players, ranks):
+        self.items[side][item_key] = players
+        self.consecutive[side][item_key] = any(p in self.last_played for p in players)
+        for player in set(players):
+            self.player_items.setdefault(player, []).append((side, item_key))
+        if self.match_type == "シングルス":
+            self.ranks[item_key] = ranks[item_key]
+
+    def _add_pair(self, state, a_item_key, b_item_key):
+        a_item_players = self.items["A"][a_item_key]
+        b_item_players = self.items["B"][b_item_key]
+        players = a_item_players + b_item_players
+        totals = self.balance_index.totals
+        index = len(self.pairs)
+        self.pairs.append([
+            (a_item_key, b_item_key), players,
+            played_before(state.played_matchups, self.match_type, a_item_key, b_item_key, a_item_players, b_item_players),
+            sum(totals[p] for p in players), _balance_signature(players, totals),
+        ])
+        self.rows[a_item_key].append(index)
+        self.item_pairs.setdefault(("A", a_item_key), []).append(index)
+        self.item_pairs.setdefault(("B", b_item_key), []).append(index)
+
+    def _in_window(self, a_item_key, b_item_key):
+        if a_item_key == b_item_key:
+            return False
+        return self.match_type != "シングルス" or abs(self.ranks[a_item_key] - self.ranks[b_item_key]) <= self.max_rank_diff
+
+    def update_roster(self, state, key, a_pool, b_pool, a_doubles_map, b_doubles_map, max_rank_diff, ranks):
+        """選手・ペアの増減を反映する（末尾への追加と削除以外の変更は反映せず False を返す）"""
+        if max_rank_diff != self.max_rank_diff:
+            return False
+        a_pool_dict, b_pool_dict, all_players = build_candidate_pools(self.match_type, a_pool, b_pool, a_doubles_map, b_doubles_map)
+        pool_dicts = {"A": a_pool_dict, "B": b_pool_dict}
+        for side, pool_dict in pool_dicts.items():
+            current = self.items[side]
+            kept = [item_key for item_key in current if item_key in pool_dict]
+            if list(pool_dict)[:len(kept)] != kept:
+                return False
+            for item_key in kept:
+                if pool_dict[item_key] != current[item_key]:
+                    return False
+                if self.match_type == "シングルス" and ranks[item_key] != self.ranks[item_key]:
+                    return False
+
+        # 抜けた選手・ペアの候補を削除する
+        for side, pool_dict in pool_dicts.items():
+            for item_key in [item_key for item_key in self.items[side] if item_key not in pool_dict]:
+                self._remove_item(side, item_key)
+        # 試合数の分布は参加中の選手で作り直し、加わった選手・ペアの候補を末尾に加える
+        self.balance_index = MatchBalanceIndex(all_players, state.balance_counts)
+        for a_item_key, players in a_pool_dict.items():
+            if a_item_key not in self.items["A"]:
+                self._register("A", a_item_key, players, ranks)
+                self.rows[a_item_key] = []
+                for b_item_key in self.items["B"]:
+                    if self._in_window(a_item_key, b_item_key):
+                        self._add_pair(state, a_item_key, b_item_key)
+        for b_item_key, players in b_pool_dict.items():
+            if b_item_key not in self.items["B"]:
+                self._register("B", b_item_key, players, ranks)
+                for a_item_key in self.items["A"]:
+                    if self._in_window(a_item_key, b_item_key):
+                        self._add_pair(state, a_item_key, b_item_key)
+        self.key = key
+        return True
+
+    def _remove_item(self, side, item_key):
+        players = self.items[side].pop(item_key)
+        del self.consecutive[side][item_key]
+        for player in set(players):
+            entries = [entry for entry in self.player_items[player] if entry != (side, item_key)]
+            if entries:
+                self.player_items[player] = entries
+            else:
+                del self.player_items[player]
+        self.ranks.pop(item_key, None)
+
+        others = set()
+        for index in self.item_pairs.pop((side, item_key), []):
+            match = self.pairs[index][0]
+            others.add(("B", match[1]) if side == "A" else ("A", match[0]))
+            self.pairs[index] = None
+        if side == "A":
+            del self.rows[item_key]
+        for other in others:
+            self.item_pairs[other] = [index for index in self.item_pairs[other] if self.pairs[index] is not None]
+            if side == "B":
+                self.rows[other[1]] = [index for index in self.rows[other[1]] if self.pairs[index] is not None]
+
+    def advance(self, state):
+        """直前の1ラウンドで試合をした選手の候補だけ、試合数と対戦履歴を更新する"""
+        played = state.last_played_players
+        self.balance_index = MatchBalanceIndex(self.balance_index.totals, state.balance_counts)
+        totals = self.balance_index.totals
+
+        # 試合数と対戦履歴が変わるのは、このラウンドで試合をした選手を含む候補だけ
+        touched = {
+            index
+            for player in played
+            for item in self.player_items.get(player, ())
+            for index in self.item_pairs.get(item, ())
+        }
+        for index in touched:
+            pair = self.pairs[index]
+            match, players = pair[0], pair[1]
+            pair[2] = played_before(state.played_matchups, self.match_type, *match, self.items["A"][match[0]], self.items["B"][match[1]])
+            pair[3] = sum(totals[p] for p in players)
+            pair[4] = _balance_signature(players, totals)
+
+        self.version = state.version
+
+    def rest(self, last_played):
+        """連戦の判定を last_played（休養中の選手）に合わせる（前回と出入りした選手の候補だけを更新する）"""
+        changed = last_played ^ self.last_played
+        if not changed:
+            return
+        for player in changed:
+            for side, item_key in self.player_items.get(player, ()):
+                self.consecutive[side][item_key] = any(p in last_played for p in self.items[side][item_key])
+        self.last_played = set(last_played)
+
+class CandidateCache:
+    """1つの EventState について、試合形式ごとの候補をラウンドをまたいで保持する
+
+    ランキング差の判定と候補の並びは設定が変わるまで使い回し、ラウンドが1つ進むごとに
+    直前のラウンドで試合をした選手を含む候補だけを更新する。連戦の判定は、休養中の選手の
+    集合が前回の呼び出しから変わった選手を含む候補だけを更新する。
+    選手・ペアが末尾に加わった場合や抜けた場合（途中参加・途中退出）は、その候補だけを追加・削除する。
+    バランススコアは選手の試合数の組ごとに1回だけ計算する。
+    1ラウンドより多く進んだ場合やそれ以外の設定が変わった場合は作り直す。
+    """
+    __slots__ = ("state", "_tables")
+
+    def __init__(self, state):
+        self.state = state
+        self._tables = {}
+
+    def clear(self):
+        self._tables = {}
+
+    def iter_candidates(self, match_type, a_pool, b_pool, a_doubles_map, b_doubles_map, max_rank_diff, allow_consecutive=False, allow_repeat_history=False, ranks=None, metrics=None, last_played=None):
+        """iter_candidates と同じ候補を同じ順に (level, balance_score, total_matches, match, players) で返す
+
+        履歴・試合数は state のものを使う（除外ペアは指定できない）。連戦の判定は last_played
+        （省略時は state.last_played_players）に含まれる選手で行う。
+        """
+        if ranks is None:
+            ranks = Roster(a_pool, b_pool).ranks
+        if last_played is None:
+            last_played = self.state.last_played_players
+        table = self._table(match_type, a_pool, b_pool, a_doubles_map, b_doubles_map, max_rank_diff, ranks, last_played)
+        table.rest(last_played)
+        a_consecutive = table.consecutive["A"]
+        b_consecutive = table.consecutive["B"]
+        if metrics is not None:
+            a_open = sum(1 for consecutive in a_consecutive.values() if allow_consecutive or not consecutive)
+            b_open = sum(1 for consecutive in b_consecutive.values() if allow_consecutive or not consecutive)
+            metrics.rejected["consecutive"] += len(a_consecutive) + len(b_consecutive) - a_open - b_open
+            metrics.enumerated += a_open * b_open
+            in_window = 0
+
+        scores = {}
+        score_after = table.balance_index.score_after
+        pairs = table.pairs
+        for match, players, repeat, total_matches, signature in (pairs[index] for row in table.rows.values() for index in row):
+            a_item_consecutive = a_consecutive[match[0]]
+            b_item_consecutive = b_consecutive[match[1]]
+            if not allow_consecutive and (a_item_consecutive or b_item_consecutive):
+                continue
+            if metrics is not None:
+                in_window += 1
+
+            level = 1 if a_item_consecutive or b_item_consecutive else 0
+            if repeat:
+                if not allow_repeat_history:
+                    if metrics is not None:
+                        metrics.rejected["history"] += 1
+                    continue
+                level = 2
+
+            balance_score = scores.get(signature)
+            if balance_score is None:
+                balance_score = scores[signature] = score_after(players)
+
+            if metrics is not None:
+                metrics.accepted += 1
+            yield level, balance_score, total_matches, match, players
+        if metrics is not None:
+            metrics.rejected["rank_diff"] += a_open * b_open - in_window
+
+    def _table(self, match_type, a_pool, b_pool, a_doubles_map, b_doubles_map, max_rank_diff, ranks, last_played):
+        state = self.state
+        if match_type == "シングルス":
+            key = (tuple(a_pool), tuple(b_pool), max_rank_diff, tuple(ranks[p] for p in a_pool), tuple(ranks[p] for p in b_pool))
+        else:
+            key = tuple((side, item_key, tuple(players)) for side, doubles_map in (("A", a_doubles_map), ("B", b_doubles_map)) for item_key, players in doubles_map.items())
+        table = self._tables.get(match_type)
+        if table is not None and table.version not in (state.version, state.version - 1):
+            table = None
+        if table is not None and table.key != key and not table.update_roster(state, key, a_pool, b_pool, a_doubles_map, b_doubles_map, max_rank_diff, ranks):
+            table = None
+        if table is None:
+            table = self._tables[match_type] = _CandidateTable(key, state, match_type, a_pool, b_pool, a_doubles_map, b_doubles_map, max_rank_diff, ranks, last_played)
+        elif table.version != state.version:
+            table.advance(state)
+        return table
@@ -0,0 +1,276 @@
+"""複数大会の組み合わせ表を一括生成するコマンドライン
+
+    python -m matchmaking events.json events.csv -o schedules.jsonl --jobs 8
+
+大会定義は JSON（1件の辞書・辞書のリスト）、JSON Lines、CSV で与える。
+各大会は別プロセスで生成し、終わった順に JSON Lines として書き出す。
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .costs import validate_cost_weights
+from .session import Session
+from .state import MATCH_TYPES, ROSTER_ACTIONS
+
+# 大会定義の既定値
+EVENT_DEFAULTS = {
+    "a_players_count": 8,
+    "b_players_count": 8,
+    "courts": ["シングルス", "シングルス"],
+    "max_rank_diff": 3,
+    "allow_consecutive": True,
+    "allow_repeat": False,
+    "auto_pairs": False,
+    "min_rest": 1,
+    "rest_priority": False,
+    "rounds": 10,
+    "planner": "beam",
+}
+
+PLANNERS = ("beam", "greedy")
+
+# 正規化した大会定義のうち Session に渡す項目
+SESSION_SETTINGS = (
+    "a_players", "b_players", "a_doubles_map", "b_doubles_map", "courts",
+    "max_rank_diff", "allow_consecutive", "allow_repeat", "ranks", "auto_pairs", "cost_weights",
+    "min_rest", "rest_priority",
+)
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "on")
+
+def _parse_pairs(value, prefix):
+    """"A1+A2;A3+A4" 形式のペア指定を {"Aペア1": ["A1", "A2"], ...} に変換"""
+    if isinstance(value, dict):
+        return {key: list(players) for key, players in value.items()}
+    pairs = {}
+    for i, pair in enumerate(part for part in str(value or "").split(";") if part.strip()):
+        pairs[f"{prefix}ペア{i + 1}"] = [player.strip() for player in pair.split("+")]
+    return pairs
+
+def _parse_weights(value):
+    """{"balance": 10, ...} か "balance=10;rank_gap=2" 形式の評価項目の重み（未指定なら None）"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = dict(part.split("=", 1) for part in value.split(";") if part.strip())
+        value = {name.strip(): weight for name, weight in value.items()}
+    return validate_cost_weights(value)
+
+def _parse_ranks(value):
+    """{"Alice": 1, ...} か "Alice=1;Bob=2" 形式の選手のランキング（未指定なら None）"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = dict(part.split("=", 1) for part in value.split(";") if part.strip())
+    return {str(player).strip(): int(rank) for player, rank in value.items()}
+
+def _parse_roster_events(value):
+    """[{"round": 4, "action": "join", "player": "A11"}, ...] か "4:join:A11;6:injury:B3" 形式の名簿の変更をラウンド順のリストに変換"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [dict(zip(("round", "action", "player"), part.strip().split(":"))) for part in value.split(";") if part.strip()]
+    events = []
+    for entry in value:
+        action, player = entry["action"].strip(), entry["player"].strip()
+        if action not in ROSTER_ACTIONS:
+            raise ValueError(f"未対応の名簿の操作です: {action}")
+        # 途中参加のチームの省略時は選手名の先頭の文字（ランキングの省略時は選手名の番号）
+        team = (entry.get("team") or player[:1]) if action == "join" else None
+        rank = entry.get("rank")
+        events.append({"round": int(entry["round"]), "action": action, "player": player, "team": team, "rank": int(rank) if rank not in (None, "") else None})
+    return sorted(events, key=lambda entry: entry["round"])
+
+def _check_roster_events(roster_events, a_players, b_players):
+    """名簿の変更を順に適用して、参加していない選手の退出や参加中の選手の途中参加がないか確かめる"""
+    active = {player: "A" for player in a_players}
+    active.update((player, "B") for player in b_players)
+    for entry in roster_events:
+        player, team = entry["player"], entry["team"]
+        if entry["round"] < 1:
+            raise ValueError(f"名簿の変更のラウンドは 1 以上にしてください: {entry['round']}")
+        if entry["action"] != "join":
+            if player not in active:
+                raise ValueError(f"{entry['round']}ラウンドの {player} は参加していません")
+            del active[player]
+            continue
+        if team not in ("A", "B"):
+            raise ValueError(f"{player} のチームは A か B で指定してください: {team}")
+        if player in active:
+            raise ValueError(f"{entry['round']}ラウンドの {player} は既に参加しています")
+        active[player] = team
+
+def _parse_courts(value):
+    """["シングルス", ...]・[["コート1", "シングルス"], ...]・"シングルス;ダブルス" のいずれかを (コート名, 試合形式) のリストに変換"""
+    if isinstance(value, str):
+        value = [part.strip() for part in value.split(";") if part.strip()]
+    courts = []
+    for i, court in enumerate(value):
+        if isinstance(court, str):
+            courts.append((f"コート{i + 1}", court))
+        else:
+            courts.append((court[0], court[1]))
+    for court, match_type in courts:
+        if match_type not in MATCH_TYPES:
+            raise ValueError(f"{court}の試合形式が不正です: {match_type}")
+    return courts
+
+def normalize_event(raw, index):
+    """JSON・CSV から読んだ大会定義を Session の引数に揃える"""
+    event = {**EVENT_DEFAULTS, **{key: value for key, value in raw.items() if value not in (None, "")}}
+    a_players = event.get("a_players") or [f"A{i}" for i in range(1, int(event["a_players_count"]) + 1)]
+    b_players = event.get("b_players") or [f"B{i}" for i in range(1, int(event["b_players_count"]) + 1)]
+    if isinstance(a_players, str):
+        a_players = [player.strip() for player in a_players.split(";") if player.strip()]
+    if isinstance(b_players, str):
+        b_players = [player.strip() for player in b_players.split(";") if player.strip()]
+    planner = event["planner"]
+    if planner not in PLANNERS:
+        raise ValueError(f"未対応の planner です: {planner}")
+    min_rest = int(event["min_rest"])
+    if min_rest < 0:
+        raise ValueError(f"min_rest は 0 以上にしてください: {min_rest}")
+    roster_events = _parse_roster_events(event.get("roster_events"))
+    _check_roster_events(roster_events, a_players, b_players)
+    return {
+        "name": str(event.get("name") or f"event{index + 1}"),
+        "a_players": a_players,
+        "b_players": b_players,
+        "a_doubles_map": _parse_pairs(event.get("a_doubles"), "A"),
+        "b_doubles_map": _parse_pairs(event.get("b_doubles"), "B"),
+        "courts": _parse_courts(event["courts"]),
+        "max_rank_diff": int(event["max_rank_diff"]),
+        "allow_consecutive": _parse_bool(event["allow_consecutive"]),
+        "allow_repeat": _parse_bool(event["allow_repeat"]),
+        "auto_pairs": _parse_bool(event["auto_pairs"]),
+        "cost_weights": _parse_weights(event.get("cost_weights")),
+        "min_rest": min_rest,
+        "rest_priority": _parse_bool(event["rest_priority"]),
+        "roster_events": roster_events,
+        "ranks": _parse_ranks(event.get("ranks")),
+        "rounds": int(event["rounds"]),
+        "planner": planner,
+    }
+
+def load_events(paths):
+    """大会定義ファイルを読み込み、正規化した大会定義のリストを返す
+
+    定義が不正な大会は残りの大会を止めずに {"name": ..., "error": ...} として返す（run がそのまま書き出す）。
+    """
+    raw_events = []
+    for path in paths:
+        with open(path, encoding="utf-8", newline="") as f:
+            if path.endswith(".csv"):
+                raw_events.extend(csv.DictReader(f))
+            elif path.endswith(".jsonl"):
+                raw_events.extend(json.loads(line) for line in f if line.strip())
+            else:
+                data = json.load(f)
+                raw_events.extend(data if isinstance(data, list) else [data])
+    events = []
+    for i, raw in enumerate(raw_events):
+        try:
+            events.append(normalize_event(raw, i))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            name = raw.get("name") if isinstance(raw, dict) else None
+            events.append({"name": str(name or f"event{i + 1}"), "error": f"{type(e).__name__}: {e}"})
+    return events
+
+def round_plan_records(round_plan):
+    """optimize_round 形式の1ラウンドを JSON 向けの辞書のリストに変換"""
+    return [
+        {"court": court, "match_type": match_type, "team_a": match[0] if match else None,
+         "team_b": match[1] if match else None, "level": level}
+        for match, court, match_type, level in round_plan
+    ]
+
+def generate_schedule(event):
+    """1大会分の組み合わせ表を生成（ワーカープロセスで実行）"""
+    start = time.perf_counter()
+    session = Session(**{name: event[name] for name in SESSION_SETTINGS})
+    roster_events = list(event["roster_events"])
+    rounds = []
+    while len(rounds) < event["rounds"]:
+        while roster_events and roster_events[0]["round"] <= len(rounds) + 1:
+            entry = roster_events.pop(0)
+            session.change_roster(entry["action"], entry["player"], entry["team"], entry["rank"])
+        # 次の名簿の変更の直前のラウンドまでをまとめて生成する
+        end = min(event["rounds"], roster_events[0]["round"] - 1) if roster_events else event["rounds"]
+        if event["planner"] == "beam":
+            segment = session.plan_rounds(end - len(rounds))
+            if roster_events:
+                # 名簿の変更の後も計画したラウンドの続きから生成するよう、計画どおりに確定しておく
+                session.plan.clear()
+                for round_plan in segment:
+                    session.confirm_round([(match, court, match_type) for match, court, match_type, level in round_plan if level != "failed"])
+        else:
+            segment = []
+            for _ in range(end - len(rounds)):
+                # 割り当てられなかったコートがあっても、割り当てたコートは確定して次のラウンドに進む
+                round_plan = session.generate_round()
+                session.confirm_round([(match, court, match_type) for match, court, match_type, level in round_plan if level != "failed"])
+                segment.append(round_plan)
+        rounds.extend(segment)
+
+    schedule = [round_plan_records(round_plan) for round_plan in rounds]
+    return {
+        "name": event["name"],
+        "elapsed_sec": round(time.perf_counter() - start, 6),
+        "failed_courts": sum(1 for round_plan in rounds for *_, level in round_plan if level == "failed"),
+        "rounds": schedule,
+    }
+
+def run(events, output, jobs=None, log=sys.stderr):
+    """全大会を並列に生成し、完了した順に output へ1行ずつ書き出す
+
+    定義が不正な大会（load_events のエラー）や生成に失敗した大会は {"name": ..., "error": ...} を書き出して
+    残りの大会を続ける。失敗した大会数を返す。
+    """
+    start = time.perf_counter()
+    errors = 0
+    for result in (event for event in events if "error" in event):
+        errors += 1
+        print(f"{result['name']}: 大会定義が不正です ({result['error']})", file=log)
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(generate_schedule, event): event["name"] for event in events if "error" not in event}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                errors += 1
+                result = {"name": futures[future], "error": f"{type(e).__name__}: {e}"}
+                print(f"{result['name']}: 生成に失敗しました ({result['error']})", file=log)
+            else:
+                print(
+                    f"{result['name']}: {len(result['rounds'])}ラウンド "
+                    f"{result['elapsed_sec'] * 1000:.1f} ms (割当失敗 {result['failed_courts']}コート)",
+                    file=log,
+                )
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+    print(f"合計 {len(events)}大会 {time.perf_counter() - start:.2f} s" + (f" (生成失敗 {errors}大会)" if errors else ""), file=log)
+    return errors
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m matchmaking", description="複数大会の組み合わせ表を一括生成")
+    parser.add_argument("inputs", nargs="+", help="大会定義ファイル（.json / .jsonl / .csv）")
+    parser.add_argument("-o", "--output", default="-", help="出力先の JSON Lines ファイル（既定: 標準出力）")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="並列プロセス数（既定: CPU コア数）")
+    args = parser.parse_args(argv)
+
+    events = load_events(args.inputs)
+    if args.output == "-":
+        errors = run(events, sys.stdout, args.jobs)
+    else:
+        with open(args.output, "w", encoding="utf-8") as output:
+            errors = run(events, output, args.jobs)
+    return 1 if errors else 0
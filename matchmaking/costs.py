@@ -0,0 +1,149 @@
+"""重み付きの複数の評価項目による候補の費用"""
+import math
+from operator import add, mul
+
+from .state import EventState
+
+# --- 費用項目 ---
+# 休養の評価で見るラウンド数（直前のラウンドに出た選手が最大、この数だけ休んだ選手は 0）
+REST_HORIZON = 3
+
+class CandidateBatch:
+    """1つの試合形式の候補を列ごとに保持する（費用項目は列単位でまとめて計算する）"""
+    __slots__ = ("match_type", "balance", "total_matches", "a_players", "b_players")
+
+    def __init__(self, match_type, balance, total_matches, a_players, b_players):
+        self.match_type = match_type
+        self.balance = balance
+        self.total_matches = total_matches
+        self.a_players = a_players
+        self.b_players = b_players
+
+    def __len__(self):
+        return len(self.balance)
+
+class CostContext:
+    """費用項目が参照する大会の状態（EventState）とランキング"""
+    __slots__ = ("state", "ranks", "_fatigue")
+
+    def __init__(self, state=None, ranks=None):
+        self.state = state if state is not None else EventState()
+        self.ranks = ranks or {}
+        self._fatigue = None
+
+    def fatigue(self):
+        """選手 → REST_HORIZON から最後の試合後に休んだラウンド数を引いた値（0 より大きい選手のみ、一度だけ計算）"""
+        if self._fatigue is None:
+            state = self.state
+            self._fatigue = {}
+            # 最近 REST_HORIZON ラウンドに出場した選手の集合だけを見る
+            for round_number in range(max(1, state.round_count - REST_HORIZON + 1), state.round_count + 1):
+                for player in state.rest_buckets.get(round_number, ()):
+                    self._fatigue[player] = REST_HORIZON - (state.round_count - round_number)
+        return self._fatigue
+
+def _side_sums(players_column, values):
+    """各候補の片側の選手の値の合計（同じ選手・ペアのリストは1回だけ合計する）"""
+    sums = {}
+    column = []
+    for players in players_column:
+        key = id(players)
+        total = sums.get(key)
+        if total is None:
+            total = sums[key] = sum(values.get(p, 0) for p in players)
+        column.append(total)
+    return column
+
+def balance_cost(batch, context):
+    """候補試合後の試合数の最大差"""
+    return batch.balance
+
+def total_matches_cost(batch, context):
+    """出場する選手のこれまでの試合数の合計"""
+    return batch.total_matches
+
+def rank_gap_cost(batch, context):
+    """両チームのランキング（ダブルスはペアの合計）の差"""
+    ranks = context.ranks
+    return [abs(a_rank - b_rank) for a_rank, b_rank in zip(_side_sums(batch.a_players, ranks), _side_sums(batch.b_players, ranks))]
+
+def rest_cost(batch, context):
+    """最近試合をした選手ほど大きい（前のラウンドから休んでいない選手を避ける）"""
+    fatigue = context.fatigue()
+    return list(map(add, _side_sums(batch.a_players, fatigue), _side_sums(batch.b_players, fatigue)))
+
+def opponent_repeat_cost(batch, context):
+    """両チームの選手同士がこれまでに対戦した回数の合計（ペア名によらない）"""
+    state = context.state
+    player_ids = state.player_ids
+    row = state.opponents.row
+    values = []
+    for a_players, b_players in zip(batch.a_players, batch.b_players):
+        b_ids = [player_ids[p] for p in b_players if p in player_ids]
+        total = 0
+        for p in a_players:
+            if p in player_ids:
+                faced = row(player_ids[p])
+                total += sum(faced.get(b_id, 0) for b_id in b_ids)
+        values.append(total)
+    return values
+
+def format_mix_cost(batch, context):
+    """出場する選手が、この試合形式を他方の形式より多くこなしている数の合計"""
+    state = context.state
+    player_ids = state.player_ids
+    if batch.match_type == "シングルス":
+        same, other = state.singles_counts, state.doubles_counts
+    else:
+        same, other = state.doubles_counts, state.singles_counts
+    excess = {player: same[i] - other[i] for player, i in player_ids.items() if same[i] > other[i]}
+    return list(map(add, _side_sums(batch.a_players, excess), _side_sums(batch.b_players, excess)))
+
+# 費用項目（名前 → 候補の列を受け取り値の列を返す関数）。register_cost_term で追加できる
+COST_TERMS = {
+    "balance": balance_cost,
+    "total_matches": total_matches_cost,
+    "rank_gap": rank_gap_cost,
+    "rest": rest_cost,
+    "opponent_repeat": opponent_repeat_cost,
+    "format_mix": format_mix_cost,
+}
+
+# 画面に表示する費用項目の名前
+COST_TERM_LABELS = {
+    "balance": "試合数の偏り",
+    "total_matches": "出場選手の試合数",
+    "rank_gap": "ランキング差",
+    "rest": "休養の短さ",
+    "opponent_repeat": "同じ相手との再戦",
+    "format_mix": "シングルス・ダブルスの偏り",
+}
+
+# 重みを指定する場合の既定値（従来の (バランススコア, 総試合数) の順序に近い）
+DEFAULT_COST_WEIGHTS = {"balance": 10.0, "total_matches": 1.0, "rank_gap": 0.0, "rest": 0.0, "opponent_repeat": 0.0, "format_mix": 0.0}
+
+def register_cost_term(name, term, label=None):
+    """費用項目を追加する（term(batch, context) は候補ごとの 0 以上の値の列を返す）"""
+    COST_TERMS[name] = term
+    COST_TERM_LABELS[name] = label or name
+
+def validate_cost_weights(weights):
+    """重みの辞書を検証して float の辞書で返す（未知の項目・負や無限大・NaN の重みは ValueError）"""
+    validated = {}
+    for name, weight in weights.items():
+        if name not in COST_TERMS:
+            raise ValueError(f"未知の評価項目です: {name}")
+        weight = float(weight)
+        if not math.isfinite(weight) or weight < 0:
+            raise ValueError(f"{name} の重みは 0 以上の有限の値にしてください: {weight}")
+        validated[name] = weight
+    return validated
+
+def evaluate_costs(batch, weights, context):
+    """重みが 0 でない項目の列を1回ずつ計算し、候補ごとの重み付き和を1回の走査で返す"""
+    active = [(weight, COST_TERMS[name]) for name, weight in weights.items() if weight]
+    if not active:
+        return [0.0] * len(batch)
+    factors = [weight for weight, _ in active]
+    columns = [term(batch, context) for _, term in active]
+    return [sum(map(mul, factors, values)) for values in zip(*columns)]
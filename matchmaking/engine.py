@@ -0,0 +1,266 @@
+"""組み合わせ候補の列挙と段階的制約緩和"""
+import heapq
+import time
+
+from .balance import MatchBalanceIndex
+from .roster import Roster, RankWindowIndex
+
+# --- 対戦履歴索引 ---
+def matchup_key(a_item_key, b_item_key):
+    """対戦の向きに依存しない索引キーを返す"""
+    return frozenset((a_item_key, b_item_key))
+
+def lineup_key(a_players, b_players):
+    """ダブルスの対戦を選手の組で表す索引キー（ペア名の付け替えに依存しない）"""
+    return frozenset((frozenset(a_players), frozenset(b_players)))
+
+def played_before(history_index, match_type, a_item_key, b_item_key, a_item_players, b_item_players):
+    """対戦済みか（ダブルスはペア名が変わっても同じ4人の同じ組み合わせなら対戦済みとする）"""
+    if matchup_key(a_item_key, b_item_key) in history_index:
+        return True
+    return match_type == "ダブルス" and lineup_key(a_item_players, b_item_players) in history_index
+
+def build_matchup_index(history):
+    """対戦履歴リストから対戦済み組み合わせの索引を作成"""
+    return {matchup_key(m["Team A"], m["Team B"]) for m in history}
+
+# --- 組み合わせ生成関数（段階的制約緩和対応） ---
+# 制約緩和レベル（添字が小さいほど厳格）
+CONSTRAINT_LEVELS = ("strict", "allow_consecutive", "allow_all")
+
+def build_candidate_pools(match_type, a_pool, b_pool, a_doubles_map, b_doubles_map):
+    """試合形式に応じた候補（選手またはペア）の辞書と、バランス計算用の全選手リストを返す"""
+    if match_type == "シングルス":
+        a_pool_dict = {player: [player] for player in a_pool}
+        b_pool_dict = {player: [player] for player in b_pool}
+        all_players = a_pool + b_pool
+    else:
+        a_pool_dict = a_doubles_map
+        b_pool_dict = b_doubles_map
+        # ダブルスの場合、ペアに含まれる全選手を取得
+        all_players = []
+        for players in a_doubles_map.values():
+            all_players.extend(players)
+        for players in b_doubles_map.values():
+            all_players.extend(players)
+        # 重複を除去
+        all_players = list(set(all_players))
+    return a_pool_dict, b_pool_dict, all_players
+
+def iter_candidates(match_type, a_pool, b_pool, history_index, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, allow_consecutive=False, allow_repeat_history=False, excluded_pairs=None, ranks=None, metrics=None):
+    """制約を満たす候補を列挙順に (level, balance_score, total_matches, match, players) で返す
+
+    level は候補が必要とする最も弱い制約緩和レベル（CONSTRAINT_LEVELS の添字）。
+    history_index が None の場合は履歴チェックを行わない。ダブルスは lineup_key でも照合する。
+    ranks は選手名→整数ランキングの表（省略時は Roster の既定値）。
+    metrics（GenerationMetrics）を渡すと、列挙・除外した候補の数を記録する。
+    """
+    excluded_pairs = excluded_pairs or set()
+    a_pool_dict, b_pool_dict, all_players = build_candidate_pools(match_type, a_pool, b_pool, a_doubles_map, b_doubles_map)
+
+    # 現在の試合数分布（候補ごとの複製を避けるため一度だけ作成）
+    balance_index = MatchBalanceIndex(all_players, player_counts)
+
+    # B側の連戦判定は候補ごとに繰り返さないよう先に求めておく
+    b_items = []
+    for b_item_key, b_item_players in b_pool_dict.items():
+        # ペア除外チェック
+        if b_item_key in excluded_pairs:
+            if metrics is not None:
+                metrics.rejected["excluded_pair"] += 1
+            continue
+        b_consecutive = any(player in last_played for player in b_item_players)
+        # 連戦チェック（allow_consecutiveが False の場合のみ）
+        if b_consecutive and not allow_consecutive:
+            if metrics is not None:
+                metrics.rejected["consecutive"] += 1
+            continue
+        b_items.append((b_item_key, b_item_players, b_consecutive))
+
+    # シングルスはランキング順の索引で、ランキング差の範囲内のB選手だけを調べる
+    rank_window = None
+    if match_type == "シングルス":
+        if ranks is None:
+            ranks = Roster(a_pool, b_pool).ranks
+        rank_window = RankWindowIndex([ranks[b_item_key] for b_item_key, _, _ in b_items])
+
+    for a_item_key, a_item_players in a_pool_dict.items():
+        a_consecutive = any(player in last_played for player in a_item_players)
+        # 連戦チェック（allow_consecutiveが False の場合のみ）
+        if a_consecutive and not allow_consecutive:
+            if metrics is not None:
+                metrics.rejected["consecutive"] += 1
+            continue
+        # ペア除外チェック
+        if a_item_key in excluded_pairs:
+            if metrics is not None:
+                metrics.rejected["excluded_pair"] += 1
+            continue
+
+        if rank_window is not None:
+            # ランキング差チェック（シングルスの場合）
+            b_window = [b_items[position] for position in rank_window.positions_within(ranks[a_item_key], max_rank_diff)]
+        else:
+            b_window = b_items
+        if metrics is not None:
+            metrics.enumerated += len(b_items)
+            metrics.rejected["rank_diff"] += len(b_items) - len(b_window)
+
+        for b_item_key, b_item_players, b_consecutive in b_window:
+            if a_item_key == b_item_key:
+                continue
+
+            level = 1 if a_consecutive or b_consecutive else 0
+
+            # 過去の対戦履歴チェック
+            if history_index is not None and played_before(history_index, match_type, a_item_key, b_item_key, a_item_players, b_item_players):
+                if not allow_repeat_history:
+                    if metrics is not None:
+                        metrics.rejected["history"] += 1
+                    continue
+                level = 2
+
+            # この組み合わせに関わる選手の試合数を計算
+            match_players = a_item_players + b_item_players
+            total_matches = sum(balance_index.totals[p] for p in match_players)
+
+            # この組み合わせ後の全体バランススコアを計算
+            balance_score = balance_index.score_after(match_players)
+
+            if metrics is not None:
+                metrics.accepted += 1
+            yield level, balance_score, total_matches, (a_item_key, b_item_key), match_players
+
+def generate_matches_core(match_type, a_pool, b_pool, history, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, allow_consecutive=False, allow_repeat_history=False, excluded_pairs=None, history_index=None, limit=None, ranks=None, metrics=None):
+    # 履歴を再度許可する場合は索引を参照しない。索引が渡されない場合は履歴から一度だけ作成する
+    if allow_repeat_history:
+        history_index = None
+    elif history_index is None:
+        history_index = build_matchup_index(history)
+
+    # 可能な組み合わせを生成（連戦回避を厳格に適用）
+    valid_matches = (
+        (balance_score, total_matches, match)
+        for _, balance_score, total_matches, match, _ in iter_candidates(
+            match_type, a_pool, b_pool, history_index, last_played, a_doubles_map, b_doubles_map,
+            player_counts, max_rank_diff, allow_consecutive, allow_repeat_history, excluded_pairs, ranks, metrics)
+    )
+    if metrics is not None:
+        # 計測時は列挙・スコア計算と並べ替えの時間を分けるため、先に候補を全件作る
+        start = time.perf_counter()
+        valid_matches = list(valid_matches)
+        metrics.scoring_sec += time.perf_counter() - start
+        start = time.perf_counter()
+    
+    # 試合数バランスと総試合数で優先順位を決定
+    # 1. バランススコアが低い（均衡している）
+    # 2. 総試合数が少ない
+    if limit is None:
+        valid_matches = sorted(valid_matches, key=lambda x: (x[0], x[1]))
+    else:
+        # 上位 limit 件だけを逐次選択する（同点時は列挙順で sorted と同じ結果になる）
+        valid_matches = heapq.nsmallest(limit, valid_matches, key=lambda x: (x[0], x[1]))
+    if metrics is not None:
+        metrics.sorting_sec += time.perf_counter() - start
+    
+    return [match for _, _, match in valid_matches]
+
+def generate_matches_single_pass(match_type, a_pool, b_pool, history_index, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, allow_consecutive_global=True, allow_repeat_global=False, excluded_pairs=None, limit=None, ranks=None, metrics=None):
+    """候補を一度だけ列挙し、候補が存在する最も厳格なレベルの結果を返す
+
+    generate_matches_core をレベルごとに呼び直す場合と同じ (matches, level) を返す。
+    limit を指定すると候補リスト全体を保持せず、上位 limit 件のみを返す。
+    """
+    # 到達可能な緩和レベル
+    reachable = [0]
+    if allow_consecutive_global:
+        reachable.append(1)
+    if allow_repeat_global:
+        reachable.append(2)
+
+    candidates = iter_candidates(
+        match_type, a_pool, b_pool, history_index, last_played, a_doubles_map, b_doubles_map,
+        player_counts, max_rank_diff, allow_consecutive=allow_consecutive_global or allow_repeat_global,
+        allow_repeat_history=allow_repeat_global, excluded_pairs=excluded_pairs, ranks=ranks, metrics=metrics)
+    if metrics is not None:
+        start = time.perf_counter()
+
+    # レベルごとに (balance_score, total_matches, 列挙順, match) を保持する
+    buckets = ([], [], [])
+    for order, (level, balance_score, total_matches, match, _) in enumerate(candidates):
+        bucket = buckets[level]
+        if limit is None:
+            bucket.append((balance_score, total_matches, order, match))
+        elif len(bucket) < limit:
+            heapq.heappush(bucket, (-balance_score, -total_matches, -order, match))
+        else:
+            # レベル内の上位 limit 件だけを最大ヒープで保持する
+            heapq.heappushpop(bucket, (-balance_score, -total_matches, -order, match))
+    if metrics is not None:
+        metrics.scoring_sec += time.perf_counter() - start
+        start = time.perf_counter()
+
+    if not any(buckets):
+        if metrics is not None:
+            metrics.record_level(match_type, "failed")
+        return [], "failed"
+
+    # 最も弱い候補のレベル以上で、到達可能な最小のレベルを採用
+    weakest_needed = next(l for l, bucket in enumerate(buckets) if bucket)
+    level = next(l for l in reachable if l >= weakest_needed)
+
+    valid_matches = []
+    for bucket in buckets[:level + 1]:
+        if limit is None:
+            valid_matches.extend(bucket)
+        else:
+            valid_matches.extend((-balance_score, -total_matches, -order, match) for balance_score, total_matches, order, match in bucket)
+    valid_matches.sort(key=lambda x: (x[0], x[1], x[2]))
+    if limit is not None:
+        valid_matches = valid_matches[:limit]
+    if metrics is not None:
+        metrics.sorting_sec += time.perf_counter() - start
+        metrics.record_level(match_type, CONSTRAINT_LEVELS[level])
+    return [candidate[3] for candidate in valid_matches], CONSTRAINT_LEVELS[level]
+
+# --- 段階的制約緩和ラッパー関数 ---
+def generate_matches(match_type, a_pool, b_pool, history, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, allow_consecutive_global=True, allow_repeat_global=False, excluded_pairs=None, history_index=None, single_pass=True, limit=None, ranks=None, metrics=None):
+    """段階的制約緩和でマッチング生成を試行
+
+    single_pass=True の場合は候補を一度だけ列挙して最も厳格なレベルを選ぶ。
+    limit を指定すると上位 limit 件のみを返す（先頭の候補だけ使う場合は 1）。
+    metrics（GenerationMetrics）を渡すと、候補数・除外数・処理時間・採用レベルを記録する。
+    """
+    if history_index is None:
+        history_index = build_matchup_index(history)
+
+    if single_pass:
+        return generate_matches_single_pass(match_type, a_pool, b_pool, history_index, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, allow_consecutive_global, allow_repeat_global, excluded_pairs, limit, ranks, metrics)
+    
+    # レベル1: 厳格（連戦回避 + 履歴回避）
+    matches = generate_matches_core(match_type, a_pool, b_pool, history, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, allow_consecutive=False, allow_repeat_history=False, excluded_pairs=excluded_pairs, history_index=history_index, limit=limit, ranks=ranks, metrics=metrics)
+    if matches:
+        if metrics is not None:
+            metrics.record_level(match_type, "strict")
+        return matches, "strict"
+    
+    # レベル2: 連戦許可（ユーザー設定に従う）
+    if allow_consecutive_global:
+        matches = generate_matches_core(match_type, a_pool, b_pool, history, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, allow_consecutive=True, allow_repeat_history=False, excluded_pairs=excluded_pairs, history_index=history_index, limit=limit, ranks=ranks, metrics=metrics)
+        if matches:
+            if metrics is not None:
+                metrics.record_level(match_type, "allow_consecutive")
+            return matches, "allow_consecutive"
+    
+    # レベル3: 全制約緩和（ユーザー設定に従う）
+    if allow_repeat_global:
+        matches = generate_matches_core(match_type, a_pool, b_pool, history, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, allow_consecutive=True, allow_repeat_history=True, excluded_pairs=excluded_pairs, history_index=history_index, limit=limit, ranks=ranks, metrics=metrics)
+        if matches:
+            if metrics is not None:
+                metrics.record_level(match_type, "allow_all")
+            return matches, "allow_all"
+    
+    # どの制約でもマッチングできない場合
+    if metrics is not None:
+        metrics.record_level(match_type, "failed")
+    return [], "failed"
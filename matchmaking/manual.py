@@ -0,0 +1,31 @@
+"""手動選択された組み合わせの整形"""
+
+# --- 選手抽出ヘルパー関数 ---
+def get_players_from_selection(team_selection, match_type, doubles_input_dict):
+    """選択されたチーム/ペアから個別の選手を抽出"""
+    if not team_selection:
+        return []
+    
+    if match_type == "シングルス":
+        return team_selection  # 直接選手名
+    else:
+        # ダブルスペアから選手を抽出
+        players = []
+        for pair_name in team_selection:
+            players.extend(doubles_input_dict.get(pair_name, []))
+        return players
+
+# --- 手動選択の組み合わせ作成関数 ---
+def build_manual_matches(manual_courts, a_doubles_input, b_doubles_input):
+    """(コート名, 試合形式, Aチーム選択, Bチーム選択) のリストから確定用の試合と、コートごとの選手リストを作成"""
+    matches_to_confirm = []
+    court_players = []
+    for court, match_type, a_team, b_team in manual_courts:
+        if not (a_team and b_team):
+            continue
+        matches_to_confirm.append(((a_team[0], b_team[0]), court, match_type))
+        court_players.append(
+            get_players_from_selection(a_team, match_type, a_doubles_input)
+            + get_players_from_selection(b_team, match_type, b_doubles_input)
+        )
+    return matches_to_confirm, court_players
@@ -0,0 +1,48 @@
+"""組み合わせ生成の計測（metrics 引数に渡したときだけ記録する）"""
+
+# 候補を除外したフィルタ（除外の判定順）
+REJECT_FILTERS = ("consecutive", "excluded_pair", "rank_diff", "history")
+
+class GenerationMetrics:
+    """1回以上の組み合わせ生成の計測値を累積する
+
+    consecutive・excluded_pair は除外した選手またはペアの数、
+    rank_diff・history は除外した組み合わせ（候補）の数を数える。
+    enumerated は選手・ペア単位の除外を通過した A×B の組み合わせの数で、
+    rank_diff + history + accepted（と同名の組み合わせ）に分かれる。
+    scoring_sec は候補の列挙とスコア計算、sorting_sec は並べ替え・上位選択・コート割当の時間。
+    """
+    __slots__ = ("enumerated", "accepted", "rejected", "scoring_sec", "sorting_sec", "levels")
+
+    def __init__(self):
+        self.enumerated = 0
+        self.accepted = 0
+        self.rejected = dict.fromkeys(REJECT_FILTERS, 0)
+        self.scoring_sec = 0.0
+        self.sorting_sec = 0.0
+        # 生成ごとの (試合形式またはコート名, 採用された制約緩和レベル)
+        self.levels = []
+
+    def record_level(self, label, level):
+        self.levels.append((label, level))
+
+    def merge(self, other):
+        """別の計測値を加算する（並行して列挙した試合形式ごとの計測値をまとめる）"""
+        self.enumerated += other.enumerated
+        self.accepted += other.accepted
+        for name, count in other.rejected.items():
+            self.rejected[name] += count
+        self.scoring_sec += other.scoring_sec
+        self.sorting_sec += other.sorting_sec
+        self.levels.extend(other.levels)
+
+    def as_dict(self):
+        """JSON やデバッグ表示向けの辞書"""
+        return {
+            "enumerated": self.enumerated,
+            "accepted": self.accepted,
+            "rejected": dict(self.rejected),
+            "scoring_ms": round(self.scoring_sec * 1000, 3),
+            "sorting_ms": round(self.sorting_sec * 1000, 3),
+            "levels": [list(entry) for entry in self.levels],
+        }
@@ -0,0 +1,121 @@
+"""NumPy による候補スコアリング（numpy はこのモジュールの読み込み時にのみ必要）"""
+import numpy as np
+
+from .engine import build_candidate_pools, build_matchup_index
+from .roster import Roster
+
+def generate_matches_core_numpy(match_type, a_pool, b_pool, history, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, allow_consecutive=False, allow_repeat_history=False, excluded_pairs=None, history_index=None, limit=None, ranks=None):
+    """generate_matches_core と同じ結果を、全 A×B 組み合わせの配列演算で求める
+
+    実行可能マスク（同一キー・履歴・ランキング差）、総試合数、候補試合後の
+    バランススコアを候補ごとの Python ループなしで計算する。
+    """
+    excluded_pairs = excluded_pairs or set()
+    if allow_repeat_history:
+        history_index = None
+    elif history_index is None:
+        history_index = build_matchup_index(history)
+
+    a_pool_dict, b_pool_dict, all_players = build_candidate_pools(match_type, a_pool, b_pool, a_doubles_map, b_doubles_map)
+
+    # ペア除外・連戦チェックは候補（選手またはペア）単位で先に行う
+    def eligible_items(pool_dict):
+        return [
+            (item_key, item_players) for item_key, item_players in pool_dict.items()
+            if item_key not in excluded_pairs and (allow_consecutive or not any(player in last_played for player in item_players))
+        ]
+
+    a_items = eligible_items(a_pool_dict)
+    b_items = eligible_items(b_pool_dict)
+    if not a_items or not b_items:
+        return []
+
+    # 選手を整数IDにし、試合数を配列で保持する
+    player_ids = {player: i for i, player in enumerate(dict.fromkeys(all_players))}
+    totals = np.array([
+        player_counts.get(player, {}).get('シングルス', 0) + player_counts.get(player, {}).get('ダブルス', 0)
+        for player in player_ids
+    ], dtype=np.int64)
+
+    def item_slots(items):
+        # 候補ごとの選手IDの表（人数が足りない箇所は -1）
+        width = max(len(item_players) for _, item_players in items)
+        slots = np.full((len(items), width), -1, dtype=np.int64)
+        for row, (_, item_players) in enumerate(items):
+            slots[row, :len(item_players)] = [player_ids[player] for player in item_players]
+        return slots
+
+    a_slots = item_slots(a_items)
+    b_slots = item_slots(b_items)
+    a_positions = {item_key: i for i, (item_key, _) in enumerate(a_items)}
+    b_positions = {item_key: j for j, (item_key, _) in enumerate(b_items)}
+
+    # 実行可能マスク
+    feasible = np.ones((len(a_items), len(b_items)), dtype=bool)
+    for item_key, i in a_positions.items():
+        if item_key in b_positions:
+            feasible[i, b_positions[item_key]] = False
+    if history_index is not None:
+        # ダブルスは同じ4人の対戦（lineup_key）も選手の組から照合する
+        a_lineups, b_lineups = {}, {}
+        if match_type == "ダブルス":
+            for item_key, item_players in a_items:
+                a_lineups.setdefault(frozenset(item_players), []).append(a_positions[item_key])
+            for item_key, item_players in b_items:
+                b_lineups.setdefault(frozenset(item_players), []).append(b_positions[item_key])
+        for played in history_index:
+            if len(played) != 2:
+                continue
+            first, second = played
+            for a_item_key, b_item_key in ((first, second), (second, first)):
+                if a_item_key in a_positions and b_item_key in b_positions:
+                    feasible[a_positions[a_item_key], b_positions[b_item_key]] = False
+                for i in a_lineups.get(a_item_key, ()):
+                    for j in b_lineups.get(b_item_key, ()):
+                        feasible[i, j] = False
+    if match_type == "シングルス":
+        if ranks is None:
+            ranks = Roster(a_pool, b_pool).ranks
+        a_ranks = np.array([ranks[item_key] for item_key, _ in a_items], dtype=np.int64)
+        b_ranks = np.array([ranks[item_key] for item_key, _ in b_items], dtype=np.int64)
+        feasible &= np.abs(a_ranks[:, None] - b_ranks[None, :]) <= max_rank_diff
+
+    # 行優先で取り出すと iter_candidates の列挙順と一致する
+    rows, cols = np.nonzero(feasible)
+    if rows.size == 0:
+        return []
+    slots = np.concatenate([a_slots[rows], b_slots[cols]], axis=1)
+    occupied = slots >= 0
+    slot_totals = np.where(occupied, totals[np.where(occupied, slots, 0)], 0)
+    total_matches = slot_totals.sum(axis=1)
+
+    # 候補試合後の出場選手の試合数（同じ選手が複数枠にいればその分加算）
+    occurrences = ((slots[:, :, None] == slots[:, None, :]) & occupied[:, None, :]).sum(axis=2)
+    new_totals = slot_totals + occurrences
+    sentinel = np.iinfo(np.int64).max
+    high = np.where(occupied, new_totals, -sentinel).max(axis=1)
+    low = np.where(occupied, new_totals, sentinel).min(axis=1)
+
+    # 出場しない選手の最大値・最小値は、試合数順で上位（下位）k+1 人だけ調べれば求まる
+    width = slots.shape[1]
+
+    def untouched_extreme(order):
+        extreme = np.zeros(rows.size, dtype=np.int64)
+        found = np.zeros(rows.size, dtype=bool)
+        for player in order[:width + 1]:
+            hit = ~found & ~(slots == player).any(axis=1)
+            extreme[hit] = totals[player]
+            found |= hit
+        return extreme, found
+
+    untouched_high, has_high = untouched_extreme(np.argsort(-totals, kind="stable"))
+    high = np.where(has_high, np.maximum(high, untouched_high), high)
+    untouched_low, has_low = untouched_extreme(np.argsort(totals, kind="stable"))
+    low = np.where(has_low, np.minimum(low, untouched_low), low)
+    balance_scores = high - low
+
+    # (バランススコア, 総試合数, 列挙順) で安定に並べる
+    ranking = np.lexsort((np.arange(rows.size), total_matches, balance_scores))
+    if limit is not None:
+        ranking = ranking[:limit]
+    return [(a_items[rows[k]][0], b_items[cols[k]][0]) for k in ranking]
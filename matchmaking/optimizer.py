@@ -0,0 +1,414 @@
+"""全コートの組み合わせの一括最適化"""
+import heapq
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from .costs import CandidateBatch, CostContext, evaluate_costs
+from .engine import CONSTRAINT_LEVELS, build_candidate_pools, iter_candidates
+from .metrics import GenerationMetrics
+from .roster import Roster
+
+# --- ラウンド一括最適化 ---
+# 費用の重み（レベル > バランススコア > 総試合数 の辞書式順序を1つの整数で表す。
+# cost_weights の重み付き和がレベルの差を上回り得る場合は、ラウンドごとにレベルの重みを広げる）
+LEVEL_COST_WEIGHT = 10 ** 12
+BALANCE_COST_WEIGHT = 10 ** 6
+
+# 分枝限定法で探索するノード数の上限（レイテンシの上限）
+ROUND_SEARCH_NODE_BUDGET = 20000
+
+# 休養の長い選手を優先する場合に、1ラウンドで必要な人数の何倍まで候補に残すか
+REST_PRIORITY_MARGIN = 2
+
+def min_cost_assignment(edges, max_units):
+    """二部グラフの辺 (a_item, b_item, cost, payload) から、端点を共有しない辺を
+    最大 max_units 本、費用の合計が最小になるように選ぶ（最小費用流・逐次最短路）"""
+    # 端点のどちらかで (費用, 順番) が max_units 番目より後の辺は、より安い辺と入れ替えられるので使わずに済む
+    a_counts = Counter()
+    b_counts = Counter()
+    keep = [False] * len(edges)
+    for index in sorted(range(len(edges)), key=lambda i: edges[i][2]):
+        a_item, b_item = edges[index][0], edges[index][1]
+        keep[index] = a_counts[a_item] < max_units and b_counts[b_item] < max_units
+        a_counts[a_item] += 1
+        b_counts[b_item] += 1
+    edges = [edge for edge, kept in zip(edges, keep) if kept]
+
+    a_ids = {}
+    b_ids = {}
+    for a_item, b_item, _, _ in edges:
+        a_ids.setdefault(a_item, len(a_ids))
+        b_ids.setdefault(b_item, len(b_ids))
+    source = 0
+    sink = len(a_ids) + len(b_ids) + 1
+    node_count = sink + 1
+
+    # 残余グラフ（辺ごとに 行き先・容量・費用・逆辺番号）
+    graph = [[] for _ in range(node_count)]
+
+    def add_edge(u, v, cost):
+        graph[u].append([v, 1, cost, len(graph[v])])
+        graph[v].append([u, 0, -cost, len(graph[u]) - 1])
+
+    for a_node in range(1, len(a_ids) + 1):
+        add_edge(source, a_node, 0)
+    for b_node in range(len(a_ids) + 1, sink):
+        add_edge(b_node, sink, 0)
+    match_edges = []
+    for a_item, b_item, cost, payload in edges:
+        u = 1 + a_ids[a_item]
+        add_edge(u, 1 + len(a_ids) + b_ids[b_item], cost)
+        match_edges.append((u, len(graph[u]) - 1, payload))
+
+    # 費用は非負なのでポテンシャル 0 から Dijkstra を繰り返せる
+    potential = [0] * node_count
+    for _ in range(max_units):
+        dist = [None] * node_count
+        prev = [None] * node_count
+        dist[source] = 0
+        queue = [(0, source)]
+        while queue:
+            d, u = heapq.heappop(queue)
+            if d > dist[u]:
+                continue
+            for index, (v, cap, cost, _) in enumerate(graph[u]):
+                if cap <= 0:
+                    continue
+                nd = d + cost + potential[u] - potential[v]
+                if dist[v] is None or nd < dist[v]:
+                    dist[v] = nd
+                    prev[v] = (u, index)
+                    heapq.heappush(queue, (nd, v))
+        if dist[sink] is None:
+            break
+        for v in range(node_count):
+            if dist[v] is not None:
+                potential[v] += dist[v]
+        v = sink
+        while v != source:
+            u, index = prev[v]
+            edge = graph[u][index]
+            edge[1] -= 1
+            graph[v][edge[3]][1] += 1
+            v = u
+
+    return [payload for u, index, payload in match_edges if graph[u][index][1] == 0]
+
+def _branch_and_bound_assignment(candidates, max_units, node_budget):
+    """選手が重なり得る候補 (cost, players, payload) から、選手を共有しない候補を
+    できるだけ多く、同数なら費用最小で選ぶ（探索ノード数の上限付き）"""
+    candidates = sorted(candidates, key=lambda c: c[0])
+    prefix = [0]
+    for cost, _, _ in candidates:
+        prefix.append(prefix[-1] + cost)
+
+    best = {"count": 0, "cost": 0, "chosen": []}
+    nodes = 0
+
+    def search(start, chosen, used_players, cost):
+        nonlocal nodes
+        if len(chosen) > best["count"] or (len(chosen) == best["count"] and cost < best["cost"]):
+            best.update(count=len(chosen), cost=cost, chosen=list(chosen))
+        remaining = max_units - len(chosen)
+        if remaining == 0:
+            return
+        for i in range(start, len(candidates)):
+            if nodes >= node_budget:
+                return
+            # 残りを最安の候補で埋めても改善しない場合は打ち切る（候補は費用順）
+            if best["count"] == max_units and i + remaining <= len(candidates) and cost + prefix[i + remaining] - prefix[i] >= best["cost"]:
+                return
+            candidate_cost, players, payload = candidates[i]
+            if not used_players.isdisjoint(players):
+                continue
+            nodes += 1
+            chosen.append(payload)
+            search(i + 1, chosen, used_players | set(players), cost + candidate_cost)
+            chosen.pop()
+
+    search(0, [], frozenset(), 0)
+    return best["chosen"]
+
+def _joint_assignment(candidates_by_type, court_counts, independent, initial, node_budget):
+    """シングルスと他の形式の候補 (cost, match, players, level) から、選手を共有しない組み合わせを
+    (割り当てたコート数, 費用の合計) の辞書式で最良に選ぶ（形式 → 候補のリストで返す）
+
+    シングルス以外の形式の候補を分枝限定法で選び、残りの選手のシングルスは最小費用流で決める。
+    シングルスだけで決めた結果（independent）の選手と重ならなければそれがそのまま最小になるので、
+    最小費用流を解くのは重なる場合だけで、改善し得る費用の候補に絞って解く（候補数ぶんのノードとして探索の上限に数える）。
+    initial より良い組み合わせが見つからなければ initial を返す。
+    """
+    singles = sorted(candidates_by_type["シングルス"], key=lambda c: c[0])
+    singles_costs = [candidate[0] for candidate in singles]
+    singles_courts = court_counts["シングルス"]
+    best_singles = independent["シングルス"]
+    best_singles_players = {player for _, _, players, _ in best_singles for player in players}
+    best_singles_cost = sum(candidate[0] for candidate in best_singles)
+    # 他の候補と合わせてシングルスのコートを埋める場合の、他の候補の費用の下限
+    others_cost = sum(singles_costs[:singles_courts - 1])
+    limits = {match_type: count for match_type, count in court_counts.items() if match_type != "シングルス"}
+    outer = sorted(
+        ((candidate, match_type) for match_type in limits for candidate in candidates_by_type[match_type]),
+        key=lambda c: c[0][0])
+    prefix = [0]
+    for (cost, _, _, _), _ in outer:
+        prefix.append(prefix[-1] + cost)
+    outer_units = sum(limits.values())
+    max_units = outer_units + singles_courts
+    lower_bound = _assignment_key(independent.values())
+
+    best = {"key": _assignment_key(initial.values()), "chosen": initial}
+    group_counts = Counter()
+    nodes = 0
+
+    def evaluate(chosen, used_players, cost):
+        nonlocal nodes
+        if used_players.isdisjoint(best_singles_players):
+            singles_chosen = best_singles
+        else:
+            usable = singles
+            if best["key"][0] == -max_units:
+                # 全コートを埋めて改善できるのは、他の最安の候補と合わせて現在の最良を下回る候補だけ
+                usable = singles[:bisect_left(singles_costs, best["key"][1] - cost - others_cost)]
+            usable = [candidate for candidate in usable if used_players.isdisjoint(candidate[2])]
+            nodes += len(usable)
+            singles_chosen = min_cost_assignment(
+                [(match[0], match[1], c, (c, match, players, level)) for c, match, players, level in usable], singles_courts)
+        key = (-len(chosen) - len(singles_chosen), cost + sum(candidate[0] for candidate in singles_chosen))
+        if key < best["key"]:
+            result = {match_type: [] for match_type in court_counts}
+            result["シングルス"] = list(singles_chosen)
+            for candidate, match_type in chosen:
+                result[match_type].append(candidate)
+            best.update(key=key, chosen=result)
+
+    def search(start, chosen, used_players, cost):
+        nonlocal nodes
+        # 全コートを埋めた解があれば、それより良い解は他の形式のコートもすべて埋めている
+        if best["key"][0] > -max_units or len(chosen) == outer_units:
+            evaluate(chosen, used_players, cost)
+        remaining = outer_units - len(chosen)
+        if remaining == 0:
+            return
+        for i in range(start, len(outer)):
+            if nodes >= node_budget or best["key"] == lower_bound:
+                return
+            # 残りを最安の候補とシングルスだけの最小で埋めても改善しない場合は打ち切る（候補は費用順）
+            if best["key"][0] == -max_units and i + remaining <= len(outer) and cost + prefix[i + remaining] - prefix[i] + best_singles_cost >= best["key"][1]:
+                return
+            candidate, match_type = outer[i]
+            if group_counts[match_type] >= limits[match_type] or not used_players.isdisjoint(candidate[2]):
+                continue
+            nodes += 1
+            chosen.append((candidate, match_type))
+            group_counts[match_type] += 1
+            search(i + 1, chosen, used_players | frozenset(candidate[2]), cost + candidate[0])
+            group_counts[match_type] -= 1
+            chosen.pop()
+
+    search(0, [], frozenset(), 0)
+    return best["chosen"]
+
+def _assign_match_type(candidates, court_count, pool_dicts, node_budget):
+    """1つの試合形式の候補 (cost, match, players, level) から court_count 件までの組み合わせを選ぶ"""
+    # 各候補（選手またはペア）の選手が互いに重ならなければ二部マッチングとして解ける
+    a_pool_dict, b_pool_dict = pool_dicts
+    items = {("A", match[0]) for _, match, _, _ in candidates} | {("B", match[1]) for _, match, _, _ in candidates}
+    owners = Counter(
+        player
+        for side, item_key in items
+        for player in set((a_pool_dict if side == "A" else b_pool_dict)[item_key])
+    )
+    if all(count == 1 for count in owners.values()):
+        return min_cost_assignment(
+            [(match[0], match[1], cost, (cost, match, players, level)) for cost, match, players, level in candidates],
+            court_count)
+    return _branch_and_bound_assignment(
+        [(cost, players, (cost, match, players, level)) for cost, match, players, level in candidates],
+        court_count, node_budget)
+
+def _assignment_key(chosen_lists):
+    """形式ごとに選んだ候補のリストから (-割り当てたコート数, 費用の合計)（小さいほど良い）"""
+    chosen = [candidate for candidates in chosen_lists for candidate in candidates]
+    return -len(chosen), sum(candidate[0] for candidate in chosen)
+
+def _round_candidates(match_type, a_pool, b_pool, history_index, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, reachable, ranks=None, cost_weights=None, cost_context=None, metrics=None, candidate_cache=None):
+    """1つの試合形式の候補を (cost, match, players, level) のリストで返す
+
+    cost_weights を指定した場合、レベル以外の費用は評価項目の重み付き和を候補の列全体でまとめて計算する。
+    """
+    if metrics is not None:
+        start = time.perf_counter()
+    if candidate_cache is not None:
+        rows = candidate_cache.iter_candidates(
+            match_type, a_pool, b_pool, a_doubles_map, b_doubles_map, max_rank_diff,
+            allow_consecutive=len(reachable) > 1, allow_repeat_history=2 in reachable, ranks=ranks, metrics=metrics,
+            last_played=last_played)
+    else:
+        rows = iter_candidates(
+            match_type, a_pool, b_pool, history_index, last_played, a_doubles_map, b_doubles_map,
+            player_counts, max_rank_diff, allow_consecutive=len(reachable) > 1,
+            allow_repeat_history=2 in reachable, ranks=ranks, metrics=metrics)
+    candidates = []
+    if cost_weights is None:
+        for level, balance_score, total_matches, match, players in rows:
+            level = next(l for l in reachable if l >= level)
+            cost = level * LEVEL_COST_WEIGHT + balance_score * BALANCE_COST_WEIGHT + total_matches
+            candidates.append((cost, match, players, level))
+    else:
+        rows = list(rows)
+        a_pool_dict, b_pool_dict, _ = build_candidate_pools(match_type, a_pool, b_pool, a_doubles_map, b_doubles_map)
+        batch = CandidateBatch(
+            match_type, [row[1] for row in rows], [row[2] for row in rows],
+            [a_pool_dict[row[3][0]] for row in rows], [b_pool_dict[row[3][1]] for row in rows])
+        for (level, _, _, match, players), weighted in zip(rows, evaluate_costs(batch, cost_weights, cost_context)):
+            level = next(l for l in reachable if l >= level)
+            candidates.append((level * LEVEL_COST_WEIGHT + weighted, match, players, level))
+    if metrics is not None:
+        metrics.scoring_sec += time.perf_counter() - start
+    return candidates
+
+def _widen_level_weight(candidates_by_type, court_count):
+    """重み付き和の費用が緩和レベル1段分を上回り得る場合に、レベルの重みを広げた候補を返す
+
+    評価項目の値と重みは 0 以上なので、レベル以外の費用の最大値のコート数倍より
+    レベルの重みが大きければ、どの割当でもレベルの合計が小さい方が費用も小さい。
+    """
+    extra = max((cost - level * LEVEL_COST_WEIGHT for candidates in candidates_by_type.values() for cost, _, _, level in candidates), default=0)
+    if extra * court_count < LEVEL_COST_WEIGHT:
+        return candidates_by_type
+    shift = extra * (court_count + 1) - LEVEL_COST_WEIGHT
+    return {
+        match_type: [(cost + level * shift, match, players, level) for cost, match, players, level in candidates]
+        for match_type, candidates in candidates_by_type.items()
+    }
+
+def rested_pools(state, courts, a_pool, b_pool):
+    """休養の長い順に、1ラウンドで必要な人数の REST_PRIORITY_MARGIN 倍まで各チームの選手を選ぶ（optimize_round の preferred_pools）"""
+    needed = sum(2 if match_type == "ダブルス" else 1 for _, match_type in courts) * REST_PRIORITY_MARGIN
+    return state.longest_rested(a_pool, needed), state.longest_rested(b_pool, needed)
+
+def optimize_round(courts, a_pool, b_pool, history_index, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, allow_consecutive_global=True, allow_repeat_global=False, node_budget=ROUND_SEARCH_NODE_BUDGET, executor=None, banned_matches=None, ranks=None, cost_weights=None, cost_context=None, metrics=None, candidate_cache=None, preferred_pools=None):
+    """全コートの組み合わせを1つの割当問題としてまとめて決定する
+
+    courts は (コート名, 試合形式) のリストで、コート数は任意。コートの順に
+    (match, コート名, 試合形式, 制約緩和レベル) を返し、割り当てられなかったコートは
+    (None, コート名, 試合形式, "failed") となる。
+    費用は各コートの (制約緩和レベル, バランススコア, 総試合数) の合計で、
+    cost_weights（評価項目名 → 重み）を指定するとレベル以外は matchmaking.costs の項目の重み付き和になる
+    （cost_context は項目が参照する CostContext。省略時は空の大会として扱う）。
+    選手やペアがコート間で重複しない組み合わせの中から最小のものを選ぶ。
+    候補の列挙は試合形式ごとに1回だけ行い、executor を渡すと形式が複数ある場合に
+    並行して行う（未指定なら順に行う）。banned_matches に含まれる試合は選ばない。
+    metrics（GenerationMetrics）を渡すと、候補数・除外数・処理時間とコートごとの採用レベルを記録する。
+    candidate_cache（CandidateCache）を渡すと、前のラウンドから変わった候補だけを計算し直す
+    （history_index・player_counts はそのキャッシュの EventState のものを渡す）。
+    last_played は連戦とみなす選手の集合（最低休養ラウンド数を満たさない選手）。
+    preferred_pools に (A の選手, B の選手) を渡すと、まずその選手（とその選手だけのペア）で
+    組み合わせを決め、割り当てられないコートや全選手で決めるより制約を緩和したコートがあれば
+    全選手で決め直す（休養の長い選手の優先）。
+    """
+    if preferred_pools is not None:
+        if ranks is None:
+            ranks = Roster(a_pool, b_pool).ranks
+        preferred = set(preferred_pools[0]) | set(preferred_pools[1])
+        preferred_metrics = GenerationMetrics() if metrics is not None else None
+        round_plan = optimize_round(
+            courts, list(preferred_pools[0]), list(preferred_pools[1]), history_index, last_played,
+            {item_key: players for item_key, players in a_doubles_map.items() if preferred.issuperset(players)},
+            {item_key: players for item_key, players in b_doubles_map.items() if preferred.issuperset(players)},
+            player_counts, max_rank_diff, allow_consecutive_global, allow_repeat_global, node_budget, executor,
+            banned_matches, ranks, cost_weights, cost_context, preferred_metrics)
+        if all(level != "failed" for *_, level in round_plan):
+            if any(level != CONSTRAINT_LEVELS[0] for *_, level in round_plan):
+                # 全選手なら緩和せずに済むコートがあれば、休養の優先より制約を優先する
+                full_metrics = GenerationMetrics() if metrics is not None else None
+                full_plan = optimize_round(
+                    courts, a_pool, b_pool, history_index, last_played, a_doubles_map, b_doubles_map,
+                    player_counts, max_rank_diff, allow_consecutive_global, allow_repeat_global, node_budget, executor,
+                    banned_matches, ranks, cost_weights, cost_context, full_metrics, candidate_cache)
+                if any(
+                    full_level != "failed" and CONSTRAINT_LEVELS.index(full_level) < CONSTRAINT_LEVELS.index(level)
+                    for (*_, level), (*_, full_level) in zip(round_plan, full_plan)
+                ):
+                    round_plan, preferred_metrics = full_plan, full_metrics
+            if metrics is not None:
+                metrics.merge(preferred_metrics)
+            return round_plan
+    banned_matches = banned_matches or set()
+    # 到達可能な緩和レベル
+    reachable = [0]
+    if allow_consecutive_global:
+        reachable.append(1)
+    if allow_repeat_global:
+        reachable.append(2)
+
+    courts_by_type = {}
+    for court, match_type in courts:
+        courts_by_type.setdefault(match_type, []).append(court)
+
+    # 試合形式ごとの候補は互いに独立なので、executor があれば並行して列挙する
+    # （純 Python の列挙は GIL で直列になるので、未指定なら順に列挙する）
+    match_types = list(courts_by_type)
+    if cost_weights is not None and cost_context is None:
+        cost_context = CostContext(ranks=ranks if ranks is not None else Roster(a_pool, b_pool).ranks)
+    args = (a_pool, b_pool, history_index, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, reachable, ranks, cost_weights, cost_context)
+    # 並行する列挙が同じ計測値を書き換えないよう、試合形式ごとに分けて後で合算する
+    type_metrics = {match_type: GenerationMetrics() if metrics is not None else None for match_type in match_types}
+    if executor is not None and len(match_types) > 1:
+        futures = {match_type: executor.submit(_round_candidates, match_type, *args, type_metrics[match_type], candidate_cache) for match_type in match_types}
+        candidates_by_type = {match_type: future.result() for match_type, future in futures.items()}
+    else:
+        candidates_by_type = {match_type: _round_candidates(match_type, *args, type_metrics[match_type], candidate_cache) for match_type in match_types}
+    if metrics is not None:
+        for match_metrics in type_metrics.values():
+            metrics.merge(match_metrics)
+        start = time.perf_counter()
+    if cost_weights is not None:
+        candidates_by_type = _widen_level_weight(candidates_by_type, len(courts))
+
+    candidates_by_type = {
+        match_type: [candidate for candidate in candidates if candidate[1] not in banned_matches]
+        for match_type, candidates in candidates_by_type.items()
+    }
+    court_counts = {match_type: len(type_courts) for match_type, type_courts in courts_by_type.items()}
+    pool_dicts = {match_type: build_candidate_pools(match_type, a_pool, b_pool, a_doubles_map, b_doubles_map)[:2] for match_type in courts_by_type}
+    # 形式ごとに他の形式と独立に決めた結果（その費用の合計が全体の下限）
+    independent = {
+        match_type: _assign_match_type(candidates_by_type[match_type], court_counts[match_type], pool_dicts[match_type], node_budget)
+        for match_type in courts_by_type
+    }
+    lower_bound = _assignment_key(independent.values())
+
+    # ペアは選手より候補が少なく制約が厳しいため、ダブルスから形式ごとに順に決める。
+    # 先の形式のコートに入った選手を含む候補は後の形式から除外するが、独立に決めた結果の選手と
+    # 重ならなければその結果のままでよい
+    chosen_by_type = {}
+    used_players = set()
+    for match_type in sorted(courts_by_type, key=lambda t: t != "ダブルス"):
+        chosen = independent[match_type]
+        if not all(used_players.isdisjoint(players) for _, _, players, _ in chosen):
+            available = [candidate for candidate in candidates_by_type[match_type] if used_players.isdisjoint(candidate[2])]
+            chosen = _assign_match_type(available, court_counts[match_type], pool_dicts[match_type], node_budget)
+        chosen_by_type[match_type] = chosen
+        for _, _, players, _ in chosen:
+            used_players.update(players)
+
+    # 形式間で選手を取り合って下限に届かなければ、シングルスと他の形式をまとめて探索し直す
+    if _assignment_key(chosen_by_type.values()) != lower_bound:
+        chosen_by_type = _joint_assignment(candidates_by_type, court_counts, independent, chosen_by_type, node_budget)
+
+    # 費用の低い組み合わせから順にコートへ割り当てる
+    results = {}
+    for match_type, chosen in chosen_by_type.items():
+        chosen = sorted(chosen, key=lambda c: c[0])
+        for court, (_, match, _, level) in zip(courts_by_type[match_type], chosen):
+            results[court] = (match, court, match_type, CONSTRAINT_LEVELS[level])
+
+    round_plan = [results.get(court, (None, court, match_type, "failed")) for court, match_type in courts]
+    if metrics is not None:
+        metrics.sorting_sec += time.perf_counter() - start
+        for _, court, _, level in round_plan:
+            metrics.record_level(court, level)
+    return round_plan
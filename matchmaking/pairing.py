@@ -0,0 +1,69 @@
+"""ダブルスペアのラウンドごとの自動編成"""
+from .optimizer import min_cost_assignment
+from .roster import Roster
+
+# 自動編成したペアの名前は選手名をこの文字でつなぐ（名前から選手を復元できる）
+PAIR_SEPARATOR = "+"
+
+# 過去に組んだ回数の重み（ペアのランキング合計の偏りより優先する）
+PARTNER_COST_WEIGHT = 10 ** 9
+
+def pair_name(players):
+    """自動編成したペアの名前"""
+    return PAIR_SEPARATOR.join(players)
+
+def pair_members(name):
+    """自動編成したペアの名前から選手を返す"""
+    return name.split(PAIR_SEPARATOR)
+
+def select_doubles_players(players, count, last_played, player_counts):
+    """ダブルスに出す選手を count 人選ぶ（last_played に含まれない選手、試合数・ダブルス試合数の少ない選手の順）"""
+    def priority(entry):
+        position, player = entry
+        counts = player_counts.get(player, {})
+        singles, doubles = counts.get('シングルス', 0), counts.get('ダブルス', 0)
+        return (player in last_played, singles + doubles, doubles, position)
+
+    return [player for _, player in sorted(enumerate(players), key=priority)[:count]]
+
+def form_pairs(players, pair_count, last_played, player_counts, partner_count, ranks):
+    """1チームの選手から最大 pair_count 組のペアを編成し {ペア名: [選手, 選手]} を返す
+
+    select_doubles_players で選んだ選手をランキングの上位半分と下位半分に分け、
+    上位1人と下位1人を組ませる割当問題（最小費用流）として解く。費用は
+    (過去に同じ相手と組んだ回数, ペアのランキング合計と平均の差) の辞書式順序で、
+    同じ相手と続けて組むのを避けながら、ペア同士の実力差が小さくなるようにする。
+    partner_count(選手, 選手) は2人が組んだ回数を返す関数（EventState.partner_count）。
+    """
+    pair_count = min(pair_count, len(players) // 2)
+    if pair_count <= 0:
+        return {}
+    order = {player: position for position, player in enumerate(players)}
+    selected = select_doubles_players(players, 2 * pair_count, last_played, player_counts)
+    selected.sort(key=lambda player: (ranks[player], order[player]))
+    upper, lower = selected[:pair_count], selected[pair_count:]
+
+    # ペアの合計ランキングと平均（rank_total / pair_count）の差を pair_count 倍して整数で扱う
+    rank_total = sum(ranks[player] for player in selected)
+    edges = [
+        (strong, weak,
+         partner_count(strong, weak) * PARTNER_COST_WEIGHT
+         + abs(pair_count * (ranks[strong] + ranks[weak]) - rank_total),
+         (strong, weak))
+        for strong in upper
+        for weak in lower
+    ]
+    pairs = min_cost_assignment(edges, pair_count)
+    pairs.sort(key=lambda pair: order[pair[0]])
+    return {pair_name(pair): list(pair) for pair in pairs}
+
+def form_round_pairs(courts, a_players, b_players, state, ranks, min_rest=1):
+    """courts のダブルスのコート数ぶん、両チームのペアを state（EventState）に基づいて編成する
+
+    最低休養ラウンド数（min_rest）を満たさない選手は後回しにする。
+    """
+    if ranks is None:
+        ranks = Roster(a_players, b_players).ranks
+    pair_count = sum(1 for _, match_type in courts if match_type == "ダブルス")
+    args = (state.players_resting(min_rest), state.balance_counts, state.partner_count, ranks)
+    return form_pairs(a_players, pair_count, *args), form_pairs(b_players, pair_count, *args)
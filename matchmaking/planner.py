@@ -0,0 +1,72 @@
+"""セッション全体の事前計画"""
+from .balance import get_match_balance_score
+from .costs import CostContext
+from .engine import CONSTRAINT_LEVELS
+from .optimizer import optimize_round, rested_pools
+from .pairing import form_round_pairs
+from .state import EventState
+
+# --- セッション全体の事前計画 ---
+def _round_alternatives(courts, state, a_pool, b_pool, a_doubles_map, b_doubles_map, max_rank_diff, allow_consecutive_global, allow_repeat_global, branching, ranks=None, cost_weights=None, min_rest=1, rest_priority=False):
+    """最適なラウンドと、その試合を1つずつ禁止して解き直した代替案を最大 branching 件返す"""
+    args = (courts, a_pool, b_pool, state.played_matchups, state.players_resting(min_rest), a_doubles_map, b_doubles_map,
+            state.balance_counts, max_rank_diff, allow_consecutive_global, allow_repeat_global)
+    options = {"ranks": ranks}
+    if rest_priority:
+        options["preferred_pools"] = rested_pools(state, courts, a_pool, b_pool)
+    if cost_weights is not None:
+        options.update(cost_weights=cost_weights, cost_context=CostContext(state, ranks))
+    best = optimize_round(*args, **options)
+    alternatives = [best]
+    seen = {frozenset(match for match, _, _, _ in best)}
+    for match, _, _, _ in best:
+        if len(alternatives) >= branching or match is None:
+            break
+        alternative = optimize_round(*args, banned_matches={match}, **options)
+        key = frozenset(m for m, _, _, _ in alternative)
+        if key not in seen:
+            seen.add(key)
+            alternatives.append(alternative)
+    return alternatives
+
+def plan_session(courts, a_pool, b_pool, a_doubles_map, b_doubles_map, max_rank_diff, rounds, state=None, allow_consecutive_global=True, allow_repeat_global=False, beam_width=3, branching=3, ranks=None, auto_pairs=False, cost_weights=None, min_rest=1, rest_priority=False):
+    """ビームサーチで rounds ラウンド分の組み合わせを事前に計画する
+
+    各ラウンドは optimize_round と同じ形式のリストで返す。計画の評価は
+    (割当失敗コート数, 制約緩和レベルの合計, 現時点の試合数の最大差) の辞書式順序で、
+    序盤の貪欲な選択が後半の制約緩和を招く計画を避ける。
+    auto_pairs=True の場合は計画中の状態ごとにダブルスのペアを自動編成する。
+    cost_weights は optimize_round と同じ評価項目の重みで、計画中の状態ごとに評価する。
+    min_rest・rest_priority は Session と同じ休養の設定で、計画中の状態の休養から判定する。
+    """
+    state = state.copy() if state is not None else EventState()
+    doubles_input = {**a_doubles_map, **b_doubles_map}
+    all_players = list(a_pool) + list(b_pool)
+    for players in doubles_input.values():
+        all_players.extend(players)
+    all_players = list(dict.fromkeys(all_players))
+    state.register_players(all_players)
+
+    # (評価値, 試合状態, 計画済みラウンド) のビーム
+    beam = [((0, 0, 0), state, [])]
+    for _ in range(rounds):
+        expanded = []
+        for (failed, levels, _), node_state, plan in beam:
+            round_a_doubles_map, round_b_doubles_map = a_doubles_map, b_doubles_map
+            if auto_pairs:
+                round_a_doubles_map, round_b_doubles_map = form_round_pairs(courts, a_pool, b_pool, node_state, ranks, min_rest)
+            round_doubles_input = {**doubles_input, **round_a_doubles_map, **round_b_doubles_map}
+            for round_plan in _round_alternatives(courts, node_state, a_pool, b_pool, round_a_doubles_map, round_b_doubles_map,
+                                                  max_rank_diff, allow_consecutive_global, allow_repeat_global, branching, ranks, cost_weights,
+                                                  min_rest, rest_priority):
+                next_state = node_state.copy()
+                next_state.apply_round([(match, court, match_type) for match, court, match_type, level in round_plan if level != "failed"], round_doubles_input)
+                score = (
+                    failed + sum(1 for *_, level in round_plan if level == "failed"),
+                    levels + sum(CONSTRAINT_LEVELS.index(level) for *_, level in round_plan if level != "failed"),
+                    get_match_balance_score(all_players, next_state.balance_counts),
+                )
+                expanded.append((score, next_state, plan + [round_plan]))
+        expanded.sort(key=lambda node: node[0])
+        beam = expanded[:beam_width]
+    return beam[0][2] if beam else []
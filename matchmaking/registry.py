@@ -0,0 +1,116 @@
+"""サーバー全体で共有する大会の登録簿"""
+import shutil
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from .session import Session
+from .store import EventStore, event_directory
+
+# メモリに保持する大会数の上限と、最後の利用から追い出すまでの秒数の既定値
+DEFAULT_MAX_EVENTS = 100
+DEFAULT_EVENT_TTL = 60 * 60
+
+class EventRegistry:
+    """大会IDごとの Session を LRU・TTL で上限付きに保持する
+
+    上限を超えた大会や ttl 秒以上使われていない大会はメモリから追い出し、
+    その時点のスナップショットを保存先に書き出す。次に使われたときは保存先から読み直す
+    （事前計画は保存しないので読み直した大会では破棄される）。
+    追い出した後も呼び出し元が Session を使い続けている間は、読み直さずにその Session を返す
+    （同じ大会の Session が2つできて同じ保存先に書き込むのを防ぐ）。
+    on_evict に関数を設定すると、メモリから外した大会IDを渡して呼ぶ（登録簿のロックの中で呼ばれる）。
+    """
+
+    def __init__(self, root, max_events=DEFAULT_MAX_EVENTS, ttl=DEFAULT_EVENT_TTL, clock=time.monotonic):
+        self.root = root
+        self.max_events = max_events
+        self.ttl = ttl
+        self.clock = clock
+        self.on_evict = None
+        # 大会ID → (Session, 最終利用時刻)。先頭ほど長く使われていない
+        self._sessions = OrderedDict()
+        # 大会ID → 追い出した後もどこかで使われている Session
+        self._live = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, event_id):
+        return event_id in self._sessions
+
+    def get(self, event_id):
+        """大会の Session を返す（メモリになければ保存先から設定と状態を読み込む。不正なIDは ValueError）"""
+        directory = event_directory(self.root, event_id)
+        with self._lock:
+            now = self.clock()
+            entry = self._sessions.pop(event_id, None)
+            if entry is not None:
+                session = entry[0]
+            else:
+                session = self._live.get(event_id)
+                if session is None:
+                    store = EventStore(directory)
+                    session = Session(**(store.read_settings() or {}), store=store)
+                    self._live[event_id] = session
+            self._sessions[event_id] = (session, now)
+            self._evict(now)
+            return session
+
+    def create(self, event_id, settings):
+        """設定を保存して新しい大会を登録し、その Session を返す（既にあれば ValueError）
+
+        設定から Session を作れることを確かめてから保存するので、不正な設定の大会は保存先に残らない。
+        """
+        store = EventStore(event_directory(self.root, event_id))
+        with self._lock:
+            if event_id in self._sessions or event_id in self._live or store.exists() or store.read_settings() is not None:
+                raise ValueError(f"既に存在する大会IDです: {event_id!r}")
+            session = Session(**settings, store=store)
+            try:
+                store.write_settings(settings)
+            except BaseException:
+                shutil.rmtree(store.directory, ignore_errors=True)
+                raise
+            now = self.clock()
+            self._live[event_id] = session
+            self._sessions[event_id] = (session, now)
+            self._evict(now)
+            return session
+
+    def known(self, event_id):
+        """メモリか保存先に存在する大会か（不正なIDは False）"""
+        try:
+            store = EventStore(event_directory(self.root, event_id))
+        except ValueError:
+            return False
+        return event_id in self._sessions or event_id in self._live or store.exists() or store.read_settings() is not None
+
+    def evict_expired(self):
+        """ttl を過ぎた大会を追い出す"""
+        with self._lock:
+            self._evict(self.clock())
+
+    def close(self):
+        """すべての大会を保存先に書き出してメモリから外す"""
+        with self._lock:
+            while self._sessions:
+                event_id, (session, _) = self._sessions.popitem(last=False)
+                self._spill(event_id, session)
+
+    def _evict(self, now):
+        while self._sessions:
+            event_id, (_, last_used) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_events and now - last_used < self.ttl:
+                break
+            session, _ = self._sessions.pop(event_id)
+            self._spill(event_id, session)
+
+    def _spill(self, event_id, session):
+        # ログの末尾までを含むスナップショットにして、読み直しを速くする
+        # （追い出した大会の確定が別スレッドで進んでいても、確定の途中の状態は書き出さない）
+        session.checkpoint()
+        if self.on_evict is not None:
+            self.on_evict(event_id)
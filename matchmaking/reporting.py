@@ -0,0 +1,142 @@
+"""統計表の作成（pandas は呼び出し時にのみ読み込む）"""
+import weakref
+
+from .state import MATCH_TYPES
+
+def history_table(event):
+    """対戦履歴の DataFrame（Round を索引とする。履歴がなければ空）"""
+    import pandas as pd
+
+    history_df = pd.DataFrame(event.history_columns())
+    if history_df.empty:
+        return history_df
+    return history_df.set_index('Round')
+
+def history_rows_table(event, positions):
+    """指定した行番号（EventState.history_positions の結果の一部など）の対戦履歴の DataFrame"""
+    import pandas as pd
+
+    return pd.DataFrame(event.history_columns(positions=positions)).set_index('Round')
+
+def player_count_table(event, players):
+    """個人別試合数の DataFrame（未試合の選手も含む）"""
+    import pandas as pd
+
+    match_data = []
+    for player in players:
+        if player in event.player_match_count:
+            counts = event.player_match_count[player]
+            singles_count = counts['シングルス']
+            doubles_count = counts['ダブルス']
+        else:
+            singles_count = 0
+            doubles_count = 0
+
+        total = singles_count + doubles_count
+        match_data.append({
+            'Player': player,
+            'シングルス': singles_count,
+            'ダブルス': doubles_count,
+            'Total': total
+        })
+
+    match_count_df = pd.DataFrame(match_data, columns=['Player', 'シングルス', 'ダブルス', 'Total'])
+    return match_count_df.sort_values(by="Player").set_index("Player")
+
+def team_count_table(event):
+    """ペア別ダブルス試合数の DataFrame（ダブルスの試合がなければ空）"""
+    import pandas as pd
+
+    team_data = []
+    for team, count in event.team_match_count.items():
+        team_data.append({
+            'Team': team,
+            'Matches Played': count
+        })
+    team_count_df = pd.DataFrame(team_data, columns=['Team', 'Matches Played'])
+    return team_count_df.sort_values(by="Team").set_index("Team")
+
+class ReportCache:
+    """統計表のキャッシュ（EventState.version が変わったときだけ更新する）
+
+    対戦履歴は追加された行だけを連結し、ペア別試合数は追加された行に出てくるペアだけを、
+    個人別試合数は直前のラウンドの出場選手だけを更新する。
+    それ以外の変化（別の大会状態・選手の構成変更・複数ラウンド分の遅れ）では作り直す。
+    大会状態は弱参照で持つので、登録簿から追い出された大会をキャッシュが引き留めることはない。
+    """
+    __slots__ = ("_event", "_history", "_history_rows", "_players", "_players_key", "_teams", "_teams_rows")
+
+    def __init__(self):
+        self._event = lambda: None
+        self._history = None
+        self._history_rows = 0
+        # 個人別試合数は (選手の並び, version) を鍵とする
+        self._players = None
+        self._players_key = None
+        self._teams = None
+        self._teams_rows = 0
+
+    def _bind(self, event):
+        # 別の大会状態に切り替わったらすべて破棄する
+        if self._event() is not event:
+            self.__init__()
+            self._event = weakref.ref(event)
+
+    def history_table(self, event):
+        """history_table と同じ DataFrame（追加分のみ連結）"""
+        import pandas as pd
+
+        self._bind(event)
+        rows = len(event.history_round)
+        if self._history is None or self._history.empty:
+            self._history = history_table(event)
+        elif rows > self._history_rows:
+            added = pd.DataFrame(event.history_columns(self._history_rows)).set_index('Round')
+            self._history = pd.concat([self._history, added])
+        self._history_rows = rows
+        return self._history
+
+    def player_count_table(self, event, players):
+        """player_count_table と同じ DataFrame（直前のラウンドの出場選手の行のみ更新）"""
+        self._bind(event)
+        players = tuple(players)
+        key = (players, event.version)
+        if self._players_key == key:
+            return self._players
+        if self._players_key is None or self._players_key[0] != players or self._players_key[1] != event.version - 1:
+            self._players = player_count_table(event, players)
+        else:
+            for player in event.last_played_players:
+                if player in self._players.index:
+                    counts = event.player_match_count[player]
+                    singles_count = counts['シングルス']
+                    doubles_count = counts['ダブルス']
+                    self._players.loc[player, ['シングルス', 'ダブルス', 'Total']] = [singles_count, doubles_count, singles_count + doubles_count]
+        self._players_key = key
+        return self._players
+
+    def team_count_table(self, event):
+        """team_count_table と同じ DataFrame（追加された履歴に出てくるペアの行のみ更新）"""
+        import pandas as pd
+
+        self._bind(event)
+        rows = len(event.history_round)
+        if self._teams is None or self._teams.empty:
+            self._teams = team_count_table(event)
+        elif rows > self._teams_rows:
+            teams = event.team_match_count
+            added = {}
+            for start in range(self._teams_rows, rows):
+                if MATCH_TYPES[event.history_type[start]] != 'ダブルス':
+                    continue
+                for item_id in (event.history_a[start], event.history_b[start]):
+                    team = event.item_names[item_id]
+                    if team in self._teams.index:
+                        self._teams.loc[team, 'Matches Played'] = teams[team]
+                    else:
+                        added[team] = teams[team]
+            if added:
+                added_df = pd.DataFrame({'Team': list(added), 'Matches Played': list(added.values())}).set_index('Team')
+                self._teams = pd.concat([self._teams, added_df]).sort_index()
+        self._teams_rows = rows
+        return self._teams
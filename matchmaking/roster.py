@@ -0,0 +1,47 @@
+"""選手名簿とランキング索引"""
+from bisect import bisect_left, bisect_right
+
+# --- 選手名簿（ランキング表） ---
+def default_rank(player, team, position):
+    """ランキングを指定しない選手の既定のランキング（選手名の番号 A3 → 3、番号がなければチーム内の順番）"""
+    number = player[len(team):] if player.startswith(team) else ""
+    return int(number) if number.isdigit() else position + 1
+
+class RankTable(dict):
+    """選手名 → ランキングの表（ランキングのない選手を参照した時点で、その選手を示す ValueError を送出する）"""
+    __slots__ = ()
+
+    def __missing__(self, player):
+        raise ValueError(f"{player} のランキングが指定されていません（シングルスのランキング差の判定に必要です）")
+
+class Roster:
+    """両チームの選手と、事前に求めた整数ランキング（任意でレーティング）
+
+    ranks を省略した場合は選手名の番号（A3 → 3）、番号のない選手名ではチーム内の順番をランキングとする。
+    ranks を指定した場合、含まれない選手のランキングは実際に必要になったときに ValueError とする。
+    """
+    __slots__ = ("a_players", "b_players", "ranks", "ratings")
+
+    def __init__(self, a_players, b_players, ranks=None, ratings=None):
+        self.a_players = list(a_players)
+        self.b_players = list(b_players)
+        if ranks is None:
+            ranks = {player: default_rank(player, "A", position) for position, player in enumerate(self.a_players)}
+            ranks.update((player, default_rank(player, "B", position)) for position, player in enumerate(self.b_players))
+        self.ranks = RankTable(ranks)
+        self.ratings = dict(ratings or {})
+
+class RankWindowIndex:
+    """ランキング順に並べた候補の索引。ランキング差が一定以内の候補だけを取り出す"""
+    __slots__ = ("ranks", "positions")
+
+    def __init__(self, ranks):
+        ordered = sorted((rank, position) for position, rank in enumerate(ranks))
+        self.ranks = [rank for rank, _ in ordered]
+        self.positions = [position for _, position in ordered]
+
+    def positions_within(self, rank, max_rank_diff):
+        """ランキング差が max_rank_diff 以内の候補の位置を、元の順序で返す"""
+        start = bisect_left(self.ranks, rank - max_rank_diff)
+        end = bisect_right(self.ranks, rank + max_rank_diff)
+        return sorted(self.positions[start:end])
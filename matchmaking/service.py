@@ -0,0 +1,336 @@
+"""組み合わせ生成の HTTP/JSON サービス（asyncio・標準ライブラリのみ）
+
+    python -m matchmaking.service --port 8080 --data-dir data/events
+
+    POST /events                       大会を作成（本文は一括生成 CLI の大会定義と同じ形式）
+    GET  /events/{id}                  大会の設定と進行状況
+    POST /events/{id}/rounds           次のラウンドの組み合わせを生成（確定はしない）
+    POST /events/{id}/rounds/confirm   ラウンドを確定（本文の matches、省略時は直前に生成した組み合わせ）
+    GET  /events/{id}/stats            試合数の統計
+    POST /events/{id}/roster           途中参加・途中退出・棄権（本文の action・player、参加時は team・rank）
+
+組み合わせ生成は CPU を使うのでプロセスプール（入力の準備はスレッド）で行い、イベントループを塞がない。
+大会は EventRegistry で保持し、確定したラウンドと設定は保存先に書き出す。
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import traceback
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+from .cli import SESSION_SETTINGS, normalize_event, round_plan_records
+from .costs import CostContext
+from .optimizer import optimize_round
+from .registry import DEFAULT_EVENT_TTL, DEFAULT_MAX_EVENTS, EventRegistry
+from .state import MATCH_TYPES
+
+# リクエスト本文の上限（バイト）
+MAX_BODY_BYTES = 1 << 20
+
+class HTTPError(Exception):
+    """ステータスコード付きのエラー応答"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def worker_round_args(session):
+    """ワーカープロセスの optimize_round に渡す引数（大会の状態全体は重みを指定した評価でのみ渡す）"""
+    args = session.round_args()
+    event = session.event
+    players = {*args["a_pool"], *args["b_pool"]}
+    for doubles_map in (args["a_doubles_map"], args["b_doubles_map"]):
+        players.update(player for pair in doubles_map.values() for player in pair)
+    counts = event.balance_counts
+    args["history_index"] = event.played_matchups
+    args["player_counts"] = {player: dict(counts[player]) for player in players if player in counts}
+    args["cost_context"] = CostContext(event, args["ranks"]) if args["cost_weights"] else None
+    return args
+
+def generate_round_in_worker(round_args):
+    """ワーカープロセスで worker_round_args の引数から1ラウンドを生成（optimize_round と同じ形式で返す）"""
+    return optimize_round(**round_args)
+
+def _parse_matches(records, session):
+    """確定する試合の辞書のリストを (match, コート名, 試合形式) のリストに変換"""
+    if not isinstance(records, list) or not records:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "matches は試合のリストで指定してください")
+    matches = []
+    players = Counter()
+    active_a, active_b = set(session.a_players), set(session.b_players)
+    for record in records:
+        if not isinstance(record, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "試合は辞書で指定してください")
+        court, match_type = record.get("court"), record.get("match_type")
+        team_a, team_b = record.get("team_a"), record.get("team_b")
+        if match_type not in MATCH_TYPES:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"未対応の試合形式です: {match_type}")
+        if not all(isinstance(value, str) and value for value in (court, team_a, team_b)):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"{court}の court・team_a・team_b を指定してください")
+        if match_type == "ダブルス":
+            a_side, b_side = session.pair_players(team_a), session.pair_players(team_b)
+            if a_side is None or b_side is None:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"{court}のペアが登録されていません")
+        else:
+            a_side, b_side = [team_a], [team_b]
+        # 途中退出した選手や相手チームの選手は入れられない
+        if not set(a_side) <= active_a or not set(b_side) <= active_b:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"{court}の team_a・team_b はそれぞれ参加中の Aチーム・Bチームの選手（ペア）で指定してください")
+        players.update(a_side + b_side)
+        matches.append(((team_a, team_b), court, match_type))
+    duplicate_players = [player for player, count in players.items() if count > 1]
+    if duplicate_players:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"同じ選手が複数のコートに入っています: {', '.join(duplicate_players)}")
+    return matches
+
+class MatchmakingService:
+    """大会ごとの生成・確定を受け付ける HTTP/JSON サービス
+
+    同じ大会への生成・確定は大会ごとのロックで順に処理し、別の大会は並行して処理する。
+    Session はロックを取ってから登録簿から取り出すので、待っている間に追い出された大会も読み直した Session で処理する。
+    登録簿から追い出された大会のロックと未確定の組み合わせは、使用中でなくなった時点で捨てる。
+    executor を省略した場合は生成も同じプロセスのスレッドで行う。
+    """
+
+    def __init__(self, registry, executor=None):
+        self.registry = registry
+        self.executor = executor
+        # 大会ID → [ロック, ロックを使用中・待機中のリクエスト数]、直前に生成して未確定の組み合わせ
+        self._locks = {}
+        self._pending = {}
+        # 登録簿から追い出された大会ID（登録簿のスレッドから追加される）
+        self._evicted = deque()
+        registry.on_evict = self._evicted.append
+        self.routes = [
+            ("POST", re.compile(r"/events"), self.create_event),
+            ("GET", re.compile(r"/events/(?P<event_id>[^/]+)"), self.get_event),
+            ("POST", re.compile(r"/events/(?P<event_id>[^/]+)/rounds"), self.generate_round),
+            ("POST", re.compile(r"/events/(?P<event_id>[^/]+)/rounds/confirm"), self.confirm_round),
+            ("GET", re.compile(r"/events/(?P<event_id>[^/]+)/stats"), self.get_stats),
+            ("POST", re.compile(r"/events/(?P<event_id>[^/]+)/roster"), self.change_roster),
+        ]
+
+    async def _session(self, event_id):
+        if not await asyncio.to_thread(self.registry.known, event_id):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"大会が見つかりません: {event_id}")
+        # 保存先からの読み込みはファイル入出力を伴うのでスレッドで行う
+        return await asyncio.to_thread(self.registry.get, event_id)
+
+    @contextlib.asynccontextmanager
+    async def _locked_session(self, event_id):
+        """大会ごとのロックを取ってから大会の Session を取り出す"""
+        if not await asyncio.to_thread(self.registry.known, event_id):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"大会が見つかりません: {event_id}")
+        entry = self._locks.setdefault(event_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield await asyncio.to_thread(self.registry.get, event_id)
+        finally:
+            entry[1] -= 1
+            if event_id not in self.registry:
+                self._forget(event_id)
+
+    def _forget(self, event_id):
+        # 使用中のロックは残し、最後に使い終わったリクエストが捨てる
+        entry = self._locks.get(event_id)
+        if entry is None or entry[1] == 0:
+            self._locks.pop(event_id, None)
+            self._pending.pop(event_id, None)
+
+    def _forget_evicted(self):
+        while self._evicted:
+            self._forget(self._evicted.popleft())
+
+    async def create_event(self, body):
+        if not isinstance(body, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "大会定義は辞書で指定してください")
+        event_id = body.get("event_id") or uuid.uuid4().hex
+        try:
+            definition = normalize_event(body, 0)
+        except (KeyError, TypeError, ValueError) as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"大会定義が不正です: {e}")
+        if definition["roster_events"]:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "roster_events は大会の作成後に /events/{id}/roster で指定してください")
+        if await asyncio.to_thread(self.registry.known, event_id):
+            raise HTTPError(HTTPStatus.CONFLICT, f"既に存在する大会IDです: {event_id}")
+        settings = {name: definition[name] for name in SESSION_SETTINGS}
+        try:
+            await asyncio.to_thread(self.registry.create, event_id, settings)
+        except (TypeError, ValueError) as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+        return HTTPStatus.CREATED, {"event_id": event_id, "settings": settings}
+
+    async def get_event(self, body, event_id):
+        session = await self._session(event_id)
+        settings = {name: getattr(session, name) for name in SESSION_SETTINGS if name != "ranks"}
+        return HTTPStatus.OK, {
+            "event_id": event_id, "settings": settings, "round": session.event.round_count,
+            "pending": event_id in self._pending,
+        }
+
+    async def generate_round(self, body, event_id):
+        async with self._locked_session(event_id) as session:
+            if session.plan or self.executor is None:
+                round_plan = await asyncio.to_thread(session.generate_round)
+            else:
+                round_args = await asyncio.to_thread(worker_round_args, session)
+                round_plan = await asyncio.get_running_loop().run_in_executor(self.executor, generate_round_in_worker, round_args)
+            self._pending[event_id] = round_plan
+            return HTTPStatus.OK, {"round": session.event.round_count + 1, "courts": round_plan_records(round_plan)}
+
+    async def confirm_round(self, body, event_id):
+        async with self._locked_session(event_id) as session:
+            if isinstance(body, dict) and body.get("matches") is not None:
+                matches = _parse_matches(body["matches"], session)
+            else:
+                round_plan = self._pending.get(event_id)
+                if round_plan is None:
+                    raise HTTPError(HTTPStatus.CONFLICT, "確定する組み合わせがありません。先に生成してください")
+                failed_courts = [court for _, court, _, level in round_plan if level == "failed"]
+                if failed_courts:
+                    raise HTTPError(HTTPStatus.CONFLICT, f"割り当てられなかったコートがあります: {', '.join(failed_courts)}。matches を指定して確定してください")
+                matches = [(match, court, match_type) for match, court, match_type, _ in round_plan]
+            await asyncio.to_thread(session.confirm_round, matches)
+            self._pending.pop(event_id, None)
+            return HTTPStatus.OK, {
+                "round": session.event.round_count,
+                "matches": [{"court": court, "match_type": match_type, "team_a": match[0], "team_b": match[1]} for match, court, match_type in matches],
+            }
+
+    async def change_roster(self, body, event_id):
+        if not isinstance(body, dict) or not body.get("action") or not body.get("player"):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "action と player を指定してください")
+        async with self._locked_session(event_id) as session:
+            try:
+                await asyncio.to_thread(session.change_roster, body["action"], body["player"], body.get("team"), body.get("rank"))
+            except (TypeError, ValueError) as e:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+            # 参加中の選手が変わったので、未確定の組み合わせは生成し直してもらう
+            self._pending.pop(event_id, None)
+            return HTTPStatus.OK, {
+                "round": session.event.round_count + 1, "a_players": session.a_players, "b_players": session.b_players,
+            }
+
+    async def get_stats(self, body, event_id):
+        # 確定の途中の状態を読まないよう、確定と同じロックの中で集計する
+        async with self._locked_session(event_id) as session:
+            event = session.event
+            players = {}
+            for player in session.a_players + session.b_players:
+                player_id = event.player_ids.get(player)
+                counts = event.player_match_count[player] if player_id is not None else {"シングルス": 0, "ダブルス": 0}
+                players[player] = {
+                    **counts, "Total": counts["シングルス"] + counts["ダブルス"],
+                    "rest_rounds": event.rest_rounds(player), "court_time": event.court_time[player_id] if player_id is not None else 0,
+                }
+            return HTTPStatus.OK, {
+                "round": event.round_count,
+                "matches": len(event.history_round),
+                "players": players,
+                "teams": dict(event.team_match_count),
+                "departed": dict(event.departed),
+                "last_round": [{"court": court, "match_type": match_type, "team_a": match[0], "team_b": match[1]} for match, court, match_type in session.current_matches],
+            }
+
+    async def dispatch(self, method, path, body):
+        """パスと本文（JSON を読み込んだ値）から (ステータス, 応答の値) を求める"""
+        allowed = []
+        for route_method, pattern, handler in self.routes:
+            matched = pattern.fullmatch(path.rstrip("/") or "/")
+            if matched is None:
+                continue
+            if route_method != method:
+                allowed.append(route_method)
+                continue
+            try:
+                return await handler(body, **matched.groupdict())
+            finally:
+                self._forget_evicted()
+        if allowed:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} は使えません（{', '.join(allowed)} のみ）")
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"見つかりません: {path}")
+
+    async def handle_connection(self, reader, writer):
+        """1接続につき1リクエストを処理する"""
+        try:
+            try:
+                request_line = await reader.readline()
+                method, target, _ = request_line.decode("latin-1").rstrip("\r\n").split(" ")
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "リクエスト本文が大きすぎます")
+                raw_body = await reader.readexactly(length) if length else b""
+                body = json.loads(raw_body) if raw_body.strip() else None
+            except (ValueError, asyncio.IncompleteReadError):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "リクエストを解釈できません")
+            status, payload = await self.dispatch(method, urlsplit(target).path, body)
+        except HTTPError as e:
+            status, payload = e.status, {"error": e.message}
+        except Exception:
+            traceback.print_exc()
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "内部エラーが発生しました"}
+
+        content = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + content
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """待ち受けを開始した asyncio.Server を返す（port=0 なら空いているポート）"""
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+async def serve(service, host, port):
+    server = await service.start(host, port)
+    for sock in server.sockets:
+        print(f"listening on http://{sock.getsockname()[0]}:{sock.getsockname()[1]}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m matchmaking.service", description="組み合わせ生成の HTTP/JSON サービス")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けるアドレス")
+    parser.add_argument("--port", type=int, default=8080, help="待ち受けるポート")
+    parser.add_argument("--data-dir", default=os.environ.get("MATCHMAKING_DATA_DIR", os.path.join("data", "events")), help="大会データの保存先")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="組み合わせ生成のプロセス数（既定: CPU コア数）")
+    parser.add_argument("--max-events", type=int, default=DEFAULT_MAX_EVENTS, help="メモリに保持する大会数の上限")
+    parser.add_argument("--ttl", type=float, default=DEFAULT_EVENT_TTL, help="使われていない大会をメモリから外すまでの秒数")
+    args = parser.parse_args(argv)
+
+    registry = EventRegistry(args.data_dir, args.max_events, args.ttl)
+    # ワーカーは必要になってから起動されるので、スレッドを持つ親を fork しないよう spawn で起動する
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        try:
+            asyncio.run(serve(MatchmakingService(registry, executor), args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            registry.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""Streamlit に依存しない大会セッション"""
+import threading
+from collections import deque
+
+from .candidates import CandidateCache
+from .costs import CostContext, validate_cost_weights
+from .optimizer import optimize_round, rested_pools
+from .pairing import form_round_pairs, pair_members
+from .planner import plan_session
+from .roster import Roster, default_rank
+from .state import EventState
+
+# 既定のコート構成
+DEFAULT_COURTS = (("コート1", "シングルス"), ("コート2", "シングルス"))
+
+class Session:
+    """1大会分の設定と試合状態（アプリの st.session_state に相当）
+
+    UI なしで generate_round → confirm_round を繰り返せば大会を進められる。
+    store（EventStore）を渡すと保存済みの状態から再開し、確定したラウンドを追記していく。
+    auto_pairs=True の場合はダブルスのペアを a_doubles_map / b_doubles_map ではなく
+    ラウンドごとに自動編成する（ペア名は "A1+A2" のように選手名をつないだもの）。
+    cost_weights（評価項目名 → 重み）を指定すると、候補を matchmaking.costs の項目の重み付き和で評価する。
+    min_rest は試合の間に休むラウンド数の最低値で、満たさない選手の試合は連戦として扱う（1 なら直前のラウンドのみ）。
+    rest_priority=True の場合は休養の長い選手から優先して組み合わせる。
+    a_players / b_players は設定した選手に途中参加・途中退出（join_player / leave_player）を
+    反映した参加中の選手で、設定した選手は configured_players に保持する。
+    """
+
+    def __init__(self, a_players=(), b_players=(), a_doubles_map=None, b_doubles_map=None, courts=DEFAULT_COURTS, max_rank_diff=3, allow_consecutive=True, allow_repeat=False, ranks=None, store=None, auto_pairs=False, cost_weights=None, min_rest=1, rest_priority=False):
+        self.store = store
+        # 状態の更新とログへの追記の間に、別スレッドからスナップショットを書き出さないためのロック
+        self._store_lock = threading.Lock()
+        if store is not None:
+            self.event, self.current_matches = store.load()
+        else:
+            self.event = EventState()
+            self.current_matches = []
+        # ラウンドごとに変わった候補だけを計算し直すための候補キャッシュ
+        self.candidate_cache = CandidateCache(self.event)
+        # 事前計画したラウンドの列と、計画時の入力
+        self.plan = deque()
+        self.plan_args = None
+
+        self.configured_players = (list(a_players), list(b_players))
+        self.configured_ranks = ranks
+        self.a_doubles_map = dict(a_doubles_map or {})
+        self.b_doubles_map = dict(b_doubles_map or {})
+        self.courts = list(courts)
+        self.max_rank_diff = max_rank_diff
+        self.allow_consecutive = allow_consecutive
+        self.allow_repeat = allow_repeat
+        self.auto_pairs = auto_pairs
+        self.cost_weights = validate_cost_weights(cost_weights or {}) or None
+        self.min_rest = min_rest
+        self.rest_priority = rest_priority
+        self.roster = None
+        self._update_roster()
+
+    @property
+    def doubles_input(self):
+        """両チームのペア名→選手の表"""
+        return {**self.a_doubles_map, **self.b_doubles_map}
+
+    def _update_roster(self):
+        """設定した選手に途中参加・途中退出を反映する（途中参加の選手のランキングは参加時のもの）"""
+        self.a_players, self.b_players = self.event.roster_players(*self.configured_players)
+        with self._store_lock:
+            self.event.register_players(self.a_players + self.b_players)
+        if self.roster is not None and self.roster.a_players == self.a_players and self.roster.b_players == self.b_players:
+            return
+        ranks = Roster(*self.configured_players, self.configured_ranks).ranks
+        ranks.update((player, rank) for player, (_, rank) in self.event.joined.items() if player not in ranks)
+        self.roster = Roster(self.a_players, self.b_players, ranks)
+
+    def join_player(self, player, team, rank=None):
+        """選手を次のラウンドから途中参加させる（rank の省略時は選手名の番号、番号がなければチームの末尾の順番をランキングとする）
+
+        試合数バランスの評価では、参加中の選手の最少の試合数まで加算して扱うので、
+        途中参加の選手が追いつくまで毎ラウンド出場し続けることも、後回しにされることもない。
+        """
+        if team not in ("A", "B"):
+            raise ValueError(f"チームは A か B で指定してください: {team}")
+        if player in self.a_players or player in self.b_players:
+            raise ValueError(f"{player} は既に参加しています")
+        if rank is None:
+            rank = default_rank(player, team, len(self.a_players if team == "A" else self.b_players))
+        counts = self.event.balance_counts
+        baseline = min((sum(counts.get(p, {}).values()) for p in self.a_players + self.b_players), default=0)
+        self._roster_event("join", player, team, rank, baseline)
+
+    def leave_player(self, player, action="leave"):
+        """選手を次のラウンドから外す（action は途中退出 "leave" か負傷による棄権 "injury"）"""
+        if action not in ("leave", "injury"):
+            raise ValueError(f"未対応の名簿の操作です: {action}")
+        if player not in self.a_players and player not in self.b_players:
+            raise ValueError(f"{player} は参加していません")
+        self._roster_event(action, player)
+
+    def change_roster(self, action, player, team=None, rank=None):
+        """名簿の変更を操作名で反映する（"join" は join_player、"leave"・"injury" は leave_player）"""
+        if action == "join":
+            self.join_player(player, team, rank)
+        else:
+            self.leave_player(player, action)
+
+    def _roster_event(self, action, player, team=None, rank=None, baseline=0):
+        with self._store_lock:
+            self.event.apply_roster_event(action, player, team, rank, baseline)
+            if self.store is not None:
+                self.store.append_roster_event(self.event, action, player, team, rank, baseline)
+        self._update_roster()
+        # 参加中の選手が変わったので事前計画は破棄する
+        self.plan = deque()
+        self.plan_args = None
+
+    def active_doubles_map(self, doubles_map):
+        """途中退出した選手を含まないペアだけを残す"""
+        return {item_key: players for item_key, players in doubles_map.items() if self.event.departed.keys().isdisjoint(players)}
+
+    def pair_players(self, item_key):
+        """ペア名の選手（自動編成のペアは名前から復元する。不明なペアは None）"""
+        players = self.doubles_input.get(item_key)
+        if players is None and self.auto_pairs:
+            players = pair_members(item_key)
+            if len(players) != 2 or not set(players) <= set(self.a_players + self.b_players):
+                return None
+        return players
+
+    def configure(self, a_players=None, b_players=None, a_doubles_map=None, b_doubles_map=None, courts=None, max_rank_diff=None, allow_consecutive=None, allow_repeat=None, ranks=None, auto_pairs=None, cost_weights=None, min_rest=None, rest_priority=None):
+        """設定を更新（None の項目は変更しない。重みを従来の評価に戻す場合は cost_weights={}）。計画時と設定が変わった事前計画は破棄する"""
+        configured_players = (
+            list(a_players) if a_players is not None else self.configured_players[0],
+            list(b_players) if b_players is not None else self.configured_players[1],
+        )
+        if ranks is not None or configured_players != self.configured_players:
+            self.configured_players = configured_players
+            self.configured_ranks = ranks
+            self.roster = None
+        if a_doubles_map is not None:
+            self.a_doubles_map = dict(a_doubles_map)
+        if b_doubles_map is not None:
+            self.b_doubles_map = dict(b_doubles_map)
+        if courts is not None:
+            self.courts = list(courts)
+        if max_rank_diff is not None:
+            self.max_rank_diff = max_rank_diff
+        if allow_consecutive is not None:
+            self.allow_consecutive = allow_consecutive
+        if allow_repeat is not None:
+            self.allow_repeat = allow_repeat
+        if auto_pairs is not None:
+            self.auto_pairs = auto_pairs
+        if cost_weights is not None:
+            self.cost_weights = validate_cost_weights(cost_weights) or None
+        if min_rest is not None:
+            self.min_rest = min_rest
+        if rest_priority is not None:
+            self.rest_priority = rest_priority
+        self._update_roster()
+
+        if self.plan_args is not None and self.plan_args != self.planner_args():
+            self.plan = deque()
+            self.plan_args = None
+
+    def planner_args(self):
+        """optimize_round / plan_session に渡す現在の設定"""
+        return {
+            "courts": list(self.courts), "a_pool": self.a_players, "b_pool": self.b_players,
+            "a_doubles_map": self.active_doubles_map(self.a_doubles_map), "b_doubles_map": self.active_doubles_map(self.b_doubles_map),
+            "max_rank_diff": self.max_rank_diff,
+            "allow_consecutive_global": self.allow_consecutive, "allow_repeat_global": self.allow_repeat,
+            "ranks": self.roster.ranks, "auto_pairs": self.auto_pairs,
+            "cost_weights": self.cost_weights,
+            "min_rest": self.min_rest, "rest_priority": self.rest_priority,
+        }
+
+    def round_args(self):
+        """次のラウンドの optimize_round に渡す設定
+
+        自動編成の場合はこのラウンドのペアを、last_played には最低休養ラウンド数を満たさない選手を入れる。
+        """
+        args = self.planner_args()
+        min_rest = args.pop("min_rest")
+        if args.pop("auto_pairs"):
+            args["a_doubles_map"], args["b_doubles_map"] = form_round_pairs(self.courts, self.a_players, self.b_players, self.event, self.roster.ranks, min_rest)
+        args["last_played"] = self.event.players_resting(min_rest)
+        if args.pop("rest_priority"):
+            args["preferred_pools"] = rested_pools(self.event, self.courts, self.a_players, self.b_players)
+        return args
+
+    def generate_round(self, metrics=None):
+        """次のラウンドの組み合わせを optimize_round と同じ形式で返す（事前計画があればその先頭）
+
+        metrics（GenerationMetrics）を渡すと生成処理を計測する。事前計画を使った場合は採用レベルのみ記録する。
+        """
+        if self.plan and all(level != "failed" for *_, level in self.plan[0]):
+            if metrics is not None:
+                for _, court, _, level in self.plan[0]:
+                    metrics.record_level(court, level)
+            return list(self.plan[0])
+        return optimize_round(
+            history_index=self.event.played_matchups,
+            player_counts=self.event.balance_counts, cost_context=CostContext(self.event, self.roster.ranks),
+            metrics=metrics, candidate_cache=self.candidate_cache, **self.round_args())
+
+    def confirm_round(self, matches_to_confirm, doubles_input=None, duration=1):
+        """(match, コート名, 試合形式) のリストを確定して状態を更新（duration は試合の長さ。既定は1ラウンド）"""
+        if doubles_input is None:
+            doubles_input = self.doubles_input
+            if self.auto_pairs:
+                doubles_input.update(
+                    (item_key, self.pair_players(item_key) or [])
+                    for match, _, match_type in matches_to_confirm if match_type == "ダブルス"
+                    for item_key in match if item_key not in doubles_input
+                )
+        with self._store_lock:
+            self.event.apply_round(matches_to_confirm, doubles_input, duration)
+            self.current_matches = matches_to_confirm
+            if self.store is not None:
+                self.store.append_round(self.event, matches_to_confirm, doubles_input, duration)
+
+        # 事前計画の先頭と一致すれば取り出し、手動で上書きされた場合は残りを再計画する
+        if self.plan:
+            if [(match, court, match_type) for match, court, match_type, _ in self.plan[0]] == list(matches_to_confirm):
+                self.plan.popleft()
+            else:
+                self.plan = deque(plan_session(**self.plan_args, rounds=len(self.plan) - 1, state=self.event))
+
+    def checkpoint(self):
+        """ログの末尾までを反映済みの状態をスナップショットとして書き出す（確定・名簿の変更の途中は待つ）"""
+        with self._store_lock:
+            if self.store is not None and self.store.exists():
+                self.store.checkpoint(self.event, self.current_matches)
+
+    def plan_rounds(self, rounds, **search_options):
+        """現在の設定で rounds ラウンド分を事前計画し、以降の generate_round で順に使う"""
+        self.plan_args = self.planner_args()
+        self.plan = deque(plan_session(**self.plan_args, rounds=rounds, state=self.event, **search_options))
+        return list(self.plan)
+
+    def next_round(self):
+        """1ラウンドを生成し、全コートに割り当てられた場合のみ確定する"""
+        round_plan = self.generate_round()
+        if all(level != "failed" for *_, level in round_plan):
+            self.confirm_round([(match, court, match_type) for match, court, match_type, _ in round_plan])
+        return round_plan
@@ -0,0 +1,427 @@
+"""大会の試合状態モデル"""
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping, Sequence
+
+from .engine import lineup_key, matchup_key
+
+# --- 試合状態モデル ---
+# 試合形式（履歴では添字で保持する）
+MATCH_TYPES = ("シングルス", "ダブルス")
+# 名簿の変更（途中参加・途中退出・負傷による棄権）
+ROSTER_ACTIONS = ("join", "leave", "injury")
+
+class PlayerCountsView(Mapping):
+    """EventState の試合数配列を {選手: {'シングルス': n, 'ダブルス': n}} として参照する"""
+    __slots__ = ("_state",)
+
+    def __init__(self, state):
+        self._state = state
+
+    def __getitem__(self, player):
+        player_id = self._state.player_ids[player]
+        return {"シングルス": self._state.singles_counts[player_id], "ダブルス": self._state.doubles_counts[player_id]}
+
+    def __iter__(self):
+        return iter(self._state.player_names)
+
+    def __len__(self):
+        return len(self._state.player_names)
+
+class BalanceCountsView(PlayerCountsView):
+    """試合数バランスの評価に使う試合数（途中参加の選手は加算分 credits をシングルスの試合数に含める）"""
+    __slots__ = ()
+
+    def __getitem__(self, player):
+        state = self._state
+        credit = state.credits.get(player, 0)
+        player_id = state.player_ids.get(player)
+        if player_id is None:
+            if not credit:
+                raise KeyError(player)
+            return {"シングルス": credit, "ダブルス": 0}
+        return {"シングルス": state.singles_counts[player_id] + credit, "ダブルス": state.doubles_counts[player_id]}
+
+    def __iter__(self):
+        state = self._state
+        yield from state.player_names
+        yield from (player for player in state.credits if player not in state.player_ids)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+class TeamCountsView(Mapping):
+    """EventState のペア別ダブルス試合数を {ペア: n} として参照する（未試合のペアは含まない）"""
+    __slots__ = ("_state",)
+
+    def __init__(self, state):
+        self._state = state
+
+    def __getitem__(self, item_key):
+        count = self._state.team_counts[self._state.item_ids[item_key]]
+        if not count:
+            raise KeyError(item_key)
+        return count
+
+    def __iter__(self):
+        state = self._state
+        return (name for item_id, name in enumerate(state.item_names) if state.team_counts[item_id])
+
+    def __len__(self):
+        return sum(1 for count in self._state.team_counts if count)
+
+class HistoryView(Sequence):
+    """列ごとの対戦履歴を従来の {"Round", "Match Type", "Team A", "Team B"} の行として参照する"""
+    __slots__ = ("_state",)
+
+    def __init__(self, state):
+        self._state = state
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        state = self._state
+        return {
+            "Round": state.history_round[index], "Match Type": MATCH_TYPES[state.history_type[index]],
+            "Team A": state.item_names[state.history_a[index]], "Team B": state.item_names[state.history_b[index]],
+        }
+
+    def __len__(self):
+        return len(self._state.history_round)
+
+class CooccurrenceMatrix:
+    """選手ID×選手IDの対称な疎行列（2人が同じ試合で組んだ・対戦した回数）
+
+    行ごとの辞書に0でない要素だけを持ち、要素の参照と加算は O(1)。
+    """
+    __slots__ = ("rows",)
+
+    def __init__(self):
+        self.rows = {}
+
+    def add(self, i, j, count=1):
+        if i == j:
+            return
+        row = self.rows.setdefault(i, {})
+        row[j] = row.get(j, 0) + count
+        row = self.rows.setdefault(j, {})
+        row[i] = row.get(i, 0) + count
+
+    def get(self, i, j):
+        row = self.rows.get(i)
+        return row.get(j, 0) if row else 0
+
+    def row(self, i):
+        """選手 i と1回以上組んだ・対戦した選手ID → 回数"""
+        return self.rows.get(i, {})
+
+    def copy(self):
+        clone = CooccurrenceMatrix()
+        clone.rows = {i: row.copy() for i, row in self.rows.items()}
+        return clone
+
+class EventState:
+    """1大会分の試合状態
+
+    選手とペア（対戦キー）を整数IDに変換し、試合数は array の列、対戦履歴は
+    追記のみの列形式で保持する。従来の辞書・リスト形式が必要な箇所には
+    match_history / player_match_count / team_match_count のビューを渡す。
+    version はラウンドを反映するたびに増え、統計表のキャッシュの鍵に使う。
+    選手同士がダブルスで組んだ回数（partners）と対戦した回数（opponents）は選手IDの疎行列で持ち、
+    played_matchups にはペア名の組に加えてダブルスの選手の組（lineup_key）も入れるので、
+    途中でペアを組み替えても同じ4人の対戦を見分けられる。
+    選手ごとの最後に出場したラウンド（last_round）とコートにいた時間の合計（court_time）も
+    array の列で持ち、最後に出場したラウンドごとの選手の集合（rest_buckets）と、register_players で
+    登録した未出場の選手の集合（unplayed）から、休養中の選手や休養の長い選手を全選手を走査せずに求める。
+    履歴はラウンド順に並ぶので、ラウンドでの絞り込みは二分探索で、選手での絞り込みは
+    選手ごとの出場行の索引（player_rows）で行う。
+    途中参加・途中退出は roster_events に記録し、参加中の選手は roster_players で求める。
+    途中参加の選手には参加時に不足していた試合数（credits）を試合数バランスの評価（balance_counts）でだけ加える。
+    """
+    __slots__ = (
+        "version", "round_count", "last_played_players", "played_matchups",
+        "player_ids", "player_names", "singles_counts", "doubles_counts",
+        "last_round", "court_time", "rest_buckets", "unplayed",
+        "roster_events", "joined", "departed", "credits",
+        "item_ids", "item_names", "team_counts",
+        "court_ids", "court_names", "player_rows", "partners", "opponents",
+        "history_round", "history_court", "history_type", "history_a", "history_b",
+        "__weakref__",
+    )
+
+    def __init__(self):
+        self.version = 0
+        self.round_count = 0
+        self.last_played_players = set()
+        # 対戦済みの組み合わせ（順不同）の索引
+        self.played_matchups = set()
+        # 試合をした選手のIDと試合数
+        self.player_ids = {}
+        self.player_names = []
+        self.singles_counts = array("l")
+        self.doubles_counts = array("l")
+        # 選手IDごとの最後に出場したラウンドとコートにいた時間の合計
+        self.last_round = array("l")
+        self.court_time = array("l")
+        # 最後に出場したラウンド → 選手の集合（ラウンドの昇順に並び、空になったラウンドは消す）
+        self.rest_buckets = {}
+        # 登録した選手のうちまだ出場していない選手
+        self.unplayed = set()
+        # 名簿の変更の記録 (反映されるラウンド, 操作, 選手, チーム)、途中参加の選手 → (チーム, ランキング)、
+        # 途中退出した選手 → 操作、途中参加の選手 → 試合数バランスの評価で加える試合数
+        self.roster_events = []
+        self.joined = {}
+        self.departed = {}
+        self.credits = {}
+        # 対戦キー（シングルスは選手名、ダブルスはペア名）のIDとペア別試合数
+        self.item_ids = {}
+        self.item_names = []
+        self.team_counts = array("l")
+        # コート名のIDと、選手ごとの出場した履歴の行番号（昇順）
+        self.court_ids = {}
+        self.court_names = []
+        self.player_rows = {}
+        # 選手同士がダブルスで組んだ回数と、対戦した回数（選手IDの疎行列）
+        self.partners = CooccurrenceMatrix()
+        self.opponents = CooccurrenceMatrix()
+        # 列形式の対戦履歴
+        self.history_round = array("l")
+        self.history_court = array("l")
+        self.history_type = array("b")
+        self.history_a = array("l")
+        self.history_b = array("l")
+
+    @property
+    def match_history(self):
+        return HistoryView(self)
+
+    @property
+    def player_match_count(self):
+        return PlayerCountsView(self)
+
+    @property
+    def balance_counts(self):
+        return BalanceCountsView(self)
+
+    @property
+    def team_match_count(self):
+        return TeamCountsView(self)
+
+    def _player_id(self, player):
+        player_id = self.player_ids.get(player)
+        if player_id is None:
+            player_id = self.player_ids[player] = len(self.player_names)
+            self.player_names.append(sys.intern(player))
+            self.singles_counts.append(0)
+            self.doubles_counts.append(0)
+            self.last_round.append(0)
+            self.court_time.append(0)
+        return player_id
+
+    def _item_id(self, item_key):
+        item_id = self.item_ids.get(item_key)
+        if item_id is None:
+            item_id = self.item_ids[item_key] = len(self.item_names)
+            self.item_names.append(sys.intern(item_key))
+            self.team_counts.append(0)
+        return item_id
+
+    def _court_id(self, court):
+        court_id = self.court_ids.get(court)
+        if court_id is None:
+            court_id = self.court_ids[court] = len(self.court_names)
+            self.court_names.append(sys.intern(court))
+        return court_id
+
+    def apply_round(self, matches_to_confirm, doubles_input, duration=1):
+        """確定した1ラウンドを反映（duration は試合の長さで、コートにいた時間に加える）"""
+        self.version += 1
+        self.round_count += 1
+        self.last_played_players = set()
+
+        for match, court, match_type in matches_to_confirm:
+            a_item_id = self._item_id(match[0])
+            b_item_id = self._item_id(match[1])
+            row = len(self.history_round)
+            self.history_round.append(self.round_count)
+            self.history_court.append(self._court_id(court))
+            self.history_type.append(MATCH_TYPES.index(match_type))
+            self.history_a.append(a_item_id)
+            self.history_b.append(b_item_id)
+            self.played_matchups.add(matchup_key(match[0], match[1]))
+
+            if match_type == "シングルス":
+                a_side, b_side = [match[0]], [match[1]]
+            else:
+                a_side, b_side = doubles_input.get(match[0], []), doubles_input.get(match[1], [])
+                if a_side and b_side:
+                    self.played_matchups.add(lineup_key(a_side, b_side))
+            players_in_match = a_side + b_side
+
+            counts = self.singles_counts if match_type == "シングルス" else self.doubles_counts
+            for player in players_in_match:
+                self.last_played_players.add(player)
+                player_id = self._player_id(player)
+                counts[player_id] += 1
+                self._mark_played(player, player_id, duration)
+                rows = self.player_rows.setdefault(player, array("l"))
+                if not rows or rows[-1] != row:
+                    rows.append(row)
+            if match_type == "ダブルス":
+                self.team_counts[a_item_id] += 1
+                self.team_counts[b_item_id] += 1
+            a_ids = [self.player_ids[player] for player in a_side]
+            b_ids = [self.player_ids[player] for player in b_side]
+            for side_ids in (a_ids, b_ids):
+                if len(side_ids) == 2:
+                    self.partners.add(*side_ids)
+            for a_id in a_ids:
+                for b_id in b_ids:
+                    self.opponents.add(a_id, b_id)
+
+    def _mark_played(self, player, player_id, duration):
+        """選手を今のラウンドの休養の集合に移し、コートにいた時間を加える"""
+        previous = self.last_round[player_id]
+        if previous == self.round_count:
+            return
+        self.court_time[player_id] += duration
+        bucket = self.rest_buckets.get(previous)
+        if bucket is not None:
+            bucket.discard(player)
+            if not bucket:
+                del self.rest_buckets[previous]
+        else:
+            self.unplayed.discard(player)
+        self.rest_buckets.setdefault(self.round_count, set()).add(player)
+        self.last_round[player_id] = self.round_count
+
+    def rest_rounds(self, player):
+        """最後の試合の後に休んだラウンド数（直前のラウンドに出場していれば 0、未出場なら None）"""
+        player_id = self.player_ids.get(player)
+        if player_id is None:
+            return None
+        return self.round_count - self.last_round[player_id]
+
+    def players_resting(self, min_rest=1):
+        """休んだラウンド数が min_rest に満たない選手（min_rest=1 なら last_played_players と同じ）"""
+        resting = set()
+        for round_number in range(max(1, self.round_count - min_rest + 1), self.round_count + 1):
+            resting |= self.rest_buckets.get(round_number, set())
+        return resting
+
+    def register_players(self, players):
+        """参加する選手を登録する（未出場の選手は longest_rested で休養が最も長い選手として扱う）"""
+        self.unplayed.update(player for player in players if player not in self.player_ids)
+
+    def longest_rested(self, players, count):
+        """players のうち休養の長い選手（登録した未出場の選手が先）から count 人以上を players の順に返す
+
+        未出場の選手の集合と最後に出場したラウンドの集合を古い順にたどり、最後の集合は丸ごと加えるので、
+        同じだけ休んだ選手はすべて含まれる。
+        """
+        members = set(players)
+        chosen = self.unplayed & members
+        for bucket in self.rest_buckets.values():
+            if len(chosen) >= count:
+                break
+            chosen |= bucket & members
+        return [player for player in players if player in chosen]
+
+    def apply_roster_event(self, action, player, team=None, rank=None, baseline=0):
+        """途中参加（join）・途中退出（leave）・負傷による棄権（injury）を次のラウンドから反映する
+
+        途中参加の選手には、試合数（これまでの加算分を含む）が baseline に満たない分を加算する。
+        """
+        if action not in ROSTER_ACTIONS:
+            raise ValueError(f"未対応の名簿の操作です: {action}")
+        self.roster_events.append((self.round_count + 1, action, player, team))
+        if action == "join":
+            total = sum(self.balance_counts.get(player, {}).values())
+            if baseline > total:
+                self.credits[player] = self.credits.get(player, 0) + baseline - total
+            self.joined[player] = (team, rank)
+            self.departed.pop(player, None)
+        else:
+            self.departed[player] = action
+
+    def roster_players(self, a_players, b_players):
+        """両チームの選手から途中退出した選手を除き、途中参加の選手を末尾に加えたリストを返す"""
+        teams = {
+            "A": [player for player in a_players if player not in self.departed],
+            "B": [player for player in b_players if player not in self.departed],
+        }
+        listed = set(teams["A"]) | set(teams["B"])
+        for player, (team, _) in self.joined.items():
+            if player not in self.departed and player not in listed:
+                teams[team].append(player)
+        return teams["A"], teams["B"]
+
+    def copy(self):
+        """状態を複製（計画時の仮の状態更新用）"""
+        clone = EventState.__new__(EventState)
+        for name in EventState.__slots__:
+            if name == "__weakref__":
+                continue
+            value = getattr(self, name)
+            if isinstance(value, array):
+                value = value[:]
+            elif isinstance(value, (set, dict, list)):
+                value = value.copy()
+            setattr(clone, name, value)
+        # 選手ごとの行番号の列・休養の集合・疎行列の行は更新されるので、辞書だけでなく中身も複製する
+        clone.player_rows = {player: rows[:] for player, rows in self.player_rows.items()}
+        clone.rest_buckets = {round_number: bucket.copy() for round_number, bucket in self.rest_buckets.items()}
+        clone.partners = self.partners.copy()
+        clone.opponents = self.opponents.copy()
+        return clone
+
+    def partner_count(self, player, other):
+        """2人がダブルスで組んだ回数（ペア名によらない）"""
+        if player not in self.player_ids or other not in self.player_ids:
+            return 0
+        return self.partners.get(self.player_ids[player], self.player_ids[other])
+
+    def opponent_count(self, player, other):
+        """2人が対戦した回数（シングルス・ダブルスの合計）"""
+        if player not in self.player_ids or other not in self.player_ids:
+            return 0
+        return self.opponents.get(self.player_ids[player], self.player_ids[other])
+
+    def history_columns(self, start=0, positions=None):
+        """start 行目以降（positions を指定した場合はその行）の対戦履歴を列ごとのリストで返す（DataFrame 作成用）"""
+        if positions is None:
+            return {
+                "Round": self.history_round[start:].tolist(),
+                "Court": [self.court_names[c] for c in self.history_court[start:]],
+                "Match Type": [MATCH_TYPES[t] for t in self.history_type[start:]],
+                "Team A": [self.item_names[i] for i in self.history_a[start:]],
+                "Team B": [self.item_names[i] for i in self.history_b[start:]],
+            }
+        return {
+            "Round": [self.history_round[p] for p in positions],
+            "Court": [self.court_names[self.history_court[p]] for p in positions],
+            "Match Type": [MATCH_TYPES[self.history_type[p]] for p in positions],
+            "Team A": [self.item_names[self.history_a[p]] for p in positions],
+            "Team B": [self.item_names[self.history_b[p]] for p in positions],
+        }
+
+    def history_positions(self, rounds=None, player=None, court=None):
+        """条件に合う対戦履歴の行番号を昇順で返す
+
+        rounds は (最初のラウンド, 最後のラウンド)、player は選手名（ダブルスはペアの選手も含む）、
+        court はコート名で、None の条件は絞り込まない。
+        """
+        start, end = 0, len(self.history_round)
+        if rounds is not None:
+            start = bisect_left(self.history_round, rounds[0])
+            end = bisect_right(self.history_round, rounds[1])
+        if player is not None:
+            rows = self.player_rows.get(player, ())
+            positions = rows[bisect_left(rows, start):bisect_left(rows, end)]
+        else:
+            positions = range(start, end)
+        if court is not None:
+            court_id = self.court_ids.get(court)
+            positions = [p for p in positions if self.history_court[p] == court_id]
+        return positions
@@ -0,0 +1,155 @@
+"""大会状態の永続化（追記専用のラウンドログと定期スナップショット）"""
+import json
+import os
+import pickle
+import re
+
+from .state import EventState
+
+# スナップショットを書き出す間隔（ラウンド数）
+SNAPSHOT_EVERY = 50
+# スナップショットの形式。EventState の構成を変えたら上げる（古いものはログから再生する）
+SNAPSHOT_FORMAT = 7
+
+LOG_FILE = "rounds.jsonl"
+SNAPSHOT_FILE = "snapshot.pickle"
+SETTINGS_FILE = "settings.json"
+
+# 大会IDに使える文字（保存先のディレクトリ名になるため）
+EVENT_ID_PATTERN = re.compile(r"[0-9A-Za-z_-]{1,64}")
+
+def event_directory(root, event_id):
+    """保存先のルートと大会IDから大会のディレクトリを返す（不正なIDは ValueError）"""
+    if not isinstance(event_id, str) or not EVENT_ID_PATTERN.fullmatch(event_id):
+        raise ValueError(f"不正な大会IDです: {event_id!r}")
+    return os.path.join(root, event_id)
+
+class EventStore:
+    """1大会分の保存先（ディレクトリ1つ）
+
+    確定したラウンドと名簿の変更は rounds.jsonl に1行ずつ追記し（1ラウンドあたり O(1)）、
+    snapshot_every ラウンドごとに状態全体とログの位置を snapshot.pickle に書き出す。
+    読み込みはスナップショットから始め、それ以降のログだけを再生する。
+    大会の設定（Session の引数）を settings.json に保存しておくこともできる。
+    """
+    __slots__ = ("directory", "snapshot_every")
+
+    def __init__(self, directory, snapshot_every=SNAPSHOT_EVERY):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+
+    @property
+    def log_path(self):
+        return os.path.join(self.directory, LOG_FILE)
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.directory, SNAPSHOT_FILE)
+
+    @property
+    def settings_path(self):
+        return os.path.join(self.directory, SETTINGS_FILE)
+
+    def exists(self):
+        return os.path.exists(self.log_path)
+
+    def write_settings(self, settings):
+        """Session の引数（選手・ペア・コート・制約設定など）を保存する"""
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = self.settings_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            json.dump(settings, f, ensure_ascii=False)
+        os.replace(temporary_path, self.settings_path)
+
+    def read_settings(self):
+        """保存された設定（なければ None）"""
+        try:
+            with open(self.settings_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def append_round(self, event, matches_to_confirm, doubles_input, duration=1):
+        """event に反映済みの1ラウンドをログに追記する"""
+        os.makedirs(self.directory, exist_ok=True)
+        # ダブルスで使ったペアの選手だけを残す（再生時の apply_round に渡す）
+        pairs = {}
+        for match, _, match_type in matches_to_confirm:
+            if match_type == "ダブルス":
+                for item_key in match:
+                    pairs[item_key] = list(doubles_input.get(item_key, []))
+        record = {
+            "round": event.round_count,
+            "matches": [[match[0], match[1], court, match_type] for match, court, match_type in matches_to_confirm],
+            "pairs": pairs,
+            "duration": duration,
+        }
+        with open(self.log_path, "ab") as f:
+            f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+            offset = f.tell()
+        if self.snapshot_every and event.round_count % self.snapshot_every == 0:
+            self.snapshot(event, matches_to_confirm, offset)
+
+    def append_roster_event(self, event, action, player, team=None, rank=None, baseline=0):
+        """event に反映済みの名簿の変更（途中参加・途中退出）をログに追記する"""
+        os.makedirs(self.directory, exist_ok=True)
+        record = {"roster": action, "round": event.round_count + 1, "player": player, "team": team, "rank": rank, "baseline": baseline}
+        with open(self.log_path, "ab") as f:
+            f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def snapshot(self, event, current_matches, offset):
+        """状態全体と、それに対応するログの位置を書き出す（書きかけを残さないよう置き換える）"""
+        temporary_path = self.snapshot_path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            pickle.dump({"format": SNAPSHOT_FORMAT, "event": event, "current_matches": list(current_matches), "offset": offset}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, self.snapshot_path)
+
+    def checkpoint(self, event, current_matches):
+        """ログの末尾までを反映済みの状態をスナップショットとして書き出す"""
+        self.snapshot(event, current_matches, os.path.getsize(self.log_path))
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+        if not isinstance(data, dict) or data.get("format") != SNAPSHOT_FORMAT:
+            return None
+        return data
+
+    def load(self):
+        """保存された (EventState, 直前のラウンドの試合) を返す（保存がなければ空の状態）
+
+        書き込み途中で止まった末尾の行だけを捨て、途中の行が読めないログは ValueError とする。
+        """
+        event = EventState()
+        current_matches = []
+        offset = 0
+        data = self._load_snapshot()
+        if data is not None:
+            event, current_matches, offset = data["event"], data["current_matches"], data["offset"]
+        if not self.exists():
+            return event, current_matches
+
+        with open(self.log_path, "rb+") as f:
+            size = os.fstat(f.fileno()).st_size
+            f.seek(offset)
+            for line in iter(f.readline, b""):
+                try:
+                    record = json.loads(line) if line.endswith(b"\n") else None
+                except ValueError:
+                    record = None
+                if record is None:
+                    if f.tell() < size:
+                        raise ValueError(f"ログの途中が壊れています: {self.log_path} の {offset} バイト目")
+                    # 書き込み途中で止まった末尾の行は捨てる（以降の追記が壊れないよう切り詰める）
+                    f.truncate(offset)
+                    break
+                if "roster" in record:
+                    event.apply_roster_event(record["roster"], record["player"], record["team"], record["rank"], record["baseline"])
+                else:
+                    current_matches = [((team_a, team_b), court, match_type) for team_a, team_b, court, match_type in record["matches"]]
+                    event.apply_round(current_matches, record["pairs"], record.get("duration", 1))
+                offset += len(line)
+        return event, current_matches
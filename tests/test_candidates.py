@@ -0,0 +1,82 @@
+"""CandidateCache を使う Session と使わない Session が同じラウンドを生成すること"""
+import random
+
+from matchmaking import GenerationMetrics, Session
+
+def _settings(rng):
+    a_count, b_count = rng.randint(3, 15), rng.randint(3, 15)
+    a_players = [f"A{i}" for i in range(1, a_count + 1)]
+    b_players = [f"B{i}" for i in range(1, b_count + 1)]
+    a_doubles_map = {f"Aペア{i + 1}": a_players[2 * i:2 * i + 2] for i in range(a_count // 4)}
+    b_doubles_map = {f"Bペア{i + 1}": b_players[2 * i:2 * i + 2] for i in range(b_count // 4)}
+    match_types = ["シングルス", "ダブルス"] if a_doubles_map and b_doubles_map else ["シングルス"]
+    return {
+        "a_players": a_players,
+        "b_players": b_players,
+        "a_doubles_map": a_doubles_map,
+        "b_doubles_map": b_doubles_map,
+        "courts": [(f"コート{i}", rng.choice(match_types)) for i in range(1, rng.randint(1, 4) + 1)],
+        "max_rank_diff": rng.randint(1, 8),
+        "allow_repeat": rng.random() < 0.5,
+        "auto_pairs": rng.random() < 0.3,
+        "min_rest": rng.randint(0, 2),
+        "rest_priority": rng.random() < 0.3,
+    }
+
+def _change_roster(rng, sessions, next_numbers):
+    """途中参加か途中退出を両方の Session に同じように反映する"""
+    if rng.random() < 0.5:
+        team = rng.choice("AB")
+        player = f"{team}{next_numbers[team]}"
+        next_numbers[team] += 1
+        for session in sessions:
+            session.join_player(player, team)
+    else:
+        active = sessions[0].a_players + sessions[0].b_players
+        if len(active) > 4:
+            player, action = rng.choice(active), rng.choice(["leave", "injury"])
+            for session in sessions:
+                session.leave_player(player, action)
+
+def _metrics_dict(metrics):
+    # 時間は実行ごとに変わるので比べない
+    return {name: value for name, value in metrics.as_dict().items() if not name.endswith("_ms")}
+
+def test_cached_rounds_match_uncached_rounds():
+    for seed in range(80):
+        rng = random.Random(seed)
+        settings = _settings(rng)
+        cached, uncached = Session(**settings), Session(**settings)
+        uncached.candidate_cache = None
+        next_numbers = {"A": len(settings["a_players"]) + 1, "B": len(settings["b_players"]) + 1}
+        for _ in range(rng.randint(1, 15)):
+            for _ in range(rng.choice([0, 0, 1, 2])):
+                _change_roster(rng, (cached, uncached), next_numbers)
+            cached_metrics, uncached_metrics = GenerationMetrics(), GenerationMetrics()
+            round_plan = cached.generate_round(metrics=cached_metrics)
+            assert round_plan == uncached.generate_round(metrics=uncached_metrics)
+            assert _metrics_dict(cached_metrics) == _metrics_dict(uncached_metrics)
+            matches = [(match, court, match_type) for match, court, match_type, level in round_plan if level != "failed"]
+            cached.confirm_round(matches)
+            uncached.confirm_round(matches)
+
+def test_cache_keeps_tables_across_rounds():
+    session = Session([f"A{i}" for i in range(1, 21)], [f"B{i}" for i in range(1, 21)], courts=[(f"コート{i}", "シングルス") for i in range(1, 5)], max_rank_diff=10)
+    session.next_round()
+    table = session.candidate_cache._tables["シングルス"]
+    session.next_round()
+    # 1ラウンド進んだだけなら表は作り直さず、出場した選手の行だけ更新する
+    assert session.candidate_cache._tables["シングルス"] is table
+    session.configure(max_rank_diff=5)
+    session.next_round()
+    assert session.candidate_cache._tables["シングルス"] is not table
+
+def test_cache_keeps_tables_across_roster_changes():
+    session = Session([f"A{i}" for i in range(1, 21)], [f"B{i}" for i in range(1, 21)], courts=[(f"コート{i}", "シングルス") for i in range(1, 5)], max_rank_diff=10)
+    session.next_round()
+    table = session.candidate_cache._tables["シングルス"]
+    session.join_player("A21", "A")
+    session.leave_player("B7", "injury")
+    session.next_round()
+    # 名簿の変更は表を作り直さず、触れた選手の行だけ更新する
+    assert session.candidate_cache._tables["シングルス"] is table
@@ -0,0 +1,115 @@
+import csv
+import io
+import json
+import re
+
+import pytest
+
+from matchmaking.cli import load_events, main, normalize_event, run
+
+RAW_EVENT = {
+    "name": "practice",
+    "a_players_count": 6,
+    "b_players_count": 6,
+    "a_doubles": "A1+A2;A3+A4",
+    "b_doubles": "B1+B2;B3+B4",
+    "courts": "シングルス;ダブルス",
+    "allow_repeat": "yes",
+    "rounds": 3,
+    "planner": "greedy",
+}
+
+def test_event_files_of_every_format_are_read_alike(tmp_path):
+    (tmp_path / "events.json").write_text(json.dumps([RAW_EVENT], ensure_ascii=False), encoding="utf-8")
+    (tmp_path / "events.jsonl").write_text(json.dumps(RAW_EVENT, ensure_ascii=False) + "\n\n", encoding="utf-8")
+    with open(tmp_path / "events.csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(RAW_EVENT))
+        writer.writeheader()
+        writer.writerow(RAW_EVENT)
+
+    events = load_events([str(tmp_path / name) for name in ("events.json", "events.jsonl", "events.csv")])
+    assert events[0] == events[1] == events[2]
+    event = events[0]
+    assert event["a_players"] == ["A1", "A2", "A3", "A4", "A5", "A6"]
+    assert event["a_doubles_map"] == {"Aペア1": ["A1", "A2"], "Aペア2": ["A3", "A4"]}
+    assert event["courts"] == [("コート1", "シングルス"), ("コート2", "ダブルス")]
+    assert event["allow_repeat"] is True and event["allow_consecutive"] is True
+
+def test_unknown_planner_is_rejected():
+    with pytest.raises(ValueError, match="random"):
+        normalize_event({"planner": "random"}, 0)
+
+def test_cost_weights_are_parsed_and_validated():
+    assert normalize_event({"cost_weights": "balance=10; rank_gap=2"}, 0)["cost_weights"] == {"balance": 10.0, "rank_gap": 2.0}
+    assert normalize_event({"cost_weights": {"rest": 1}}, 0)["cost_weights"] == {"rest": 1.0}
+    with pytest.raises(ValueError, match="rank_gap"):
+        normalize_event({"cost_weights": "rank_gap=-1"}, 0)
+
+def test_run_writes_one_schedule_per_event(tmp_path):
+    events = [normalize_event(RAW_EVENT, 0), normalize_event({**RAW_EVENT, "name": None, "planner": "beam"}, 1)]
+    output = io.StringIO()
+    run(events, output, jobs=1, log=io.StringIO())
+    results = {result["name"]: result for result in map(json.loads, output.getvalue().splitlines())}
+    assert set(results) == {"practice", "event2"}
+    for result in results.values():
+        assert len(result["rounds"]) == 3
+        assert all([court["court"] for court in round_records] == ["コート1", "コート2"] for round_records in result["rounds"])
+
+    (tmp_path / "events.json").write_text(json.dumps(RAW_EVENT, ensure_ascii=False), encoding="utf-8")
+    assert main([str(tmp_path / "events.json"), "-o", str(tmp_path / "out.jsonl"), "-j", "1"]) == 0
+    assert json.loads((tmp_path / "out.jsonl").read_text(encoding="utf-8"))["name"] == "practice"
+
+def test_failed_event_does_not_abort_batch():
+    events = [normalize_event({"name": "ok", "rounds": 2}, 0), normalize_event({"name": "broken", "rounds": 2}, 1)]
+    # 正規化の後に壊れた名簿の変更（生成中の例外）
+    events[1]["roster_events"] = [{"round": 2, "action": "leave", "player": "A99", "team": None, "rank": None}]
+    output = io.StringIO()
+    assert run(events, output, jobs=1, log=io.StringIO()) == 1
+    results = {result["name"]: result for result in map(json.loads, output.getvalue().splitlines())}
+    assert len(results["ok"]["rounds"]) == 2
+    assert "A99" in results["broken"]["error"]
+
+def test_greedy_confirms_assigned_courts_of_partially_failed_rounds():
+    # 3人ずつで2コートを埋めると連戦・再戦になるので、毎ラウンド一部のコートが割り当てられない
+    event = normalize_event({"a_players_count": 3, "b_players_count": 3, "rounds": 5, "planner": "greedy", "allow_consecutive": False}, 0)
+    output = io.StringIO()
+    run([event], output, jobs=1, log=io.StringIO())
+    rounds = json.loads(output.getvalue())["rounds"]
+    assert rounds[1][1]["level"] == "failed"
+    # 割り当てたコートを確定して進むので、同じラウンドが繰り返されない
+    assert all(previous != current for previous, current in zip(rounds, rounds[1:]))
+    assert sum(court["level"] != "failed" for round_records in rounds for court in round_records) >= 7
+
+def test_roster_events_are_checked_against_the_roster():
+    for roster_events, message in [
+        ("2:leave:A99", "A99 は参加していません"),
+        ("2:join:B3", "B3 は既に参加しています"),
+        ("2:join:Tanaka", "Tanaka のチームは A か B"),
+        ("2:injury:A2;3:leave:A2", "A2 は参加していません"),
+        ("0:leave:A1", "1 以上"),
+    ]:
+        with pytest.raises(ValueError, match=re.escape(message)):
+            normalize_event({"a_players_count": 4, "b_players_count": 4, "roster_events": roster_events}, 0)
+    event = normalize_event({"a_players_count": 4, "b_players_count": 4, "roster_events": "3:leave:A2;2:join:A5;4:join:A2"}, 0)
+    assert [entry["player"] for entry in event["roster_events"]] == ["A5", "A2", "A2"]
+
+def test_named_players_and_ranks_from_csv(tmp_path):
+    raw = {"name": "named", "a_players": "Alice;Bob", "b_players": "Carol;Dave", "ranks": "Alice=2; Bob=1; Carol=1; Dave=2", "courts": "シングルス", "rounds": 2}
+    with open(tmp_path / "events.csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(raw))
+        writer.writeheader()
+        writer.writerow(raw)
+    event, = load_events([str(tmp_path / "events.csv")])
+    assert event["ranks"] == {"Alice": 2, "Bob": 1, "Carol": 1, "Dave": 2}
+    output = io.StringIO()
+    assert run([event], output, jobs=1, log=io.StringIO()) == 0
+    assert len(json.loads(output.getvalue())["rounds"]) == 2
+
+def test_invalid_event_definition_does_not_abort_batch(tmp_path):
+    (tmp_path / "events.json").write_text(json.dumps([{"name": "ok", "rounds": 1}, {"name": "broken", "planner": "random"}]), encoding="utf-8")
+    events = load_events([str(tmp_path / "events.json")])
+    assert events[1]["name"] == "broken" and "random" in events[1]["error"]
+    output = io.StringIO()
+    assert run(events, output, jobs=1, log=io.StringIO()) == 1
+    results = {result["name"]: result for result in map(json.loads, output.getvalue().splitlines())}
+    assert len(results["ok"]["rounds"]) == 1 and results["broken"] == events[1]
@@ -0,0 +1,84 @@
+"""重み付きの評価項目"""
+import random
+
+import pytest
+
+from matchmaking import Session, optimize_round
+from matchmaking.costs import COST_TERM_LABELS, COST_TERMS, REST_HORIZON, CandidateBatch, CostContext, evaluate_costs, register_cost_term, validate_cost_weights
+
+SINGLES = "シングルス"
+DOUBLES = "ダブルス"
+
+def _play(rng, rounds):
+    """シングルスとダブルスを混ぜて rounds ラウンド進めた Session"""
+    a_players = [f"A{i}" for i in range(1, 9)]
+    b_players = [f"B{i}" for i in range(1, 9)]
+    session = Session(a_players, b_players, courts=[("コート1", SINGLES), ("コート2", DOUBLES)], auto_pairs=True, allow_repeat=True)
+    for _ in range(rounds):
+        session.next_round()
+    return session
+
+def _naive_terms(session, match_type, a_side, b_side):
+    """1候補の各項目の値を、履歴を先頭から数え直して求める"""
+    event = session.event
+    ranks = session.roster.ranks
+    last_round = {}
+    counts = {}
+    for round_number, round_matches in enumerate(_rounds(event), 1):
+        for match_players, row_type in round_matches:
+            for player in match_players[0] + match_players[1]:
+                last_round[player] = round_number
+                counts.setdefault(player, {SINGLES: 0, DOUBLES: 0})[row_type] += 1
+    other = DOUBLES if match_type == SINGLES else SINGLES
+    players = a_side + b_side
+    return {
+        "rank_gap": abs(sum(ranks[p] for p in a_side) - sum(ranks[p] for p in b_side)),
+        "rest": sum(max(0, REST_HORIZON - (event.round_count - last_round[p])) for p in players if p in last_round),
+        "opponent_repeat": sum(event.opponent_count(a, b) for a in a_side for b in b_side),
+        "format_mix": sum(max(0, counts[p][match_type] - counts[p][other]) for p in players if p in counts),
+    }
+
+def _rounds(event):
+    """ラウンドごとの ((A側の選手, B側の選手), 試合形式) の列"""
+    rounds = {}
+    for position, row in enumerate(event.match_history):
+        a_side, b_side = [row["Team A"]], [row["Team B"]]
+        if row["Match Type"] == DOUBLES:
+            a_side, b_side = row["Team A"].split("+"), row["Team B"].split("+")
+        rounds.setdefault(row["Round"], []).append(((a_side, b_side), row["Match Type"]))
+    return [rounds.get(round_number, []) for round_number in range(1, event.round_count + 1)]
+
+def test_terms_match_naive_values():
+    rng = random.Random(1)
+    for _ in range(30):
+        session = _play(rng, rng.randint(0, 8))
+        for match_type, size in ((SINGLES, 1), (DOUBLES, 2)):
+            a_column = [rng.sample(session.a_players, size) for _ in range(20)]
+            b_column = [rng.sample(session.b_players, size) for _ in range(20)]
+            balance = [rng.randint(0, 5) for _ in range(20)]
+            total_matches = [rng.randint(0, 20) for _ in range(20)]
+            batch = CandidateBatch(match_type, balance, total_matches, a_column, b_column)
+            context = CostContext(session.event, session.roster.ranks)
+            weights = {name: rng.choice([0, 0.5, 2]) for name in COST_TERMS}
+
+            expected = []
+            for i, (a_side, b_side) in enumerate(zip(a_column, b_column)):
+                values = {"balance": balance[i], "total_matches": total_matches[i], **_naive_terms(session, match_type, a_side, b_side)}
+                expected.append(sum(weight * values[name] for name, weight in weights.items()))
+            assert evaluate_costs(batch, weights, context) == pytest.approx(expected)
+
+def test_registered_term_steers_the_round():
+    register_cost_term("avoid_a1", lambda batch, context: [int("A1" in players) for players in batch.a_players])
+    try:
+        args = ([("コート1", SINGLES)], ["A1", "A2"], ["B1", "B2"], set(), set(), {}, {}, {}, 3)
+        assert optimize_round(*args)[0][0] == ("A1", "B1")
+        assert optimize_round(*args, cost_weights={"avoid_a1": 1})[0][0][0] == "A2"
+    finally:
+        del COST_TERMS["avoid_a1"], COST_TERM_LABELS["avoid_a1"]
+
+def test_weights_are_validated():
+    assert validate_cost_weights({"rank_gap": "2"}) == {"rank_gap": 2.0}
+    with pytest.raises(ValueError, match="unknown"):
+        validate_cost_weights({"unknown": 1})
+    with pytest.raises(ValueError, match="balance"):
+        validate_cost_weights({"balance": -1})
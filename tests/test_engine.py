@@ -0,0 +1,161 @@
+"""組み合わせ生成の順位付けが元の実装（総当たり・毎回のバランス再計算）と一致すること"""
+import random
+
+import pytest
+
+from matchmaking import EventState, MatchBalanceIndex, build_matchup_index, generate_matches, generate_matches_core, get_match_balance_score, matchup_key
+
+SINGLES = "シングルス"
+DOUBLES = "ダブルス"
+LEVELS = ("strict", "allow_consecutive", "allow_all")
+
+def _baseline_core(match_type, a_pool, b_pool, history, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, allow_consecutive, allow_repeat_history, excluded_pairs):
+    """最初の app.py の generate_matches_core と同じ順位付け"""
+    if match_type == SINGLES:
+        a_pool_dict = {player: [player] for player in a_pool}
+        b_pool_dict = {player: [player] for player in b_pool}
+        all_players = a_pool + b_pool
+    else:
+        a_pool_dict, b_pool_dict = a_doubles_map, b_doubles_map
+        all_players = list({p for players in [*a_doubles_map.values(), *b_doubles_map.values()] for p in players})
+
+    def total(players, counts):
+        return sum(counts.get(p, {}).get(SINGLES, 0) + counts.get(p, {}).get(DOUBLES, 0) for p in players)
+
+    valid_matches = []
+    for a_key, a_players in a_pool_dict.items():
+        if (not allow_consecutive and any(p in last_played for p in a_players)) or a_key in excluded_pairs:
+            continue
+        for b_key, b_players in b_pool_dict.items():
+            if (not allow_consecutive and any(p in last_played for p in b_players)) or b_key in excluded_pairs or a_key == b_key:
+                continue
+            if not allow_repeat_history and any({m["Team A"], m["Team B"]} == {a_key, b_key} for m in history):
+                continue
+            if match_type == SINGLES and abs(int(a_key.strip("A")) - int(b_key.strip("B"))) > max_rank_diff:
+                continue
+            match_players = a_players + b_players
+            counts = {player: dict(c) for player, c in player_counts.items()}
+            for p in match_players:
+                counts.setdefault(p, {SINGLES: 0, DOUBLES: 0})[match_type] += 1
+            totals = [total([p], counts) for p in all_players]
+            balance = max(totals) - min(totals) if totals else 0
+            valid_matches.append(((balance, total(match_players, player_counts)), (a_key, b_key)))
+    valid_matches.sort(key=lambda item: item[0])
+    return [match for _, match in valid_matches]
+
+def _baseline(scenario, allow_consecutive_global, allow_repeat_global, excluded_pairs):
+    """元の段階的な制約緩和（strict → allow_consecutive → allow_all）"""
+    settings = [(False, False), (True, False) if allow_consecutive_global else None, (True, True) if allow_repeat_global else None]
+    for level, setting in zip(LEVELS, settings):
+        if setting is not None:
+            matches = _baseline_core(**scenario, allow_consecutive=setting[0], allow_repeat_history=setting[1], excluded_pairs=excluded_pairs)
+            if matches:
+                return matches, level
+    return [], "failed"
+
+def _scenario(rng):
+    a_pool = [f"A{i}" for i in range(1, rng.randint(0, 10) + 1)]
+    b_pool = [f"B{i}" for i in range(1, rng.randint(0, 10) + 1)]
+    a_doubles_map = {f"Aペア{i}": rng.sample(a_pool, 2) for i in range(1, rng.randint(0, 4) + 1)} if len(a_pool) >= 2 else {}
+    b_doubles_map = {f"Bペア{i}": rng.sample(b_pool, 2) for i in range(1, rng.randint(0, 4) + 1)} if len(b_pool) >= 2 else {}
+    history, player_counts = [], {}
+    for round_number in range(rng.randint(0, 12)):
+        match_type = rng.choice([SINGLES, DOUBLES])
+        if match_type == SINGLES and a_pool and b_pool:
+            team_a, team_b = rng.choice(a_pool), rng.choice(b_pool)
+            players = [team_a, team_b]
+        elif match_type == DOUBLES and a_doubles_map and b_doubles_map:
+            team_a, team_b = rng.choice(list(a_doubles_map)), rng.choice(list(b_doubles_map))
+            players = a_doubles_map[team_a] + b_doubles_map[team_b]
+        else:
+            continue
+        history.append({"Round": round_number, "Match Type": match_type, "Team A": team_a, "Team B": team_b})
+        for p in players:
+            player_counts.setdefault(p, {SINGLES: 0, DOUBLES: 0})[match_type] += 1
+    scenario = {
+        "match_type": rng.choice([SINGLES, DOUBLES]),
+        "a_pool": a_pool,
+        "b_pool": b_pool,
+        "history": history,
+        "last_played": set(rng.sample(a_pool + b_pool, rng.randint(0, len(a_pool + b_pool)))),
+        "a_doubles_map": a_doubles_map,
+        "b_doubles_map": b_doubles_map,
+        "player_counts": player_counts,
+        "max_rank_diff": rng.randint(1, 5),
+    }
+    item_keys = list(a_doubles_map) + list(b_doubles_map)
+    excluded_pairs = set(rng.sample(item_keys, rng.randint(0, len(item_keys)))) if rng.random() < 0.3 else set()
+    return scenario, excluded_pairs
+
+def test_ranking_matches_baseline():
+    rng = random.Random(1)
+    for _ in range(500):
+        scenario, excluded_pairs = _scenario(rng)
+        for allow_consecutive in (True, False):
+            for allow_repeat in (True, False):
+                assert generate_matches_core(**scenario, allow_consecutive=allow_consecutive, allow_repeat_history=allow_repeat, excluded_pairs=excluded_pairs) == \
+                    _baseline_core(**scenario, allow_consecutive=allow_consecutive, allow_repeat_history=allow_repeat, excluded_pairs=excluded_pairs)
+                assert generate_matches(**scenario, allow_consecutive_global=allow_consecutive, allow_repeat_global=allow_repeat, excluded_pairs=excluded_pairs) == \
+                    _baseline(scenario, allow_consecutive, allow_repeat, excluded_pairs)
+
+def test_history_index_replaces_history_scan():
+    rng = random.Random(3)
+    for _ in range(200):
+        scenario, excluded_pairs = _scenario(rng)
+        history_index = build_matchup_index(scenario["history"])
+        # 索引を渡せば履歴のリストは見ない
+        assert generate_matches_core(**{**scenario, "history": []}, excluded_pairs=excluded_pairs, history_index=history_index) == \
+            _baseline_core(**scenario, allow_consecutive=False, allow_repeat_history=False, excluded_pairs=excluded_pairs)
+    assert matchup_key("A1", "B2") == matchup_key("B2", "A1")
+
+def test_balance_index_matches_copied_counts():
+    rng = random.Random(4)
+    for _ in range(500):
+        players = [f"P{i}" for i in range(rng.randint(0, 8))]
+        player_counts = {p: {SINGLES: rng.randint(0, 3), DOUBLES: rng.randint(0, 3)} for p in players if rng.random() < 0.8}
+        match_players = rng.sample(players + ["X1", "X2"], rng.randint(0, min(4, len(players) + 2)))
+        counts = {player: dict(c) for player, c in player_counts.items()}
+        for p in match_players:
+            counts.setdefault(p, {SINGLES: 0, DOUBLES: 0})[SINGLES] += 1
+        assert MatchBalanceIndex(players, player_counts).score_after(match_players) == get_match_balance_score(players, counts)
+
+def test_single_pass_matches_level_by_level_relaxation():
+    rng = random.Random(5)
+    for _ in range(300):
+        scenario, excluded_pairs = _scenario(rng)
+        for allow_consecutive in (True, False):
+            for allow_repeat in (True, False):
+                options = {"allow_consecutive_global": allow_consecutive, "allow_repeat_global": allow_repeat, "excluded_pairs": excluded_pairs}
+                assert generate_matches(**scenario, **options, single_pass=True) == generate_matches(**scenario, **options, single_pass=False)
+
+def test_limit_returns_prefix_of_full_ranking():
+    rng = random.Random(6)
+    for _ in range(300):
+        scenario, excluded_pairs = _scenario(rng)
+        limit = rng.randint(1, 5)
+        full = generate_matches_core(**scenario, allow_consecutive=True, excluded_pairs=excluded_pairs)
+        assert generate_matches_core(**scenario, allow_consecutive=True, excluded_pairs=excluded_pairs, limit=limit) == full[:limit]
+        for single_pass in (True, False):
+            matches, level = generate_matches(**scenario, allow_repeat_global=True, excluded_pairs=excluded_pairs, single_pass=single_pass)
+            assert generate_matches(**scenario, allow_repeat_global=True, excluded_pairs=excluded_pairs, single_pass=single_pass, limit=limit) == (matches[:limit], level)
+
+def test_numpy_engine_matches_python_engine():
+    numpy_engine = pytest.importorskip("matchmaking.numpy_engine")
+    rng = random.Random(2)
+    for _ in range(500):
+        scenario, excluded_pairs = _scenario(rng)
+        for allow_consecutive in (True, False):
+            for allow_repeat in (True, False):
+                options = {"allow_consecutive": allow_consecutive, "allow_repeat_history": allow_repeat, "excluded_pairs": excluded_pairs}
+                assert numpy_engine.generate_matches_core_numpy(**scenario, **options) == generate_matches_core(**scenario, **options)
+        assert numpy_engine.generate_matches_core_numpy(**scenario, limit=2) == generate_matches_core(**scenario, limit=2)
+
+def test_relabelled_pairs_are_a_repeat():
+    state = EventState()
+    state.apply_round([(("Aペア1", "Bペア1"), "コート1", "ダブルス")], {"Aペア1": ["A1", "A2"], "Bペア1": ["B1", "B2"]})
+    # ペア名を付け替えても、同じ4人の対戦は対戦済みとして除外する
+    a_doubles_map, b_doubles_map = {"X": ["A2", "A1"]}, {"Y": ["B1", "B2"]}
+    matches = generate_matches_core("ダブルス", [], [], [], set(), a_doubles_map, b_doubles_map, {}, 3, history_index=state.played_matchups)
+    assert matches == []
+    matches = generate_matches_core("ダブルス", [], [], [], set(), a_doubles_map, b_doubles_map, {}, 3, allow_repeat_history=True)
+    assert matches == [("X", "Y")]
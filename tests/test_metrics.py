@@ -0,0 +1,59 @@
+"""組み合わせ生成の計測値"""
+import random
+
+from matchmaking import REJECT_FILTERS, GenerationMetrics, build_matchup_index, generate_matches, generate_matches_core, matchup_key
+
+def _counts(a_pool, b_pool, played, last_played, max_rank_diff, excluded_pairs):
+    """シングルスの候補を総当たりで分類した、期待される計測値"""
+    rejected = dict.fromkeys(REJECT_FILTERS, 0)
+    a_items, b_items = [], []
+    # A側は連戦、B側はペア除外を先に判定する
+    for pool, items, filters in ((a_pool, a_items, ("consecutive", "excluded_pair")), (b_pool, b_items, ("excluded_pair", "consecutive"))):
+        for player in pool:
+            failed = [name for name in filters if player in (last_played if name == "consecutive" else excluded_pairs)]
+            if failed:
+                rejected[failed[0]] += 1
+            else:
+                items.append(player)
+    accepted = 0
+    for a in a_items:
+        for b in b_items:
+            if abs(int(a[1:]) - int(b[1:])) > max_rank_diff:
+                rejected["rank_diff"] += 1
+            elif matchup_key(a, b) in played:
+                rejected["history"] += 1
+            else:
+                accepted += 1
+    return len(a_items) * len(b_items), accepted, rejected
+
+def test_counts_match_brute_force_classification():
+    rng = random.Random(1)
+    for _ in range(100):
+        a_pool = [f"A{i}" for i in range(1, rng.randint(2, 9))]
+        b_pool = [f"B{i}" for i in range(1, rng.randint(2, 9))]
+        played = {matchup_key(rng.choice(a_pool), rng.choice(b_pool)) for _ in range(rng.randint(0, 10))}
+        last_played = set(rng.sample(a_pool + b_pool, rng.randint(0, 3)))
+        excluded_pairs = set(rng.sample(a_pool + b_pool, rng.randint(0, 2)))
+        max_rank_diff = rng.randint(0, 4)
+
+        metrics = GenerationMetrics()
+        matches = generate_matches_core(
+            "シングルス", a_pool, b_pool, [], last_played, {}, {}, {}, max_rank_diff,
+            excluded_pairs=excluded_pairs, history_index=played, metrics=metrics)
+        enumerated, accepted, rejected = _counts(a_pool, b_pool, played, last_played, max_rank_diff, excluded_pairs)
+        assert (metrics.enumerated, metrics.accepted, metrics.rejected) == (enumerated, accepted, rejected)
+        assert metrics.accepted == len(matches)
+        assert metrics.enumerated == metrics.accepted + metrics.rejected["rank_diff"] + metrics.rejected["history"]
+
+def test_levels_and_merge():
+    history = [{"Team A": "A1", "Team B": "B1"}]
+    first, second = GenerationMetrics(), GenerationMetrics()
+    generate_matches("シングルス", ["A1"], ["B1"], history, set(), {}, {}, {}, 3, history_index=build_matchup_index(history), metrics=first)
+    generate_matches("シングルス", ["A1"], ["B1"], history, set(), {}, {}, {}, 3, allow_repeat_global=True, history_index=build_matchup_index(history), metrics=second)
+    assert first.levels == [("シングルス", "failed")]
+    assert second.levels[-1] == ("シングルス", "allow_all")
+
+    first.merge(second)
+    assert first.levels == [("シングルス", "failed")] + second.levels
+    assert first.enumerated == 2 and first.accepted == 1 and first.rejected["history"] == 1
+    assert first.as_dict()["rejected"] == first.rejected
@@ -0,0 +1,141 @@
+"""optimize_round の最適性"""
+import itertools
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from matchmaking import build_manual_matches
+from matchmaking.optimizer import _round_candidates, optimize_round
+from matchmaking.state import matchup_key
+
+def _candidates_by_type(courts, a_pool, b_pool, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, reachable=(0, 1)):
+    return {
+        match_type: _round_candidates(match_type, a_pool, b_pool, set(), last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, list(reachable))
+        for match_type in dict.fromkeys(match_type for _, match_type in courts)
+    }
+
+def _brute_force(courts, candidates_by_type):
+    """全形式の候補の組み合わせを総当たりして (-割当コート数, 費用の合計) の最小を求める"""
+    court_counts = {}
+    for _, match_type in courts:
+        court_counts[match_type] = court_counts.get(match_type, 0) + 1
+    best = None
+
+    def search(match_types, used_players, count, cost):
+        nonlocal best
+        if not match_types:
+            best = min(best or (-count, cost), (-count, cost))
+            return
+        match_type = match_types[0]
+        for k in range(court_counts[match_type] + 1):
+            for combo in itertools.combinations(candidates_by_type[match_type], k):
+                players = [player for candidate in combo for player in candidate[2]]
+                if len(set(players)) == len(players) and used_players.isdisjoint(players):
+                    search(match_types[1:], used_players | set(players), count + k, cost + sum(c[0] for c in combo))
+
+    search(list(court_counts), set(), 0, 0)
+    return best
+
+def _plan_key(round_plan, candidates_by_type):
+    costs = {match_type: {match: cost for cost, match, _, _ in candidates} for match_type, candidates in candidates_by_type.items()}
+    chosen = [(match, match_type) for match, _, match_type, level in round_plan if level != "failed"]
+    return -len(chosen), sum(costs[match_type][match] for match, match_type in chosen)
+
+def test_mixed_round_is_solved_jointly():
+    # ダブルスを先に決めると Aペア1–Bペア1 が B1 を使い、シングルスが割り当てられなくなる
+    a_doubles_map = {"Aペア1": ["A2", "A3"], "Aペア2": ["A1", "A3"]}
+    b_doubles_map = {"Bペア1": ["B1", "B2"], "Bペア2": ["B2", "B3"]}
+    courts = [("コート1", "シングルス"), ("コート2", "ダブルス")]
+    round_plan = optimize_round(courts, ["A1", "A2", "A3"], ["B1", "B2", "B3"], set(), set(), a_doubles_map, b_doubles_map, {}, 1)
+    assert round_plan == [
+        (("A1", "B1"), "コート1", "シングルス", "strict"),
+        (("Aペア1", "Bペア2"), "コート2", "ダブルス", "strict"),
+    ]
+
+def test_random_rounds_match_brute_force():
+    rng = random.Random(1)
+    for _ in range(300):
+        a_pool = [f"A{i}" for i in range(1, rng.randint(2, 5) + 1)]
+        b_pool = [f"B{i}" for i in range(1, rng.randint(2, 5) + 1)]
+        a_doubles_map = {f"Aペア{k}": rng.sample(a_pool, 2) for k in range(1, rng.randint(1, 4))}
+        b_doubles_map = {f"Bペア{k}": rng.sample(b_pool, 2) for k in range(1, rng.randint(1, 4))}
+        courts = [(f"コート{i}", rng.choice(["シングルス", "ダブルス"])) for i in range(1, rng.randint(2, 4))]
+        last_played = set(rng.sample(a_pool + b_pool, rng.randint(0, 2)))
+        player_counts = {player: {"シングルス": rng.randint(0, 2), "ダブルス": rng.randint(0, 2)} for player in a_pool + b_pool}
+        max_rank_diff = rng.randint(1, 3)
+
+        round_plan = optimize_round(courts, a_pool, b_pool, set(), last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff)
+        candidates_by_type = _candidates_by_type(courts, a_pool, b_pool, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff)
+        assert _plan_key(round_plan, candidates_by_type) == _brute_force(courts, candidates_by_type)
+
+def test_single_format_rounds_assign_cheapest_matches_first():
+    rng = random.Random(2)
+    for _ in range(300):
+        a_pool = [f"A{i}" for i in range(1, rng.randint(2, 6) + 1)]
+        b_pool = [f"B{i}" for i in range(1, rng.randint(2, 6) + 1)]
+        # ペアの選手が重なる場合は分枝限定法、重ならない場合は最小費用流で解く
+        a_doubles_map = {f"Aペア{k}": rng.sample(a_pool, 2) for k in range(1, rng.randint(1, 4) + 1)}
+        b_doubles_map = {f"Bペア{k}": rng.sample(b_pool, 2) for k in range(1, rng.randint(1, 4) + 1)}
+        match_type = rng.choice(["シングルス", "ダブルス"])
+        courts = [(f"コート{i}", match_type) for i in range(1, rng.randint(1, 3) + 1)]
+        last_played = set(rng.sample(a_pool + b_pool, rng.randint(0, 2)))
+        player_counts = {player: {"シングルス": rng.randint(0, 2), "ダブルス": rng.randint(0, 2)} for player in a_pool + b_pool}
+        max_rank_diff = rng.randint(1, 3)
+
+        round_plan = optimize_round(courts, a_pool, b_pool, set(), last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, allow_repeat_global=True)
+        candidates_by_type = _candidates_by_type(courts, a_pool, b_pool, last_played, a_doubles_map, b_doubles_map, player_counts, max_rank_diff, (0, 1, 2))
+        assert _plan_key(round_plan, candidates_by_type) == _brute_force(courts, candidates_by_type)
+        # 費用の低い組み合わせから順にコートへ割り当てる
+        costs = {match: cost for cost, match, _, _ in candidates_by_type[match_type]}
+        assigned = [costs[match] for match, _, _, level in round_plan if level != "failed"]
+        assert assigned == sorted(assigned)
+
+def test_any_number_of_courts():
+    a_pool = [f"A{i}" for i in range(1, 25)]
+    b_pool = [f"B{i}" for i in range(1, 25)]
+    a_doubles_map = {f"Aペア{i + 1}": a_pool[16 + 2 * i:18 + 2 * i] for i in range(4)}
+    b_doubles_map = {f"Bペア{i + 1}": b_pool[16 + 2 * i:18 + 2 * i] for i in range(4)}
+    # 形式の混ざったコートの並びのまま返す
+    courts = [(f"コート{i}", "ダブルス" if i % 4 == 0 else "シングルス") for i in range(1, 13)]
+    round_plan = optimize_round(courts, a_pool[:16], b_pool[:16], set(), set(), a_doubles_map, b_doubles_map, {}, 3)
+    assert [(court, match_type) for _, court, match_type, _ in round_plan] == courts
+    assert all(level == "strict" for *_, level in round_plan)
+    players = [
+        player for match, _, match_type, _ in round_plan
+        for item_key, pairs in zip(match, (a_doubles_map, b_doubles_map))
+        for player in (pairs[item_key] if match_type == "ダブルス" else [item_key])
+    ]
+    assert len(players) == len(set(players)) == 9 * 2 + 3 * 4
+
+def test_manual_matches_skip_incomplete_courts():
+    manual_courts = [
+        ("コート1", "シングルス", ["A1"], ["B2"]),
+        ("コート2", "ダブルス", ["Aペア1"], []),
+        ("コート3", "ダブルス", ["Aペア1"], ["Bペア1"]),
+    ]
+    matches, court_players = build_manual_matches(manual_courts, {"Aペア1": ["A3", "A4"]}, {"Bペア1": ["B3", "B4"]})
+    assert matches == [(("A1", "B2"), "コート1", "シングルス"), (("Aペア1", "Bペア1"), "コート3", "ダブルス")]
+    assert court_players == [["A1", "B2"], ["A3", "A4", "B3", "B4"]]
+
+def test_preferred_pools_do_not_relax_constraints():
+    history_index = {matchup_key("A1", "B1"), matchup_key("A1", "B2"), matchup_key("A2", "B1")}
+    args = ([("コート1", "シングルス")], ["A1", "A2"], ["B1", "B2"], history_index, set(), {}, {}, {}, 3)
+    expected = [(("A2", "B2"), "コート1", "シングルス", "strict")]
+    assert optimize_round(*args, allow_repeat_global=True) == expected
+    # 休養の長い A1・B1 だけでは再戦になるので、全選手で決めた結果を使う
+    assert optimize_round(*args, allow_repeat_global=True, preferred_pools=(["A1"], ["B1"])) == expected
+
+def test_large_cost_weights_keep_level_order():
+    # A2 は試合数が多く、A1 は直前のラウンドに出ている
+    args = ([("コート1", "シングルス")], ["A1", "A2"], ["B1"], set(), {"A1"}, {}, {}, {"A2": {"シングルス": 5, "ダブルス": 0}}, 3)
+    round_plan = optimize_round(*args, cost_weights={"total_matches": 1e13})
+    assert round_plan == [(("A2", "B1"), "コート1", "シングルス", "strict")]
+    # 同じレベルの中では重みどおりに選ぶ
+    round_plan = optimize_round(*args[:4], set(), *args[5:], cost_weights={"total_matches": 1e13})
+    assert round_plan == [(("A1", "B1"), "コート1", "シングルス", "strict")]
+
+def test_executor_enumerates_match_types_alike():
+    a_pool = [f"A{i}" for i in range(1, 7)]
+    b_pool = [f"B{i}" for i in range(1, 7)]
+    args = ([("コート1", "シングルス"), ("コート2", "ダブルス")], a_pool, b_pool, set(), set(), {"Aペア1": ["A5", "A6"]}, {"Bペア1": ["B5", "B6"]}, {}, 3)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert optimize_round(*args, executor=executor) == optimize_round(*args)
@@ -0,0 +1,8 @@
+"""matchmaking パッケージの読み込み"""
+import subprocess
+import sys
+
+def test_import_does_not_load_ui_or_optional_dependencies():
+    code = "import sys, matchmaking; print(sorted(m for m in ('streamlit', 'pandas', 'numpy') if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]"
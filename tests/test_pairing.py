@@ -0,0 +1,62 @@
+"""ダブルスペアの自動編成"""
+import itertools
+import random
+
+from matchmaking import EventState, Session, form_pairs, form_round_pairs
+from matchmaking.pairing import pair_members
+
+def _pair_cost(pair, partner_counts, ranks, selected):
+    """(過去に組んだ回数, ペアのランキング合計と平均の差) の費用"""
+    strong, weak = pair
+    mean = sum(ranks[player] for player in selected) / (len(selected) // 2)
+    return (partner_counts.get(frozenset(pair), 0), abs(ranks[strong] + ranks[weak] - mean))
+
+def _best_cost(upper, lower, partner_counts, ranks):
+    """上位と下位の全ての組ませ方の中で最小の費用（総当たり）"""
+    selected = upper + lower
+    costs = []
+    for permutation in itertools.permutations(lower):
+        pair_costs = [_pair_cost(pair, partner_counts, ranks, selected) for pair in zip(upper, permutation)]
+        costs.append((sum(c[0] for c in pair_costs), round(sum(c[1] for c in pair_costs), 9)))
+    return min(costs)
+
+def test_pairs_match_brute_force():
+    rng = random.Random(1)
+    for _ in range(200):
+        players = [f"A{i}" for i in range(1, rng.randint(3, 10))]
+        ranks = {player: rng.randint(1, 10) for player in players}
+        pair_count = rng.randint(1, 4)
+        last_played = set(rng.sample(players, rng.randint(0, len(players))))
+        player_counts = {player: {"シングルス": rng.randint(0, 3), "ダブルス": rng.randint(0, 3)} for player in players}
+        partner_counts = {frozenset(rng.sample(players, 2)): rng.randint(1, 2) for _ in range(rng.randint(0, 5))}
+
+        pairs = form_pairs(players, pair_count, last_played, player_counts, lambda a, b: partner_counts.get(frozenset((a, b)), 0), ranks)
+        assert len(pairs) == min(pair_count, len(players) // 2)
+        for name, members in pairs.items():
+            assert pair_members(name) == members
+        chosen = [player for members in pairs.values() for player in members]
+        assert len(set(chosen)) == len(chosen)
+        # 休んだ選手が出場しないまま、連戦の選手が選ばれることはない
+        assert not (any(p in last_played for p in chosen) and any(p not in last_played and p not in chosen for p in players))
+
+        if pairs:
+            order = {player: position for position, player in enumerate(players)}
+            selected = sorted(chosen, key=lambda player: (ranks[player], order[player]))
+            upper, lower = selected[:len(pairs)], selected[len(pairs):]
+            assert all(members[0] in upper and members[1] in lower for members in pairs.values())
+            pair_costs = [_pair_cost(members, partner_counts, ranks, selected) for members in pairs.values()]
+            assert (sum(c[0] for c in pair_costs), round(sum(c[1] for c in pair_costs), 9)) == _best_cost(upper, lower, partner_counts, ranks)
+
+def test_round_pairs_follow_doubles_courts_and_avoid_repeats():
+    a_players = [f"A{i}" for i in range(1, 9)]
+    b_players = [f"B{i}" for i in range(1, 9)]
+    courts = [("コート1", "ダブルス"), ("コート2", "シングルス"), ("コート3", "ダブルス")]
+    a_pairs, b_pairs = form_round_pairs(courts, a_players, b_players, EventState(), None)
+    assert len(a_pairs) == len(b_pairs) == 2
+
+    # 自動編成の Session では、同じ相手と組む回数が偏らない
+    session = Session(a_players, b_players, courts=[("コート1", "ダブルス"), ("コート2", "ダブルス")], auto_pairs=True, allow_repeat=True)
+    for _ in range(4):
+        session.next_round()
+    assert session.event.round_count == 4
+    assert max(count for row in session.event.partners.rows.values() for count in row.values()) == 1
@@ -0,0 +1,75 @@
+"""plan_session による複数ラウンドの事前計画"""
+from matchmaking import EventState, Session, matchup_key, optimize_round, plan_session
+
+A_POOL = [f"A{i}" for i in range(1, 7)]
+B_POOL = [f"B{i}" for i in range(1, 7)]
+A_DOUBLES = {"Aペア1": ["A1", "A2"], "Aペア2": ["A3", "A4"]}
+B_DOUBLES = {"Bペア1": ["B1", "B2"], "Bペア2": ["B3", "B4"]}
+COURTS = [("コート1", "シングルス"), ("コート2", "ダブルス")]
+
+def _greedy(rounds):
+    """毎ラウンド optimize_round の結果をそのまま確定した場合"""
+    state = EventState()
+    plan = []
+    for _ in range(rounds):
+        round_plan = optimize_round(COURTS, A_POOL, B_POOL, state.played_matchups, state.last_played_players, A_DOUBLES, B_DOUBLES, state.player_match_count, 3)
+        state.apply_round([(match, court, match_type) for match, court, match_type, level in round_plan if level != "failed"], {**A_DOUBLES, **B_DOUBLES})
+        plan.append(round_plan)
+    return plan
+
+def test_plan_has_valid_rounds_without_repeats():
+    state = EventState()
+    plan = plan_session(COURTS, A_POOL, B_POOL, A_DOUBLES, B_DOUBLES, 3, rounds=5, state=state)
+    assert len(plan) == 5
+    # 渡した状態は変更しない
+    assert state.round_count == 0 and not state.match_history
+    matchups = set()
+    for round_plan in plan:
+        players = []
+        for match, _, match_type, level in round_plan:
+            if level == "failed":
+                continue
+            assert level != "allow_all"
+            key = matchup_key(*match)
+            assert key not in matchups
+            matchups.add(key)
+            players += list(match) if match_type == "シングルス" else A_DOUBLES[match[0]] + B_DOUBLES[match[1]]
+        assert len(players) == len(set(players))
+
+def test_beam_of_one_is_greedy():
+    plan = plan_session(COURTS, A_POOL, B_POOL, A_DOUBLES, B_DOUBLES, 3, rounds=4, beam_width=1, branching=1)
+    assert plan == _greedy(4)
+
+def _session():
+    return Session(A_POOL, B_POOL, A_DOUBLES, B_DOUBLES, courts=COURTS)
+
+def _confirmable(round_plan):
+    return [(match, court, match_type) for match, court, match_type, level in round_plan if level != "failed"]
+
+def test_session_consumes_the_plan_round_by_round():
+    session = _session()
+    plan = session.plan_rounds(4)
+    for round_plan in plan:
+        assert session.generate_round() == round_plan
+        session.confirm_round(_confirmable(round_plan))
+    assert not session.plan
+    assert session.event.round_count == 4
+
+def test_manual_round_replans_the_rest():
+    session = _session()
+    session.plan_rounds(4)
+    # 計画と違う組み合わせを確定すると、残りのラウンドをその状態から計画し直す
+    manual = [(("A5", "B6"), "コート1", "シングルス"), (("Aペア2", "Bペア1"), "コート2", "ダブルス")]
+    session.confirm_round(manual)
+    assert len(session.plan) == 3
+    expected = plan_session(**session.planner_args(), rounds=3, state=session.event)
+    assert list(session.plan) == expected
+    for round_plan in session.plan:
+        assert all(matchup_key(*match) not in {matchup_key(*m) for m, _, _ in manual} for match, *_ in _confirmable(round_plan))
+
+def test_changed_settings_drop_the_plan():
+    session = _session()
+    session.plan_rounds(3)
+    session.configure(max_rank_diff=1)
+    assert not session.plan
+    assert session.generate_round() == optimize_round(COURTS, A_POOL, B_POOL, set(), set(), A_DOUBLES, B_DOUBLES, {}, 1)
@@ -0,0 +1,44 @@
+"""EventRegistry の追い出しと読み直し"""
+import gc
+import json
+
+import pytest
+
+from matchmaking.registry import EventRegistry
+
+SETTINGS = {"a_players": ["A1", "A2", "A3", "A4"], "b_players": ["B1", "B2", "B3", "B4"]}
+
+def _logged_rounds(root, event_id):
+    with open(root / event_id / "rounds.jsonl", encoding="utf-8") as f:
+        return [json.loads(line)["round"] for line in f]
+
+def test_evicted_session_in_use_is_not_loaded_twice(tmp_path):
+    registry = EventRegistry(str(tmp_path), max_events=1)
+    first = registry.create("e1", SETTINGS)
+    registry.create("e2", SETTINGS)
+    assert "e1" not in registry
+
+    second = registry.get("e1")
+    assert second is first
+    first.next_round()
+    second.next_round()
+    assert _logged_rounds(tmp_path, "e1") == [1, 2]
+
+def test_unused_evicted_session_is_reloaded_from_store(tmp_path):
+    registry = EventRegistry(str(tmp_path), max_events=1)
+    registry.create("e1", SETTINGS).next_round()
+    registry.create("e2", SETTINGS)
+    gc.collect()
+
+    session = registry.get("e1")
+    assert session.event.round_count == 1
+    session.next_round()
+    assert _logged_rounds(tmp_path, "e1") == [1, 2]
+
+def test_invalid_settings_leave_nothing_behind(tmp_path):
+    registry = EventRegistry(str(tmp_path))
+    with pytest.raises(ValueError):
+        registry.create("e1", {**SETTINGS, "cost_weights": {"unknown": 1}})
+    assert not (tmp_path / "e1").exists() and not registry.known("e1")
+    # 同じIDで作り直せる
+    assert registry.create("e1", SETTINGS).next_round()
@@ -0,0 +1,50 @@
+"""統計表のキャッシュ"""
+import random
+
+import pytest
+
+from matchmaking import EventState
+from matchmaking.reporting import ReportCache, history_table, player_count_table, team_count_table
+
+pd = pytest.importorskip("pandas")
+
+SINGLES = "シングルス"
+DOUBLES = "ダブルス"
+
+def _random_round(rng, a_players, b_players):
+    matches = []
+    for court in ("コート1", "コート2"):
+        if rng.random() < 0.5:
+            matches.append(((rng.choice(a_players), rng.choice(b_players)), court, SINGLES))
+        else:
+            matches.append(((f"Aペア{rng.randint(1, 3)}", f"Bペア{rng.randint(1, 3)}"), court, DOUBLES))
+    return matches
+
+def _assert_same_tables(cache, event, players):
+    pd.testing.assert_frame_equal(cache.history_table(event), history_table(event))
+    pd.testing.assert_frame_equal(cache.player_count_table(event, players), player_count_table(event, players))
+    pd.testing.assert_frame_equal(cache.team_count_table(event), team_count_table(event))
+
+def test_incremental_updates_match_full_rebuild():
+    rng = random.Random(1)
+    a_players = [f"A{i}" for i in range(1, 7)]
+    b_players = [f"B{i}" for i in range(1, 7)]
+    doubles_input = {f"Aペア{i}": rng.sample(a_players, 2) for i in range(1, 4)}
+    doubles_input.update({f"Bペア{i}": rng.sample(b_players, 2) for i in range(1, 4)})
+    players = a_players + b_players
+
+    cache = ReportCache()
+    event = EventState()
+    _assert_same_tables(cache, event, players)
+    for _ in range(30):
+        # 1ラウンドずつの差分更新に加え、複数ラウンドの遅れと選手の構成変更も混ぜる
+        for _ in range(1 if rng.random() < 0.7 else 2):
+            event.apply_round(_random_round(rng, a_players, b_players), doubles_input)
+        if rng.random() < 0.2:
+            players = players[:-1] if len(players) > 6 else a_players + b_players
+        _assert_same_tables(cache, event, players)
+
+    # 別の大会状態に切り替えると作り直す
+    other = event.copy()
+    other.apply_round(_random_round(rng, a_players, b_players), doubles_input)
+    _assert_same_tables(cache, other, players)
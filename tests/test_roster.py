@@ -0,0 +1,41 @@
+"""ランキング表と、ランキング差の範囲の候補の索引"""
+import random
+
+import pytest
+
+from matchmaking import RankWindowIndex, Roster, Session, generate_matches_core
+
+def test_rank_window_matches_linear_scan():
+    rng = random.Random(1)
+    for _ in range(300):
+        ranks = [rng.randint(1, 20) for _ in range(rng.randint(0, 15))]
+        rank, max_rank_diff = rng.randint(-2, 22), rng.randint(0, 5)
+        expected = [position for position, other in enumerate(ranks) if abs(other - rank) <= max_rank_diff]
+        assert list(RankWindowIndex(ranks).positions_within(rank, max_rank_diff)) == expected
+
+def test_default_ranks_follow_player_numbers():
+    assert Roster(["A1", "A12"], ["B3"]).ranks == {"A1": 1, "A12": 12, "B3": 3}
+
+def test_explicit_ranks_decide_the_singles_window():
+    # 選手名に番号がなくても、指定したランキングで差を判定する
+    ranks = {"Alice": 1, "Bob": 5, "Carol": 2, "Dan": 9}
+    matches = generate_matches_core("シングルス", ["Alice", "Bob"], ["Carol", "Dan"], [], set(), {}, {}, {}, 3, ranks=ranks)
+    assert sorted(matches) == [("Alice", "Carol"), ("Bob", "Carol")]
+    numpy_engine = pytest.importorskip("matchmaking.numpy_engine")
+    assert numpy_engine.generate_matches_core_numpy("シングルス", ["Alice", "Bob"], ["Carol", "Dan"], [], set(), {}, {}, {}, 3, ranks=ranks) == matches
+
+def test_named_players_fall_back_to_roster_order():
+    assert Roster(["Alice", "Bob", "A7"], ["Carol"]).ranks == {"Alice": 1, "Bob": 2, "A7": 7, "Carol": 1}
+    session = Session(["Alice", "Bob"], ["Carol", "Dan"])
+    assert [match for match, *_ in session.next_round()] == [("Alice", "Carol"), ("Bob", "Dan")]
+    session.join_player("Erin", "A")
+    assert session.roster.ranks["Erin"] == 3
+
+def test_missing_rank_is_reported_only_when_needed():
+    ranks = {"Alice": 1, "Bob": 2, "Carol": 1}
+    # ダブルスだけならランキングを参照しない
+    doubles = Session(["Alice", "Bob"], ["Carol", "Dan"], {"Aペア1": ["Alice", "Bob"]}, {"Bペア1": ["Carol", "Dan"]}, courts=[("コート1", "ダブルス")], ranks=ranks)
+    assert doubles.next_round()[0][3] == "strict"
+    singles = Session(["Alice", "Bob"], ["Carol", "Dan"], ranks=ranks)
+    with pytest.raises(ValueError, match="Dan のランキング"):
+        singles.generate_round()
@@ -0,0 +1,125 @@
+"""HTTP/JSON サービスのハンドラ"""
+import asyncio
+import json
+from http import HTTPStatus
+
+import pytest
+
+from matchmaking.registry import EventRegistry
+from matchmaking.service import HTTPError, MatchmakingService, generate_round_in_worker, worker_round_args
+
+EVENT = {"a_players_count": 4, "b_players_count": 4, "courts": ["シングルス", "シングルス"]}
+
+def _logged_rounds(root, event_id):
+    with open(root / event_id / "rounds.jsonl", encoding="utf-8") as f:
+        return [record["round"] for record in map(json.loads, f) if "roster" not in record]
+
+async def _status(service, method, path, body):
+    """要求の応答ステータス（エラー応答も含む）"""
+    try:
+        status, _ = await service.dispatch(method, path, body)
+    except HTTPError as e:
+        status = e.status
+    return status
+
+def test_endpoints_validate_requests(tmp_path):
+    service = MatchmakingService(EventRegistry(str(tmp_path)))
+    requests = [
+        ("POST", "/events", [1], HTTPStatus.BAD_REQUEST),
+        ("POST", "/events", {"event_id": "../e1"}, HTTPStatus.BAD_REQUEST),
+        ("POST", "/events", {"courts": "テニス"}, HTTPStatus.BAD_REQUEST),
+        ("POST", "/events", {"min_rest": -1}, HTTPStatus.BAD_REQUEST),
+        ("POST", "/events", {"cost_weights": "balance=-1"}, HTTPStatus.BAD_REQUEST),
+        ("POST", "/events", {**EVENT, "event_id": "e1"}, HTTPStatus.CREATED),
+        ("POST", "/events", {**EVENT, "event_id": "e1"}, HTTPStatus.CONFLICT),
+        ("POST", "/events/e1/rounds/confirm", None, HTTPStatus.CONFLICT),
+        ("POST", "/events/e1/rounds/confirm", {"matches": "A1-B1"}, HTTPStatus.BAD_REQUEST),
+        ("POST", "/events/e1/rounds/confirm", {"matches": [{"court": "コート1"}]}, HTTPStatus.BAD_REQUEST),
+        ("POST", "/events/e1/roster", {"player": "A1"}, HTTPStatus.BAD_REQUEST),
+        ("POST", "/events/e1/roster", {"action": "fly", "player": "A1"}, HTTPStatus.BAD_REQUEST),
+        ("POST", "/events/e1/roster", {"action": "leave", "player": "Nobody"}, HTTPStatus.BAD_REQUEST),
+        ("GET", "/events/e1/rounds", None, HTTPStatus.METHOD_NOT_ALLOWED),
+        ("POST", "/events/missing/rounds", None, HTTPStatus.NOT_FOUND),
+        ("GET", "/missing", None, HTTPStatus.NOT_FOUND),
+    ]
+
+    async def main():
+        return [await _status(service, method, path, body) for method, path, body, _ in requests]
+
+    assert asyncio.run(main()) == [expected for *_, expected in requests]
+    # 不正な要求では何も記録しない
+    assert not (tmp_path / "e1" / "rounds.jsonl").exists()
+
+def test_generated_round_is_confirmed(tmp_path):
+    service = MatchmakingService(EventRegistry(str(tmp_path)))
+
+    async def main():
+        await service.dispatch("POST", "/events", {**EVENT, "event_id": "e1"})
+        _, generated = await service.dispatch("POST", "/events/e1/rounds", None)
+        await service.dispatch("POST", "/events/e1/rounds/confirm", None)
+        _, event = await service.dispatch("GET", "/events/e1", None)
+        return generated, event
+
+    generated, event = asyncio.run(main())
+    assert [court["court"] for court in generated["courts"]] == ["コート1", "コート2"]
+    assert event["round"] == 1 and not event["pending"]
+
+def test_concurrent_rounds_with_eviction_keep_one_log_per_event(tmp_path):
+    service = MatchmakingService(EventRegistry(str(tmp_path), max_events=1))
+    event_ids = ["e1", "e2", "e3"]
+
+    async def play(event_id, rounds):
+        for _ in range(rounds):
+            _, generated = await service.dispatch("POST", f"/events/{event_id}/rounds", None)
+            await service.dispatch("POST", f"/events/{event_id}/rounds/confirm", {"matches": generated["courts"]})
+
+    async def main():
+        for event_id in event_ids:
+            await service.dispatch("POST", "/events", {**EVENT, "event_id": event_id})
+        await asyncio.gather(*(play(event_id, 3) for event_id in event_ids for _ in range(2)))
+
+    asyncio.run(main())
+    for event_id in event_ids:
+        assert _logged_rounds(tmp_path, event_id) == [1, 2, 3, 4, 5, 6]
+    # 追い出された大会のロックと未確定の組み合わせは残らない
+    assert set(service._locks) <= {event_id for event_id in event_ids if event_id in service.registry}
+    assert set(service._pending) <= set(service._locks)
+
+def test_get_stats_of_unknown_event_is_not_found(tmp_path):
+    service = MatchmakingService(EventRegistry(str(tmp_path)))
+    with pytest.raises(HTTPError) as excinfo:
+        asyncio.run(service.dispatch("GET", "/events/missing/stats", None))
+    assert excinfo.value.status == HTTPStatus.NOT_FOUND
+    assert not service._locks
+
+def test_confirm_rejects_unknown_departed_and_wrong_side_players(tmp_path):
+    service = MatchmakingService(EventRegistry(str(tmp_path)))
+
+    async def confirm(team_a, team_b):
+        match = {"court": "コート1", "match_type": "シングルス", "team_a": team_a, "team_b": team_b}
+        return await _status(service, "POST", "/events/e1/rounds/confirm", {"matches": [match]})
+
+    async def main():
+        await service.dispatch("POST", "/events", {**EVENT, "event_id": "e1"})
+        await service.dispatch("POST", "/events/e1/roster", {"action": "injury", "player": "B2"})
+        return [await confirm(*teams) for teams in (("A1", "Nobody"), ("A1", "B2"), ("B1", "A1"), ("A1", "A2"), ("A1", "B1"))]
+
+    assert asyncio.run(main()) == [HTTPStatus.BAD_REQUEST] * 4 + [HTTPStatus.OK]
+    assert _logged_rounds(tmp_path, "e1") == [1]
+
+def test_create_event_rejects_roster_events(tmp_path):
+    service = MatchmakingService(EventRegistry(str(tmp_path)))
+    with pytest.raises(HTTPError) as excinfo:
+        asyncio.run(service.dispatch("POST", "/events", {**EVENT, "event_id": "e1", "roster_events": "2:leave:A1"}))
+    assert excinfo.value.status == HTTPStatus.BAD_REQUEST
+    assert not service.registry.known("e1")
+
+def test_worker_receives_event_state_only_for_weighted_costs(tmp_path):
+    registry = EventRegistry(str(tmp_path))
+    session = registry.create("e1", {"a_players": ["A1", "A2"], "b_players": ["B1", "B2"]})
+    session.next_round()
+    args = worker_round_args(session)
+    assert args["cost_context"] is None and type(args["player_counts"]) is dict
+    assert generate_round_in_worker(args) == session.generate_round()
+    session.configure(cost_weights={"balance": 1})
+    assert worker_round_args(session)["cost_context"].state is session.event
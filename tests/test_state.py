@@ -0,0 +1,148 @@
+"""EventState（選手ID・array の列で持つ試合状態）"""
+import random
+
+from matchmaking import EventState, matchup_key
+from matchmaking.engine import lineup_key
+
+SINGLES = "シングルス"
+DOUBLES = "ダブルス"
+
+def _random_rounds(rng, rounds):
+    """ランダムな確定済みラウンドの列と、ペア名→選手の表"""
+    a_players = [f"A{i}" for i in range(1, 9)]
+    b_players = [f"B{i}" for i in range(1, 9)]
+    doubles_input = {f"Aペア{i}": rng.sample(a_players, 2) for i in range(1, 4)}
+    doubles_input.update({f"Bペア{i}": rng.sample(b_players, 2) for i in range(1, 4)})
+    played = []
+    for _ in range(rounds):
+        matches = []
+        for court in ("コート1", "コート2"):
+            if rng.random() < 0.5:
+                matches.append(((rng.choice(a_players), rng.choice(b_players)), court, SINGLES))
+            else:
+                matches.append(((f"Aペア{rng.randint(1, 3)}", f"Bペア{rng.randint(1, 3)}"), court, DOUBLES))
+        played.append(matches)
+    return played, doubles_input
+
+def _dict_state(played, doubles_input):
+    """辞書・リストで持っていたころの試合状態と、選手の組ごとに数えた組んだ・対戦した回数"""
+    history, player_counts, team_counts, last_played = [], {}, {}, set()
+    partners, opponents = {}, {}
+    for round_number, matches in enumerate(played, 1):
+        last_played = set()
+        for match, _, match_type in matches:
+            history.append({"Round": round_number, "Match Type": match_type, "Team A": match[0], "Team B": match[1]})
+            a_side, b_side = ([match[0]], [match[1]]) if match_type == SINGLES else (doubles_input[match[0]], doubles_input[match[1]])
+            players = a_side + b_side
+            for side in (a_side, b_side):
+                if len(side) == 2 and side[0] != side[1]:
+                    partners[frozenset(side)] = partners.get(frozenset(side), 0) + 1
+            for a in a_side:
+                for b in b_side:
+                    if a != b:
+                        opponents[frozenset((a, b))] = opponents.get(frozenset((a, b)), 0) + 1
+            for player in players:
+                last_played.add(player)
+                player_counts.setdefault(player, {SINGLES: 0, DOUBLES: 0})[match_type] += 1
+            if match_type == DOUBLES:
+                for item_key in match:
+                    team_counts[item_key] = team_counts.get(item_key, 0) + 1
+    return history, player_counts, team_counts, last_played, partners, opponents
+
+def test_views_match_dict_state():
+    rng = random.Random(1)
+    for _ in range(100):
+        played, doubles_input = _random_rounds(rng, rng.randint(0, 10))
+        state = EventState()
+        for matches in played:
+            state.apply_round(matches, doubles_input)
+        history, player_counts, team_counts, last_played, partners, opponents = _dict_state(played, doubles_input)
+        assert list(state.match_history) == history
+        assert dict(state.player_match_count) == player_counts
+        assert dict(state.team_match_count) == team_counts
+        assert state.last_played_players == last_played
+        lineups = {lineup_key(doubles_input[m["Team A"]], doubles_input[m["Team B"]]) for m in history if m["Match Type"] == DOUBLES}
+        assert state.played_matchups == {matchup_key(m["Team A"], m["Team B"]) for m in history} | lineups
+        players = list(player_counts)
+        for a in players:
+            for b in players:
+                if a != b:
+                    assert state.partner_count(a, b) == partners.get(frozenset((a, b)), 0)
+                    assert state.opponent_count(a, b) == opponents.get(frozenset((a, b)), 0)
+        assert state.round_count == len(played)
+        columns = state.history_columns()
+        assert columns.pop("Court") == [court for matches in played for _, court, _ in matches]
+        assert columns == {name: [m[name] for m in history] for name in ("Round", "Match Type", "Team A", "Team B")}
+
+def test_copy_is_independent():
+    rng = random.Random(2)
+    played, doubles_input = _random_rounds(rng, 4)
+    state = EventState()
+    for matches in played[:2]:
+        state.apply_round(matches, doubles_input)
+    clone = state.copy()
+    for matches in played[2:]:
+        clone.apply_round(matches, doubles_input)
+    assert list(state.match_history) == _dict_state(played[:2], doubles_input)[0]
+    assert list(clone.match_history) == _dict_state(played, doubles_input)[0]
+
+def test_history_positions_match_linear_filter():
+    rng = random.Random(3)
+    for _ in range(50):
+        played, doubles_input = _random_rounds(rng, rng.randint(0, 10))
+        state = EventState()
+        for matches in played:
+            state.apply_round(matches, doubles_input)
+        rows = [
+            (round_number, court, set(match) if match_type == SINGLES else set(doubles_input[match[0]] + doubles_input[match[1]]))
+            for round_number, matches in enumerate(played, 1) for match, court, match_type in matches
+        ]
+        for _ in range(10):
+            first = rng.randint(0, 11)
+            rounds = rng.choice([None, (first, first + rng.randint(0, 3))])
+            player = rng.choice([None, "A1", "B2", "A9"])
+            court = rng.choice([None, "コート1", "コート2", "コート9"])
+            positions = state.history_positions(rounds, player, court)
+            assert list(positions) == [
+                position for position, (round_number, row_court, players) in enumerate(rows)
+                if (rounds is None or rounds[0] <= round_number <= rounds[1])
+                and (player is None or player in players) and (court is None or row_court == court)
+            ]
+            # ページ単位に切り出した行だけを列に変換する
+            page_size = rng.randint(1, 5)
+            for first_row in range(0, len(positions), page_size):
+                page = positions[first_row:first_row + page_size]
+                columns = state.history_columns(positions=page)
+                assert columns["Round"] == [rows[p][0] for p in page]
+                assert columns["Court"] == [rows[p][1] for p in page]
+
+def test_rest_queries_match_linear_scan():
+    rng = random.Random(4)
+    for _ in range(100):
+        played, doubles_input = _random_rounds(rng, rng.randint(0, 10))
+        state = EventState()
+        for matches in played:
+            state.apply_round(matches, doubles_input)
+        last_round = {}
+        for round_number, matches in enumerate(played, 1):
+            for match, _, match_type in matches:
+                for player in (list(match) if match_type == SINGLES else doubles_input[match[0]] + doubles_input[match[1]]):
+                    last_round[player] = round_number
+
+        min_rest = rng.randint(1, 4)
+        assert state.players_resting(min_rest) == {p for p, r in last_round.items() if len(played) - r < min_rest}
+        assert state.players_resting() == state.last_played_players
+
+        players = rng.sample([f"A{i}" for i in range(1, 10)] + [f"B{i}" for i in range(1, 10)], rng.randint(0, 18))
+        count = rng.randint(0, len(players))
+        # 登録した未出場の選手はすべて、その後は最後の出場が古い順に、同じラウンドの選手をまとめて加える
+        state.register_players(players)
+        chosen = {p for p in players if p not in last_round}
+        for round_number in sorted({last_round[p] for p in players if p in last_round}):
+            if len(chosen) >= count:
+                break
+            chosen |= {p for p in players if last_round.get(p) == round_number}
+        assert state.longest_rested(players, count) == [p for p in players if p in chosen]
+        # 登録した後に出場した選手は未出場の集合から外れる
+        state.apply_round([((players[0], "B99"), "コート1", SINGLES)] if players and players[0].startswith("A") else [], {})
+        assert state.unplayed.isdisjoint(state.last_played_players)
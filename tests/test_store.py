@@ -0,0 +1,78 @@
+"""EventStore のスナップショットとログの再生"""
+import pytest
+
+from matchmaking import EventState, EventStore, Session
+from matchmaking.state import CooccurrenceMatrix
+
+A_PLAYERS = [f"A{i}" for i in range(1, 7)]
+B_PLAYERS = [f"B{i}" for i in range(1, 7)]
+COURTS = [("コート1", "シングルス"), ("コート2", "ダブルス")]
+PAIRS = {"a_doubles_map": {"Aペア1": ["A1", "A2"], "Aペア2": ["A3", "A4"]}, "b_doubles_map": {"Bペア1": ["B1", "B2"], "Bペア2": ["B3", "B4"]}}
+
+def _state_dict(event):
+    """EventState の全属性（疎行列は行の辞書、array はリスト）"""
+    values = {}
+    for name in EventState.__slots__:
+        if name == "__weakref__":
+            continue
+        value = getattr(event, name)
+        if isinstance(value, CooccurrenceMatrix):
+            value = value.rows
+        elif hasattr(value, "tolist"):
+            value = value.tolist()
+        values[name] = value
+    return values
+
+def _play(directory, snapshot_every):
+    session = Session(A_PLAYERS, B_PLAYERS, courts=COURTS, store=EventStore(directory, snapshot_every=snapshot_every), **PAIRS)
+    for round_number in range(1, 8):
+        if round_number == 3:
+            session.join_player("Tanaka", "A", rank=3)
+        if round_number == 5:
+            session.leave_player("B6", "injury")
+        round_plan = session.generate_round()
+        matches = [(match, court, match_type) for match, court, match_type, level in round_plan if level != "failed"]
+        session.confirm_round(matches, duration=round_number % 2 + 1)
+    return session
+
+def test_snapshot_and_log_round_trip(tmp_path):
+    # スナップショットなし・途中のスナップショットから再生・毎ラウンドのスナップショット
+    for snapshot_every in (0, 3, 1):
+        directory = str(tmp_path / f"every{snapshot_every}")
+        session = _play(directory, snapshot_every)
+        event, current_matches = EventStore(directory).load()
+        assert _state_dict(event) == _state_dict(session.event)
+        assert current_matches == session.current_matches
+
+        restored = Session(A_PLAYERS, B_PLAYERS, courts=COURTS, store=EventStore(directory), **PAIRS)
+        assert restored.a_players == session.a_players
+        assert restored.b_players == session.b_players
+        assert restored.generate_round() == session.generate_round()
+
+def test_truncated_log_line_is_dropped(tmp_path):
+    directory = str(tmp_path / "e1")
+    session = _play(directory, 0)
+    store = EventStore(directory)
+    with open(store.log_path, "ab") as f:
+        f.write(b'{"round": 8, "matches"')
+    event, _ = store.load()
+    assert _state_dict(event) == _state_dict(session.event)
+    # 書きかけの行は切り詰められ、以降の追記は読める
+    session.confirm_round([(("A1", "B1"), "コート1", "シングルス")])
+    event, _ = EventStore(directory).load()
+    assert event.round_count == 8
+
+def test_corrupted_log_line_in_the_middle_is_an_error(tmp_path):
+    directory = str(tmp_path / "e1")
+    _play(directory, 0)
+    store = EventStore(directory)
+    with open(store.log_path, "rb") as f:
+        lines = f.readlines()
+    corrupted = lines[:3] + [b'{"round": 4, "matches"\n'] + lines[4:]
+    with open(store.log_path, "wb") as f:
+        f.writelines(corrupted)
+    with pytest.raises(ValueError, match="ログの途中が壊れています"):
+        store.load()
+    # 壊れたログは切り詰めない
+    with open(store.log_path, "rb") as f:
+        assert f.readlines() == corrupted